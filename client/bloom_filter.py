@@ -0,0 +1,39 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """Set of recently seen content hashes with no false negatives and a small false-positive rate
+
+    The client records every image/file hash the server confirmed holding, so
+    new content goes straight to upload and only likely duplicates pay for the
+    "have you got it?" round trip. Once `capacity` hashes were added it starts
+    over, which keeps the filter to recent content and its error rate bounded.
+    """
+
+    def __init__(self, capacity=10000, error_rate=0.01):
+        self.capacity = capacity
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.clear()
+
+    def clear(self):
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.sha256(key.encode()).digest()
+        # Double hashing: k positions from two 64-bit halves of one digest
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        if self.count >= self.capacity:
+            self.clear()
+        for position in self._positions(key):
+            self.bits[position // 8] |= 1 << (position % 8)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position // 8] & (1 << (position % 8)) for position in self._positions(key))
@@ -9,16 +9,35 @@ import os
 import zipfile
 import io
 import hashlib
+import uuid
 from pathlib import Path
 import keyboard
 import tkinter as tk
 from tkinter import ttk
 import json
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 from auth_window import AuthWindow
+from bloom_filter import BloomFilter
 from dashboard_window import DashboardWindow
-from config import CONFIG_FILE, API_URL, HOTKEY_HISTORY, HOTKEY_GHOST_MODE, HOTKEY_GHOST_PASTE
+from config import CONFIG_FILE, DEVICE_ID_FILE, API_URL, HOTKEY_HISTORY, HOTKEY_GHOST_MODE, HOTKEY_GHOST_PASTE
+from config import UPLOAD_CHUNK_SIZE, UPLOAD_PARALLEL_CHUNKS, UPLOAD_RETRIES
+
+def load_device_id():
+    """This install's device id, created and saved on first run"""
+    try:
+        device_id = DEVICE_ID_FILE.read_text().strip()
+        if device_id:
+            return device_id
+    except OSError:
+        pass
+    device_id = uuid.uuid4().hex
+    try:
+        DEVICE_ID_FILE.write_text(device_id)
+    except OSError as e:
+        print(f"DEBUG: Could not save device id: {e}")
+    return device_id
 
 class ClipboardManagerApp:
     def __init__(self, username=None, room_id=None, password=None):
@@ -33,6 +52,10 @@ class ClipboardManagerApp:
         self.username = username
         self.room_id = room_id
         self.password = password
+        self.session_token = None
+        self.session_expires_at = 0
+        # Stable per install; part of every upload's idempotency key
+        self.device_id = load_device_id()
         
         # Dashboard window
         self.dashboard = None
@@ -45,6 +68,10 @@ class ClipboardManagerApp:
         self.last_upload_time = 0
         self.upload_debounce = 2.0  # 2 seconds debounce
         self.last_image_hash = ""
+        # SHA-256 of images/files the server is known to hold (upload-skip candidates)
+        self.known_hashes = BloomFilter()
+        # Overlay thumbnails load in the background, a few at a time
+        self.thumbnail_pool = ThreadPoolExecutor(max_workers=4)
         
         # Load config if exists
         if CONFIG_FILE.exists():
@@ -105,38 +132,182 @@ class ClipboardManagerApp:
         zip_buffer.seek(0)
         return zip_buffer
     
+    def auth_headers(self):
+        """Bearer header for uploads; joins the room for a fresh token when needed"""
+        if not self.session_token or time.time() > self.session_expires_at - 60:
+            self.session_token = None
+            if not self.password:
+                return {}
+            try:
+                response = requests.post(
+                    f"{API_URL}/api/room/join",
+                    json={"room_id": self.room_id, "password": self.password, "username": self.username},
+                    timeout=10
+                )
+                if response.status_code == 200:
+                    data = response.json()
+                    self.session_token = data.get("token")
+                    self.session_expires_at = data.get("expires_at", 0)
+            except Exception as e:
+                print(f"DEBUG: Could not get session token: {e}")
+        return {"Authorization": f"Bearer {self.session_token}"} if self.session_token else {}
+    
+    def upload_headers(self, idempotency_key):
+        """Auth headers plus the copy's Idempotency-Key, so a retried upload cannot store the item twice"""
+        return {**self.auth_headers(), "Idempotency-Key": idempotency_key}
+    
+    def upload_by_hash(self, item_type, file_name, sha256, headers):
+        """Create the item from content the room already holds, without sending it
+        
+        Only hashes in the Bloom filter are tried, so new content costs no extra
+        round trip. Returns the server response, or None when the bytes must be
+        uploaded (unknown hash, or a false positive answered with 404).
+        """
+        if sha256 not in self.known_hashes:
+            return None
+        response = requests.post(
+            f"{API_URL}/api/clipboard/by-hash",
+            json={
+                "room_id": self.room_id,
+                "username": self.username,
+                "sha256": sha256,
+                "type": item_type,
+                "filename": file_name
+            },
+            headers=headers,
+            timeout=10
+        )
+        if response.status_code == 404:
+            return None
+        print(f"DEBUG: Upload skipped, server already has {sha256[:12]}")
+        return response
+    
+    def upload_chunked(self, file_name, file_data, mime_type):
+        """Upload a large file as a resumable session: parallel chunk PUTs, then one commit
+        
+        After a failure the session status tells which chunks the server already
+        has, so only the missing ones are sent again.
+        """
+        headers = self.auth_headers()
+        response = requests.post(
+            f"{API_URL}/api/clipboard/uploads",
+            json={
+                "room_id": self.room_id,
+                "username": self.username,
+                "filename": file_name,
+                "size": len(file_data),
+                "mime_type": mime_type,
+                "chunk_size": UPLOAD_CHUNK_SIZE
+            },
+            headers=headers,
+            timeout=10
+        )
+        if response.status_code != 200:
+            return response
+        session = response.json()
+        session_url = f"{API_URL}/api/clipboard/uploads/{session['upload_id']}"
+        chunk_size = session["chunk_size"]
+        
+        def send_chunk(index):
+            chunk = file_data[index * chunk_size:(index + 1) * chunk_size]
+            chunk_headers = {**headers, "X-Chunk-SHA256": hashlib.sha256(chunk).hexdigest()}
+            requests.put(f"{session_url}/{index}", data=chunk, headers=chunk_headers, timeout=60).raise_for_status()
+        
+        received = set(session["received"])
+        for attempt in range(UPLOAD_RETRIES):
+            try:
+                if attempt:
+                    time.sleep(2 ** attempt)
+                    status = requests.get(session_url, headers=headers, timeout=10)
+                    status.raise_for_status()
+                    received = set(status.json()["received"])
+                missing = [index for index in range(session["chunk_count"]) if index not in received]
+                with ThreadPoolExecutor(max_workers=UPLOAD_PARALLEL_CHUNKS) as pool:
+                    list(pool.map(send_chunk, missing))
+                # Committing twice returns the same item, so a lost reply is safe to retry
+                response = requests.post(f"{session_url}/commit", headers=headers, timeout=120)
+                if response.status_code == 409:
+                    # An earlier commit is still assembling the file (or chunks went missing): check again
+                    print(f"DEBUG: Commit of {file_name} not ready yet: {response.text[:100]}")
+                    continue
+                if response.status_code < 500:
+                    return response
+            except requests.RequestException as e:
+                print(f"DEBUG: Chunked upload interrupted (attempt {attempt + 1}): {e}")
+        raise RuntimeError(f"Upload of {file_name} did not finish after {UPLOAD_RETRIES} attempts")
+    
     def upload_to_server(self, content_type, content):
-        """Upload clipboard content to server"""
+        """Upload clipboard content to server, retrying transient failures
+        
+        The Idempotency-Key is made once per copy (this device, the content hash
+        and when the copy was seen), so every retry of it carries the same key
+        and the server stores it at most once; copying it again later does not.
+        """
         print(f"DEBUG: upload_to_server called - room_id: {self.room_id}, username: {self.username}")
         if not all([self.room_id, self.username]):
             print("DEBUG: Missing room_id or username, skipping upload")
             return
         
         try:
-            if content_type == "text":
-                print(f"DEBUG: Uploading text to room {self.room_id}")
-                response = requests.post(
-                    f"{API_URL}/api/clipboard/text",
-                    json={
-                        "room_id": self.room_id,
-                        "username": self.username,
-                        "content": content
-                    },
-                    timeout=10
-                )
+            if content_type in ["file", "folder"]:
+                file_name, file_data, mime_type = content
+                if hasattr(file_data, "getvalue"):
+                    file_data = file_data.getvalue()
+                content = (file_name, file_data, mime_type)
+                payload_hash = hashlib.sha256(file_data).hexdigest()
             elif content_type == "image":
-                # Handle base64 image content
-                import base64
-                if isinstance(content, str):
-                    # Content is already base64 string
-                    base64_content = content
-                else:
-                    # Content is bytes, convert to base64
-                    base64_content = base64.b64encode(content).decode('utf-8')
-                
-                # Create a file-like object from base64
-                import io
-                file_obj = io.BytesIO(base64.b64decode(base64_content))
+                payload_hash = hashlib.sha256(content).hexdigest()
+            else:
+                payload_hash = hashlib.sha256(content.encode()).hexdigest()
+            idempotency_key = f"{self.device_id}:{payload_hash}:{int(time.time() * 1000)}"
+            
+            for attempt in range(UPLOAD_RETRIES):
+                if attempt:
+                    time.sleep(2 ** attempt)
+                try:
+                    response = self.send_upload(content_type, content, payload_hash, self.upload_headers(idempotency_key))
+                except requests.RequestException as e:
+                    print(f"DEBUG: Upload attempt {attempt + 1} failed: {e}")
+                    continue
+                # 409: an earlier attempt is still being saved, asking again returns its result
+                if response.status_code < 500 and response.status_code != 409:
+                    break
+                print(f"DEBUG: Upload attempt {attempt + 1} got {response.status_code}")
+            else:
+                raise RuntimeError(f"no response after {UPLOAD_RETRIES} attempts")
+            
+            print(f"DEBUG: Upload response status: {response.status_code}")
+            if response.status_code == 401:
+                # Token rejected (expired, or server secret rotated): rejoin on next upload
+                self.session_token = None
+            if response.status_code == 200 and content_type != "text":
+                self.known_hashes.add(payload_hash)
+            if response.status_code == 200 and not self.ghost_mode:
+                self.show_notification(f"✅ Uploaded {content_type}")
+        except Exception as e:
+            print(f"DEBUG: Upload error: {e}")
+            if not self.ghost_mode:
+                self.show_notification(f"❌ Upload failed: {str(e)[:50]}")
+    
+    def send_upload(self, content_type, content, payload_hash, headers):
+        """One upload attempt; returns the server response"""
+        if content_type == "text":
+            print(f"DEBUG: Uploading text to room {self.room_id}")
+            return requests.post(
+                f"{API_URL}/api/clipboard/text",
+                json={
+                    "room_id": self.room_id,
+                    "username": self.username,
+                    "content": content
+                },
+                headers=headers,
+                timeout=10
+            )
+        if content_type == "image":
+            response = self.upload_by_hash("image", "image.png", payload_hash, headers)
+            if response is None:
+                # Raw PNG bytes go straight into the multipart body
+                file_obj = io.BytesIO(content)
                 
                 files = {"file": ("image.png", file_obj, "image/png")}
                 data = {"room_id": self.room_id, "username": self.username}
@@ -145,26 +316,28 @@ class ClipboardManagerApp:
                     f"{API_URL}/api/clipboard/image",
                     files=files,
                     data=data,
+                    headers=headers,
                     timeout=30
                 )
-            elif content_type in ["file", "folder"]:
-                files = {"file": content}
-                data = {"room_id": self.room_id, "username": self.username}
-                print(f"DEBUG: Uploading file to room {self.room_id}")
-                response = requests.post(
-                    f"{API_URL}/api/clipboard/file",
-                    files=files,
-                    data=data,
-                    timeout=60
-                )
-            
-            print(f"DEBUG: Upload response status: {response.status_code}")
-            if response.status_code == 200 and not self.ghost_mode:
-                self.show_notification(f"✅ Uploaded {content_type}")
-        except Exception as e:
-            print(f"DEBUG: Upload error: {e}")
-            if not self.ghost_mode:
-                self.show_notification(f"❌ Upload failed: {str(e)[:50]}")
+            return response
+        
+        file_name, file_data, mime_type = content
+        response = self.upload_by_hash("file", file_name, payload_hash, headers)
+        if response is None and len(file_data) > UPLOAD_CHUNK_SIZE:
+            print(f"DEBUG: Uploading {len(file_data)} byte file to room {self.room_id} in chunks")
+            response = self.upload_chunked(file_name, file_data, mime_type)
+        elif response is None:
+            files = {"file": (file_name, file_data, mime_type)}
+            data = {"room_id": self.room_id, "username": self.username}
+            print(f"DEBUG: Uploading file to room {self.room_id}")
+            response = requests.post(
+                f"{API_URL}/api/clipboard/file",
+                files=files,
+                data=data,
+                headers=headers,
+                timeout=60
+            )
+        return response
     
     def monitor_clipboard(self):
         """Background clipboard monitoring"""
@@ -223,11 +396,7 @@ class ClipboardManagerApp:
                         # Only upload if image changed and debounce passed
                         if img_hash != self.last_image_hash and current_time - self.last_upload_time > self.upload_debounce:
                             print("DEBUG: Uploading image to server...")
-                            img_buffer.seek(0)
-                            # Convert image to base64 for upload
-                            import base64
-                            base64_data = base64.b64encode(img_data).decode('utf-8')
-                            self.upload_to_server("image", base64_data)
+                            self.upload_to_server("image", img_data)
                             self.last_image_hash = img_hash
                             self.last_upload_time = current_time
                             print("DEBUG: Image uploaded successfully")
@@ -355,6 +524,11 @@ class ClipboardManagerApp:
                 data = response.json()
                 items = data.get("items", [])
                 
+                # Content already in the room's history need not be uploaded again
+                for entry in items:
+                    if entry.get("sha256") and entry.get("type") != "text":
+                        self.known_hashes.add(entry["sha256"])
+                
                 if not items:
                     self.show_notification("📭 No clipboard history found")
                     return
@@ -506,7 +680,7 @@ class ClipboardManagerApp:
         content_frame.pack(fill=tk.X, padx=10, pady=5)
         
         if item['type'] == 'text':
-            content = item.get('content', '')
+            content = item.get('preview', '')
             preview = content[:100] + '...' if len(content) > 100 else content
             tk.Label(
                 content_frame,
@@ -517,6 +691,8 @@ class ClipboardManagerApp:
                 wraplength=550,
                 justify=tk.LEFT
             ).pack(padx=5, pady=5, anchor=tk.W)
+        elif item['type'] == 'image' and self.add_thumbnail(content_frame, item):
+            pass
         else:
             filename = item.get('filename', 'Unknown file')
             tk.Label(
@@ -559,11 +735,57 @@ class ClipboardManagerApp:
         )
         paste_btn.pack(side=tk.LEFT)
     
+    def add_thumbnail(self, parent, item):
+        """Show the server-rendered thumbnail of an image item; False if it has none
+
+        The image is fetched on a worker thread so opening the overlay never
+        waits on the network; a placeholder stands in until it arrives.
+        """
+        if not item.get('thumbnail_url'):
+            return False
+        label = tk.Label(parent, text="🖼️ Loading preview...", font=('Segoe UI', 9),
+                         bg='#f8f9fa', fg='#7f8c8d')
+        label.pack(padx=5, pady=5, anchor=tk.W)
+        
+        def show(image):
+            if not label.winfo_exists():
+                return  # overlay closed meanwhile
+            if image is None:
+                label.config(text=f"🖼️ {item.get('filename') or 'Image'}")
+                return
+            from PIL import ImageTk
+            photo = ImageTk.PhotoImage(image)
+            label.config(image=photo, text="")
+            label.image = photo  # keep a reference or Tk drops the image
+        
+        def fetch():
+            try:
+                response = requests.get(f"{API_URL}{item['thumbnail_url']}", timeout=5)
+                response.raise_for_status()
+                image = Image.open(io.BytesIO(response.content))
+                image.thumbnail((320, 160))
+            except Exception as e:
+                print(f"DEBUG: Thumbnail error: {e}")
+                image = None
+            try:
+                label.after(0, lambda: show(image))
+            except (RuntimeError, tk.TclError):
+                pass
+        
+        self.thumbnail_pool.submit(fetch)
+        return True
+    
+    def fetch_item_content(self, item):
+        """Fetch the full text of a history item (listings only carry a preview)"""
+        response = requests.get(f"{API_URL}/api/clipboard/item/{item['id']}", timeout=10)
+        response.raise_for_status()
+        return response.json()["item"].get("content", "")
+    
     def copy_history_item(self, item):
         """Copy a specific history item to clipboard"""
         try:
             if item['type'] == 'text':
-                pyperclip.copy(item['content'])
+                pyperclip.copy(self.fetch_item_content(item))
                 self.show_notification("✅ Text copied to clipboard")
             else:
                 # For files/images, copy the download URL
@@ -577,19 +799,14 @@ class ClipboardManagerApp:
         """Paste a specific history item"""
         try:
             if item['type'] == 'text':
-                pyperclip.copy(item['content'])
+                pyperclip.copy(self.fetch_item_content(item))
                 self.show_notification("✅ Text pasted to clipboard")
             elif item['type'] == 'image':
-                # Handle base64 image content
-                base64_content = item.get('content', '')
-                if base64_content:
-                    import base64
-                    import io
-                    from PIL import Image
-                    
-                    # Decode base64 to image
-                    image_bytes = base64.b64decode(base64_content)
-                    image = Image.open(io.BytesIO(image_bytes))
+                # Listings carry no image bytes; download the original
+                file_url = f"{API_URL}/api/clipboard/download/{item['id']}"
+                response = requests.get(file_url, timeout=15)
+                if response.status_code == 200:
+                    image = Image.open(io.BytesIO(response.content))
                     
                     # Save to temporary file
                     temp_path = Path.home() / ".cloudclipboard" / "temp_image.png"
@@ -604,7 +821,6 @@ class ClipboardManagerApp:
                     threading.Timer(5.0, lambda: temp_path.unlink(missing_ok=True)).start()
                 else:
                     # Fallback to URL download
-                    file_url = f"{API_URL}/api/clipboard/download/{item['id']}"
                     pyperclip.copy(file_url)
                     self.show_notification("✅ Image URL pasted to clipboard")
             else:
@@ -7,6 +7,8 @@ API_URL = os.getenv("API_URL", "https://cloudclipboard.onrender.com")  # Render
 # Local storage
 CONFIG_DIR = Path.home() / ".cloudclipboard"
 CONFIG_FILE = CONFIG_DIR / "config.json"
+# Kept apart from config.json, which the login windows rewrite
+DEVICE_ID_FILE = CONFIG_DIR / "device_id"
 
 CONFIG_DIR.mkdir(exist_ok=True)
 
@@ -14,3 +16,8 @@ CONFIG_DIR.mkdir(exist_ok=True)
 HOTKEY_HISTORY = 'ctrl+shift+h'  # Changed to avoid conflict
 HOTKEY_GHOST_MODE = 'ctrl+7'
 HOTKEY_GHOST_PASTE = 'ctrl+shift+v'  # Auto-paste last item
+
+# Files larger than one chunk go up as a resumable upload session
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+UPLOAD_PARALLEL_CHUNKS = 4
+UPLOAD_RETRIES = 5
@@ -31,6 +31,11 @@ class DashboardWindow:
         self.ghost_mode = False
         self.auto_sync = True
         
+        # History cache; refreshes after the first one only fetch the delta
+        self.history_items = []
+        self.history_seq = None
+        self.deleted_cursor = None
+        
         # Create dashboard window
         if parent is None:
             self.window = tk.Tk()
@@ -358,18 +363,62 @@ class DashboardWindow:
         self.update_status(f"Auto sync {status}")
     
     def refresh_history(self):
-        """Refresh clipboard history"""
+        """Refresh clipboard history (full load once, then only newer items)"""
         def fetch_history():
             try:
-                response = requests.get(f"{API_URL}/api/clipboard/history/{self.room_id}", timeout=5)
-                if response.status_code == 200:
+                if self.history_seq is None:
+                    response = requests.get(f"{API_URL}/api/clipboard/history/{self.room_id}", timeout=5)
+                    if response.status_code != 200:
+                        self.window.after(0, lambda: self.update_status("Failed to fetch history"))
+                        return
                     data = response.json()
-                    items = data.get("items", [])
-                    
-                    # Update UI in main thread
-                    self.window.after(0, lambda: self.update_history_display(items))
+                    self.history_items = data.get("items", [])
+                    self.history_seq = data.get("latest_seq") or 0
+                    self.deleted_cursor = data.get("deleted_cursor")
                 else:
-                    self.window.after(0, lambda: self.update_status("Failed to fetch history"))
+                    # Page through the delta until caught up; a device that was offline
+                    # for a while can be more than one page behind
+                    changed = False
+                    while True:
+                        params = {"cursor": self.history_seq}
+                        if self.deleted_cursor is not None:
+                            params["deleted_cursor"] = self.deleted_cursor
+                        response = requests.get(
+                            f"{API_URL}/api/clipboard/since/{self.room_id}",
+                            params=params,
+                            timeout=5
+                        )
+                        if response.status_code == 304:
+                            break
+                        if response.status_code != 200:
+                            self.window.after(0, lambda: self.update_status("Failed to fetch history"))
+                            return
+                        delta = response.json()
+                        if delta.get("reset"):
+                            self.history_seq = None
+                            fetch_history()
+                            return
+                        # Delta is oldest first; the cache is newest first. A repeated
+                        # copy comes back with a new seq, so drop its old entry, and
+                        # drop the rows of deleted items.
+                        stale_ids = {entry["id"] for entry in delta["items"]} | set(delta.get("deleted", []))
+                        self.history_items = list(reversed(delta["items"])) + [
+                            entry for entry in self.history_items if entry["id"] not in stale_ids
+                        ]
+                        self.history_items = self.history_items[:100]
+                        self.history_seq = delta["cursor"]
+                        self.deleted_cursor = delta.get("deleted_cursor", self.deleted_cursor)
+                        changed = True
+                        if not delta.get("has_more"):
+                            break
+                    if not changed:
+                        self.window.after(0, lambda: self.update_status("History up to date"))
+                        return
+                
+                items = self.history_items
+                
+                # Update UI in main thread
+                self.window.after(0, lambda: self.update_history_display(items))
             except Exception as e:
                 self.window.after(0, lambda: self.update_status(f"Error: {str(e)}"))
         
@@ -403,7 +452,8 @@ class DashboardWindow:
                 time_str = str(item['timestamp'])[:8]
             
             if item['type'] == 'text':
-                content = item['content'][:50] + "..." if len(item['content']) > 50 else item['content']
+                preview = item.get('preview') or ''
+                content = preview[:50] + "..." if len(preview) > 50 else preview
                 display_text = f"[{time_str}] {item['username']}: {content}"
             elif item['type'] == 'image':
                 display_text = f"[{time_str}] {item['username']}: 📷 Image"
@@ -445,6 +495,8 @@ class DashboardWindow:
                 response = requests.delete(f"{API_URL}/api/clipboard/clear", timeout=10)
                 if response.status_code == 200:
                     self.update_status("History cleared successfully")
+                    # Everything is gone; reload from scratch
+                    self.history_seq = None
                     self.refresh_history()
                 else:
                     self.update_status("Failed to clear history")
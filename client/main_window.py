@@ -1059,19 +1059,16 @@ Recent Activity:
                 {"content": "Important: Remember to backup data before deployment", "type": "text"}
             ]
             
-            for i, data in enumerate(mock_data):
-                response = requests.post(
-                    f"{API_URL}/api/clipboard/text",
-                    json={
-                        "room_id": self.clipboard_manager.room_id,
-                        "username": f"MockUser{i+1}",
-                        "content": data["content"]
-                    },
-                    timeout=10
-                )
-                if response.status_code == 200:
-                    self.log_message(f"Added mock data {i+1}/5")
-                time.sleep(0.5)  # Small delay between requests
+            # One NDJSON batch instead of a request (and a pause) per item
+            response = requests.post(
+                f"{API_URL}/api/clipboard/batch",
+                params={"room_id": self.clipboard_manager.room_id, "username": self.clipboard_manager.username},
+                data="\n".join(json.dumps(data) for data in mock_data),
+                headers={**self.clipboard_manager.auth_headers(), "Content-Type": "application/x-ndjson"},
+                timeout=10
+            )
+            response.raise_for_status()
+            self.log_message(f"Added mock data {response.json()['saved']}/{len(mock_data)}")
             
             self.log_message("Mock data added successfully!")
             messagebox.showinfo("Success", "Mock data added successfully!")
@@ -0,0 +1,153 @@
+"""
+Room passwords and session tokens.
+
+Passwords are hashed with scrypt on the CPU pool so a join never blocks
+the event loop; a short-lived cache of verified credentials keeps repeated
+joins fast. A successful join returns a signed, expiring session token, and
+clipboard endpoints check it with a local HMAC, without touching MongoDB.
+
+Token format: base64url(JSON claims) "." base64url(HMAC-SHA256(claims)).
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+from cpu_pool import cpu_pool
+
+logger = logging.getLogger(__name__)
+
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+SESSION_TTL = int(os.getenv("SESSION_TTL_HOURS", "24")) * 3600
+REQUIRE_SESSION_TOKEN = os.getenv("REQUIRE_SESSION_TOKEN", "false").lower() == "true"
+
+# scrypt cost: ~16 MB of memory and tens of milliseconds per hash
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_MAXMEM = 64 * 1024 * 1024
+
+CREDENTIAL_CACHE_TTL = 300
+CREDENTIAL_CACHE_SIZE = 1024
+
+if not SESSION_SECRET:
+    # Tokens then only verify on this process; set SESSION_SECRET when running several workers
+    logger.warning("SESSION_SECRET not set, using a random per-process secret")
+    SESSION_SECRET = secrets.token_hex(32)
+_SECRET = SESSION_SECRET.encode()
+
+_verified = OrderedDict()
+
+
+class InvalidSession(Exception):
+    """Raised for malformed, forged or expired session tokens"""
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=SCRYPT_MAXMEM, dklen=32)
+
+
+def _hash_password_sync(password: str) -> str:
+    salt = secrets.token_bytes(16)
+    key = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64encode(salt)}${_b64encode(key)}"
+
+
+def _verify_password_sync(password: str, stored: str) -> bool:
+    if not stored.startswith("scrypt$"):
+        # Rooms created before scrypt hold an unsalted SHA-256 hex digest
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, stored)
+    _, n, r, p, salt, key = stored.split("$")
+    candidate = _scrypt(password, _b64decode(salt), int(n), int(r), int(p))
+    return hmac.compare_digest(candidate, _b64decode(key))
+
+
+def needs_rehash(stored: str) -> bool:
+    return not stored.startswith(f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
+
+
+async def hash_password(password: str) -> str:
+    """Hash a new room password off the event loop"""
+    return await cpu_pool.run("kdf", _hash_password_sync, password)
+
+
+async def verify_password(password: str, stored: str) -> bool:
+    """Check a password against its stored hash, reusing recent successful checks"""
+    # Keyed by an HMAC so the cache never holds anything password-equivalent
+    cache_key = hmac.new(_SECRET, f"{stored}\0{password}".encode(), hashlib.sha256).digest()
+    expires = _verified.get(cache_key)
+    if expires and expires > time.monotonic():
+        _verified.move_to_end(cache_key)
+        return True
+
+    if not await cpu_pool.run("kdf", _verify_password_sync, password, stored):
+        return False
+
+    _verified[cache_key] = time.monotonic() + CREDENTIAL_CACHE_TTL
+    _verified.move_to_end(cache_key)
+    while len(_verified) > CREDENTIAL_CACHE_SIZE:
+        _verified.popitem(last=False)
+    return True
+
+
+def issue_session(room_id: str, username: str) -> Tuple[str, int]:
+    """Sign a session token for a room member; returns (token, expires_at)"""
+    expires_at = int(time.time()) + SESSION_TTL
+    claims = json.dumps({"room_id": room_id, "username": username, "exp": expires_at}, separators=(",", ":"))
+    payload = _b64encode(claims.encode())
+    signature = hmac.new(_SECRET, payload.encode(), hashlib.sha256).digest()
+    return f"{payload}.{_b64encode(signature)}", expires_at
+
+
+def verify_session(token: str) -> dict:
+    """Return the claims of a valid token or raise InvalidSession"""
+    try:
+        payload, signature = token.split(".")
+        expected = hmac.new(_SECRET, payload.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature)):
+            raise InvalidSession("bad signature")
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, TypeError) as e:
+        raise InvalidSession(str(e))
+    if claims.get("exp", 0) < time.time():
+        raise InvalidSession("expired")
+    return claims
+
+
+def room_session(request: Optional[Request], room_id: str, username: str) -> bool:
+    """Check the request's bearer token against the room and user
+
+    Returns True when a valid token vouches for the room (callers may skip
+    their room lookup) and False when no token was sent. Raises 401/403 for
+    bad tokens, or when REQUIRE_SESSION_TOKEN is set and none was sent.
+    """
+    header = request.headers.get("authorization", "") if request else ""
+    if not header.lower().startswith("bearer "):
+        if REQUIRE_SESSION_TOKEN:
+            raise HTTPException(status_code=401, detail="Session token required")
+        return False
+
+    try:
+        claims = verify_session(header[7:].strip())
+    except InvalidSession:
+        raise HTTPException(status_code=401, detail="Invalid or expired session token")
+    if claims["room_id"] != room_id or claims["username"] != username:
+        raise HTTPException(status_code=403, detail="Session token is for another room or user")
+    return True
@@ -0,0 +1,238 @@
+"""
+Fan-out backplanes that carry room events between server workers.
+
+The RoomHub only reaches clients attached to its own process. With
+`uvicorn --workers N` or several instances, every published event goes
+through a backplane, which delivers it to the hub of every worker
+(including the publisher's own).
+
+    EVENT_BACKPLANE=memory  single worker (default)
+    EVENT_BACKPLANE=unix    workers on one host, via a Unix-socket broker
+    EVENT_BACKPLANE=mongo   any number of hosts, via a tailed capped collection
+"""
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+EVENT_BACKPLANE = os.getenv("EVENT_BACKPLANE", "memory")
+EVENT_SOCKET_PATH = os.getenv("EVENT_SOCKET_PATH", "/tmp/cloudclipboard-events.sock")
+EVENTS_COLLECTION_BYTES = 16 * 1024 * 1024
+RECONNECT_DELAY = 1.0
+
+
+class Backplane:
+    """Carries (room_id, event) pairs to the hub of every worker"""
+
+    name = "base"
+
+    async def start(self, deliver, resync=None):
+        """deliver(room_id, event) hands a received event to the local hub
+
+        resync() is awaited after a gap in which events may have been missed.
+        """
+        self._deliver = deliver
+        self._resync = resync
+
+    async def _report_gap(self):
+        if self._resync:
+            await self._resync()
+
+    async def publish(self, room_id: str, event: dict):
+        raise NotImplementedError
+
+    async def stop(self):
+        pass
+
+
+class InMemoryBackplane(Backplane):
+    """Single-process delivery straight into the local hub"""
+
+    name = "memory"
+
+    async def publish(self, room_id: str, event: dict):
+        await self._deliver(room_id, event)
+
+
+class UnixSocketBackplane(Backplane):
+    """Multiprocess fan-out through a broker listening on a Unix socket
+
+    Whichever worker takes the lock file hosts the broker; every worker
+    (the host included) connects as a peer. If the broker's worker dies its
+    lock is released and the surviving workers elect a new one on reconnect.
+    """
+
+    name = "unix"
+    MAX_PEER_BUFFER = 4 * 1024 * 1024
+
+    def __init__(self, socket_path: str = EVENT_SOCKET_PATH):
+        import fcntl  # Unix only; imported here so other backplanes work everywhere
+        self._fcntl = fcntl
+        self.socket_path = socket_path
+        self._lock_file = None
+        self._server = None
+        self._peers = set()
+        self._writer = None
+        self._task = None
+
+    async def start(self, deliver, resync=None):
+        await super().start(deliver, resync)
+        self._task = asyncio.create_task(self._run())
+
+    async def publish(self, room_id: str, event: dict):
+        line = json.dumps({"room_id": room_id, "event": event}).encode() + b"\n"
+        if self._writer is None or self._writer.is_closing():
+            # Broker unreachable: at least reach this worker's subscribers
+            logger.warning("Event broker unavailable, delivering locally only")
+            await self._deliver(room_id, event)
+            return
+        self._writer.write(line)
+        await self._writer.drain()
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        if self._writer:
+            self._writer.close()
+        if self._server:
+            self._server.close()
+        if self._lock_file:
+            self._lock_file.close()
+
+    async def _run(self):
+        connected_before = False
+        while True:
+            try:
+                await self._try_host_broker()
+                reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+                logger.info(f"📡 Connected to event broker at {self.socket_path}")
+                if connected_before:
+                    # Whatever was published while disconnected never reached this worker
+                    await self._report_gap()
+                connected_before = True
+                while line := await reader.readline():
+                    message = json.loads(line)
+                    await self._deliver(message["room_id"], message["event"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Event broker connection lost: {e}")
+            self._writer = None
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _try_host_broker(self):
+        if self._server is not None:
+            return
+        lock_file = open(f"{self.socket_path}.lock", "w")
+        try:
+            self._fcntl.flock(lock_file, self._fcntl.LOCK_EX | self._fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return
+        self._lock_file = lock_file
+        # A socket file left by a dead broker would make bind fail
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._serve_peer, self.socket_path)
+        logger.info(f"📡 Hosting event broker on {self.socket_path} (pid {os.getpid()})")
+
+    async def _serve_peer(self, reader, writer):
+        self._peers.add(writer)
+        try:
+            while line := await reader.readline():
+                for peer in list(self._peers):
+                    if peer.transport.get_write_buffer_size() > self.MAX_PEER_BUFFER:
+                        # A stalled worker must not grow the broker's memory without bound
+                        logger.warning("Dropping stalled event broker peer")
+                        self._peers.discard(peer)
+                        peer.close()
+                        continue
+                    peer.write(line)
+        except ConnectionError:
+            pass
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+
+class MongoCappedBackplane(Backplane):
+    """Cross-host fan-out by tailing a capped `room_events` collection
+
+    Publishing is one insert; each worker holds a tailable await cursor that
+    wakes as soon as a new document is appended.
+    """
+
+    name = "mongo"
+
+    def __init__(self, database, collection_name: str = "room_events"):
+        self.database = database
+        self.collection_name = collection_name
+        self.collection = database[collection_name]
+        self.worker_id = uuid.uuid4().hex
+        self._task = None
+
+    async def start(self, deliver, resync=None):
+        await super().start(deliver, resync)
+        try:
+            await self.database.create_collection(
+                self.collection_name, capped=True, size=EVENTS_COLLECTION_BYTES
+            )
+            # Tailable cursors die immediately on an empty collection
+            await self.collection.insert_one({"room_id": None, "created_at": datetime.utcnow()})
+        except CollectionInvalid:
+            pass
+        self._task = asyncio.create_task(self._tail())
+
+    async def publish(self, room_id: str, event: dict):
+        await self.collection.insert_one({
+            "room_id": room_id,
+            "event": event,
+            "origin": self.worker_id,
+            "created_at": datetime.utcnow()
+        })
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def _tail(self):
+        # Start from the newest event: history is served by /since, not the backplane
+        newest = await self.collection.find_one({}, sort=[("$natural", -1)])
+        last_id = newest["_id"] if newest else None
+        while True:
+            try:
+                query = {"_id": {"$gt": last_id}} if last_id else {}
+                cursor = self.collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+                while cursor.alive:
+                    async for doc in cursor:
+                        last_id = doc["_id"]
+                        if doc.get("room_id") is not None:
+                            await self._deliver(doc["room_id"], doc["event"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Event tail interrupted: {e}")
+                try:
+                    if last_id and not await self.collection.find_one({"_id": last_id}, {"_id": 1}):
+                        # The capped collection wrapped past our position: events were lost
+                        await self._report_gap()
+                except Exception as e:
+                    logger.warning(f"Could not check the event tail position: {e}")
+            await asyncio.sleep(RECONNECT_DELAY)
+
+
+def create_backplane() -> Backplane:
+    """Build the backplane configured by EVENT_BACKPLANE"""
+    if EVENT_BACKPLANE == "unix":
+        return UnixSocketBackplane()
+    if EVENT_BACKPLANE == "mongo":
+        from database import db
+        return MongoCappedBackplane(db)
+    return InMemoryBackplane()
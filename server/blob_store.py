@@ -0,0 +1,382 @@
+"""
+Content-addressed blob storage for image and file payloads.
+
+Clipboard documents only keep a small reference ({"sha256", "size"}) while the
+bytes live in a blob backend keyed by their SHA-256. Identical payloads copied
+by several devices are stored once and reference counted in `blob_refs`.
+
+Releasing the last reference marks the ref document as deleting before the
+data goes, and only removes it afterwards. New references to that content wait
+until it is gone and then store the data afresh, so a revived reference never
+points at data that is being deleted.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from gridfs.errors import FileExists, NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from database import db, blob_refs_collection
+from cpu_pool import cpu_pool
+
+logger = logging.getLogger(__name__)
+
+# Blob backend: "gridfs" keeps payloads in MongoDB, "local" on the filesystem
+BLOB_BACKEND = os.getenv("BLOB_BACKEND", "gridfs")
+BLOB_DIR = Path(os.getenv("BLOB_DIR", "uploads/blobs"))
+READ_CHUNK_SIZE = 256 * 1024
+# How often a new reference re-checks a blob being deleted, and when a deletion counts as abandoned
+DELETE_POLL_INTERVAL = 0.05
+DELETE_TIMEOUT = timedelta(seconds=60)
+# GridFS chunks without a files document that haven't grown for this long are left by a crashed upload
+ORPHAN_CHUNK_AGE = timedelta(seconds=30)
+WRITE_ATTEMPTS = 3
+
+
+class BlobNotFound(Exception):
+    """Raised when a referenced blob is missing from the backend"""
+
+
+def _sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobWriter:
+    """Write-only file-like sink that hashes and spools bytes to disk as they arrive
+
+    It reports itself as unseekable so zipfile streams into it (data descriptors
+    instead of seeking back), which keeps hashing in a single forward pass.
+    """
+
+    def __init__(self, staging_dir: Path):
+        staging_dir.mkdir(parents=True, exist_ok=True)
+        self._file = tempfile.NamedTemporaryFile(dir=staging_dir, suffix=".part", delete=False)
+        self.path = Path(self._file.name)
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self._hash.update(data)
+        self._file.write(data)
+        self.size += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.size
+
+    def seekable(self) -> bool:
+        return False
+
+    def flush(self):
+        self._file.flush()
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def discard(self):
+        self.close()
+        self.path.unlink(missing_ok=True)
+
+
+class BlobStore:
+    """Reference counted content-addressed store; backends implement the _ methods"""
+
+    name = "base"
+    staging_dir = Path(tempfile.gettempdir()) / "cloudclipboard-staging"
+
+    def open_writer(self) -> BlobWriter:
+        """Start a streamed blob; finish it with put_writer()"""
+        return BlobWriter(self.staging_dir)
+
+    async def put(self, data: bytes) -> dict:
+        """Store bytes (once per hash) and return a reference for the clipboard document"""
+        sha256 = await cpu_pool.run("hash", _sha256_hex, data)
+        await self._add_ref(sha256, len(data))
+        try:
+            if not await self._exists(sha256):
+                await self._write(sha256, data)
+            else:
+                logger.info(f"♻️ Blob deduplicated: {sha256[:12]} ({len(data)} bytes)")
+        except Exception:
+            # Nothing will point at this reference
+            await self.release(sha256)
+            raise
+        return {"sha256": sha256, "size": len(data)}
+
+    async def put_writer(self, writer: BlobWriter) -> dict:
+        """Store a spooled BlobWriter (once per hash) and return its reference"""
+        writer.close()
+        sha256, size = writer.sha256, writer.size
+        try:
+            await self._add_ref(sha256, size)
+            try:
+                if not await self._exists(sha256):
+                    await self._write_file(sha256, writer.path)
+                else:
+                    logger.info(f"♻️ Blob deduplicated: {sha256[:12]} ({size} bytes)")
+            except Exception:
+                await self.release(sha256)
+                raise
+        finally:
+            writer.discard()
+        return {"sha256": sha256, "size": size}
+
+    async def _add_ref(self, sha256: str, size: int):
+        """Take a reference before writing, waiting out a deletion of the same content"""
+        while True:
+            try:
+                # A ref document marked deleting doesn't match, so the upsert collides with it
+                await blob_refs_collection.update_one(
+                    {"_id": sha256, "deleting": {"$exists": False}},
+                    {
+                        "$inc": {"refs": 1},
+                        "$setOnInsert": {
+                            "size": size,
+                            "backend": self.name,
+                            "created_at": datetime.utcnow()
+                        }
+                    },
+                    upsert=True
+                )
+                return
+            except DuplicateKeyError:
+                pass
+            # Being deleted (or a racing upsert of new content): retry once the release finished,
+            # or take over a deletion whose worker died midway
+            await blob_refs_collection.update_one(
+                {"_id": sha256, "deleting": {"$lt": datetime.utcnow() - DELETE_TIMEOUT}},
+                {"$unset": {"deleting": ""}, "$set": {"refs": 0}}
+            )
+            await asyncio.sleep(DELETE_POLL_INTERVAL)
+
+    async def retain(self, sha256: str) -> bool:
+        """Take another reference on a stored blob; False if it no longer exists"""
+        result = await blob_refs_collection.update_one(
+            {"_id": sha256, "refs": {"$gt": 0}},
+            {"$inc": {"refs": 1}}
+        )
+        return result.matched_count == 1
+
+    async def read(self, sha256: str) -> bytes:
+        """Read a whole blob"""
+        return await self._read(sha256)
+
+    async def open_range(self, sha256: str, start: int, end: int, chunk_size: int = READ_CHUNK_SIZE):
+        """Open bytes start..end (inclusive) and return an async iterator over them
+
+        Missing blobs raise BlobNotFound here, before any response has started.
+        """
+        return await self._open_range(sha256, start, end, chunk_size)
+
+    async def release(self, sha256: str):
+        """Drop one reference and delete the data once nothing points at it"""
+        ref = await blob_refs_collection.find_one_and_update(
+            {"_id": sha256},
+            {"$inc": {"refs": -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if ref is None or ref.get("refs", 0) > 0:
+            return
+        # Tombstone first: retain() refuses it and new puts wait until the data is gone
+        marked = await blob_refs_collection.update_one(
+            {"_id": sha256, "refs": {"$lte": 0}, "deleting": {"$exists": False}},
+            {"$set": {"deleting": datetime.utcnow()}}
+        )
+        if not marked.modified_count:
+            return
+        await self._delete(sha256)
+        await blob_refs_collection.delete_one({"_id": sha256, "deleting": {"$exists": True}})
+
+    async def purge(self):
+        """Delete every blob (used when all clipboard content is cleared)"""
+        async for ref in blob_refs_collection.find({}, {"_id": 1}):
+            await self._delete(ref["_id"])
+        await blob_refs_collection.delete_many({})
+
+    async def _exists(self, sha256: str) -> bool:
+        raise NotImplementedError
+
+    async def _write(self, sha256: str, data: bytes):
+        raise NotImplementedError
+
+    async def _write_file(self, sha256: str, path: Path):
+        raise NotImplementedError
+
+    async def _read(self, sha256: str) -> bytes:
+        raise NotImplementedError
+
+    async def _open_range(self, sha256: str, start: int, end: int, chunk_size: int):
+        raise NotImplementedError
+
+    async def _delete(self, sha256: str):
+        raise NotImplementedError
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs as files under BLOB_DIR, sharded by hash prefix"""
+
+    name = "local"
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        # Stage next to the blobs so committing is an atomic rename
+        self.staging_dir = root / "staging"
+
+    def _path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256[2:4] / sha256
+
+    async def _exists(self, sha256: str) -> bool:
+        return self._path(sha256).exists()
+
+    async def _write(self, sha256: str, data: bytes):
+        await asyncio.to_thread(self._write_sync, self._path(sha256), data)
+
+    @staticmethod
+    def _write_sync(path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp name and rename so readers never see a partial blob
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    async def _write_file(self, sha256: str, path: Path):
+        target = self._path(sha256)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(path, target)
+
+    async def _read(self, sha256: str) -> bytes:
+        path = self._path(sha256)
+        if not path.exists():
+            raise BlobNotFound(sha256)
+        return await asyncio.to_thread(path.read_bytes)
+
+    async def _open_range(self, sha256: str, start: int, end: int, chunk_size: int):
+        path = self._path(sha256)
+        try:
+            f = await asyncio.to_thread(open, path, "rb")
+        except FileNotFoundError as e:
+            raise BlobNotFound(sha256) from e
+
+        async def chunks():
+            try:
+                await asyncio.to_thread(f.seek, start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    chunk = await asyncio.to_thread(f.read, min(chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    yield chunk
+            finally:
+                f.close()
+
+        return chunks()
+
+    async def _delete(self, sha256: str):
+        self._path(sha256).unlink(missing_ok=True)
+
+
+class GridFSBlobStore(BlobStore):
+    """Blobs as GridFS files whose _id is the SHA-256"""
+
+    name = "gridfs"
+
+    def __init__(self, database):
+        self.bucket = AsyncIOMotorGridFSBucket(database, bucket_name="blobs")
+        self.files = database["blobs.files"]
+        self.chunks = database["blobs.chunks"]
+
+    async def _exists(self, sha256: str) -> bool:
+        return await self.files.find_one({"_id": sha256}, {"_id": 1}) is not None
+
+    async def _write(self, sha256: str, data: bytes):
+        for _ in range(WRITE_ATTEMPTS):
+            if await self._upload(sha256, data):
+                return
+        raise RuntimeError(f"Could not store blob {sha256[:12]}: its upload keeps colliding")
+
+    async def _write_file(self, sha256: str, path: Path):
+        for _ in range(WRITE_ATTEMPTS):
+            with open(path, "rb") as source:
+                if await self._upload(sha256, source):
+                    return
+        raise RuntimeError(f"Could not store blob {sha256[:12]}: its upload keeps colliding")
+
+    async def _upload(self, sha256: str, source) -> bool:
+        """Upload once; False when the caller must upload again after orphaned chunks were cleared
+
+        A collision (GridIn reports it as FileExists) only counts as stored once
+        the files document exists: until then another request may still be
+        writing the same content, or a crashed upload left its chunks behind.
+        """
+        try:
+            await self.bucket.upload_from_stream_with_id(sha256, sha256, source)
+            return True
+        except (FileExists, DuplicateKeyError):
+            pass
+        while not await self._exists(sha256):
+            newest = await self.chunks.find_one({"files_id": sha256}, {"_id": 1}, sort=[("_id", -1)])
+            if newest is None:
+                return False
+            if newest["_id"].generation_time < datetime.now(timezone.utc) - ORPHAN_CHUNK_AGE:
+                logger.warning(f"Removing orphaned chunks of blob {sha256[:12]} left by a failed upload")
+                await self.chunks.delete_many({"files_id": sha256})
+                return False
+            # Another writer is still uploading; it finishes with the files document
+            await asyncio.sleep(DELETE_POLL_INTERVAL)
+        return True
+
+    async def _read(self, sha256: str) -> bytes:
+        try:
+            grid_out = await self.bucket.open_download_stream(sha256)
+        except NoFile as e:
+            raise BlobNotFound(sha256) from e
+        return await grid_out.read()
+
+    async def _open_range(self, sha256: str, start: int, end: int, chunk_size: int):
+        try:
+            grid_out = await self.bucket.open_download_stream(sha256)
+        except NoFile as e:
+            raise BlobNotFound(sha256) from e
+
+        async def chunks():
+            grid_out.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await grid_out.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+        return chunks()
+
+    async def _delete(self, sha256: str):
+        try:
+            await self.bucket.delete(sha256)
+        except NoFile:
+            pass
+
+
+def create_blob_store() -> BlobStore:
+    """Build the blob store configured by BLOB_BACKEND"""
+    if BLOB_BACKEND == "local":
+        return LocalBlobStore(BLOB_DIR)
+    return GridFSBlobStore(db)
+
+
+blob_store = create_blob_store()
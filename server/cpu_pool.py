@@ -0,0 +1,99 @@
+"""
+Executor stage for CPU-heavy transforms (deflate, hashing, base64, images).
+
+Handlers await `cpu_pool.run(...)` instead of calling the transform inline,
+so a 50MB upload no longer stalls every other request on the worker. The
+number of tasks queued or running is bounded; when the pool stays saturated
+for CPU_QUEUE_TIMEOUT seconds callers get CpuPoolBusy (answered with 503).
+
+    CPU_POOL=thread   zlib, hashlib and Pillow release the GIL (default)
+    CPU_POOL=process  separate processes for pure-Python transforms
+
+Stateful steps (feeding a zip stream or a hash that lives in this process)
+pass local=True and always run on the thread pool.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+CPU_POOL = os.getenv("CPU_POOL", "thread")
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", str(os.cpu_count() or 2)))
+CPU_QUEUE_SIZE = int(os.getenv("CPU_QUEUE_SIZE", str(CPU_POOL_WORKERS * 4)))
+CPU_QUEUE_TIMEOUT = float(os.getenv("CPU_QUEUE_TIMEOUT", "30"))
+
+
+class CpuPoolBusy(Exception):
+    """Raised when no executor slot frees up within CPU_QUEUE_TIMEOUT"""
+
+
+def _timed(fn, *args):
+    # Runs inside the executor; module level so process pools can pickle it
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+class CpuPool:
+    """Bounded executor stage with per-task timing metrics"""
+
+    def __init__(self, kind: str = CPU_POOL, workers: int = CPU_POOL_WORKERS, queue_size: int = CPU_QUEUE_SIZE):
+        self.kind = kind
+        self.workers = workers
+        self.queue_size = queue_size
+        self._threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cpu")
+        self._processes = ProcessPoolExecutor(max_workers=workers) if kind == "process" else None
+        self._slots = None
+        self._pending = 0
+        self._metrics = defaultdict(lambda: {"tasks": 0, "wait_seconds": 0.0, "run_seconds": 0.0, "max_run_seconds": 0.0})
+
+    async def run(self, name: str, fn, *args, local: bool = False):
+        """Run fn(*args) in the pool and return its result"""
+        if self._slots is None:
+            # Created lazily so it binds to the running event loop
+            self._slots = asyncio.Semaphore(self.queue_size)
+
+        queued = time.perf_counter()
+        self._pending += 1
+        try:
+            try:
+                await asyncio.wait_for(self._slots.acquire(), CPU_QUEUE_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(f"CPU pool saturated, rejecting {name} task")
+                raise CpuPoolBusy(name)
+            try:
+                executor = self._threads if local or self._processes is None else self._processes
+                started = time.perf_counter()
+                result, run_seconds = await asyncio.get_running_loop().run_in_executor(executor, _timed, fn, *args)
+            finally:
+                self._slots.release()
+        finally:
+            self._pending -= 1
+
+        metrics = self._metrics[name]
+        metrics["tasks"] += 1
+        metrics["wait_seconds"] += started - queued
+        metrics["run_seconds"] += run_seconds
+        metrics["max_run_seconds"] = max(metrics["max_run_seconds"], run_seconds)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "pending": self._pending,
+            "tasks": {name: dict(metrics) for name, metrics in self._metrics.items()}
+        }
+
+    def shutdown(self):
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        if self._processes:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+
+
+cpu_pool = CpuPool()
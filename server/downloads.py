@@ -0,0 +1,126 @@
+"""
+HTTP caching and byte-range helpers for clipboard downloads.
+
+Clipboard items never change once written, so payloads are served with an
+ETag and immutable Cache-Control, answer conditional GETs with 304 and honor
+single byte ranges (206) so clients can resume or partially fetch large items.
+"""
+import re
+from typing import Awaitable, Callable, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+# Private: clipboard content must not be kept by shared proxies
+CACHE_CONTROL_IMMUTABLE = "private, max-age=31536000, immutable"
+# For stand-in responses that must not be cached in place of the real thing
+CACHE_CONTROL_NO_STORE = "no-store"
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a Range header lies outside the payload"""
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single "bytes=" range into an inclusive (start, end) pair
+
+    Returns None when the whole payload should be sent (no header, multiple
+    ranges or a malformed header, which RFC 9110 lets servers ignore).
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, size - 1)
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match / If-Range value matches the ETag"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [value.strip() for value in header.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+def not_modified(request: Request, etag: str, cache_control: str = CACHE_CONTROL_IMMUTABLE) -> Optional[Response]:
+    """Return a 304 response when the client already holds this ETag"""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cache_headers(etag, cache_control))
+    return None
+
+
+def cache_headers(etag: str, cache_control: str = CACHE_CONTROL_IMMUTABLE) -> dict:
+    return {"ETag": etag, "Cache-Control": cache_control}
+
+
+async def payload_response(
+    request: Request,
+    *,
+    etag: str,
+    size: int,
+    media_type: str,
+    disposition: str,
+    open_range: Callable[[int, int], Awaitable],
+    cache_control: str = CACHE_CONTROL_IMMUTABLE,
+) -> Response:
+    """Build a 200/206/304/416 streamed response for an immutable payload
+
+    open_range(start, end) must return an async iterator over the inclusive range.
+    """
+    cached = not_modified(request, etag, cache_control)
+    if cached:
+        return cached
+
+    headers = cache_headers(etag, cache_control)
+    headers["Accept-Ranges"] = "bytes"
+    headers["Content-Disposition"] = disposition
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if size and (not if_range or etag_matches(if_range, etag)):
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+
+    if byte_range is None:
+        if size == 0:
+            return Response(content=b"", media_type=media_type, headers=headers)
+        start, end, status_code = 0, size - 1, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    headers["Content-Length"] = str(end - start + 1)
+    body = await open_range(start, end)
+    return StreamingResponse(body, status_code=status_code, media_type=media_type, headers=headers)
+
+
+def memory_range(data: bytes, chunk_size: int = 256 * 1024):
+    """open_range() implementation for payloads already in memory"""
+    async def open_range(start: int, end: int):
+        async def chunks():
+            for offset in range(start, end + 1, chunk_size):
+                yield data[offset:min(offset + chunk_size, end + 1)]
+        return chunks()
+    return open_range
@@ -0,0 +1,164 @@
+"""
+In-process notification hub for room clipboard events.
+
+Upload/delete handlers publish small metadata-only events. Streaming
+subscribers (WebSocket, SSE) each get a bounded queue so a slow client can
+never hold up the publisher; long-poll requests park on a per-room
+condition until the room's head sequence moves past their cursor.
+
+Publishing goes through a backplane (see backplane.py) so that with several
+workers every worker's hub sees every event.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+
+from fastapi.encoders import jsonable_encoder
+
+from backplane import Backplane, create_backplane
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 256
+ALL_ROOMS = "*"  # pseudo room: delivered to every room with local subscribers
+
+
+def item_created_event(summary: dict) -> dict:
+    return jsonable_encoder({
+        "event": "item.created",
+        "room_id": summary["room_id"],
+        "seq": summary.get("seq"),
+        "item": summary
+    })
+
+
+def item_deleted_event(room_id: str, item_id: str, seq: int = None, deleted_seq: int = None) -> dict:
+    """deleted_seq is the deletion's position in the room's log (see database.record_deletion)"""
+    return {"event": "item.deleted", "room_id": room_id, "id": item_id, "seq": seq, "deleted_seq": deleted_seq}
+
+
+def room_cleared_event(room_id: str) -> dict:
+    return {"event": "room.cleared", "room_id": room_id}
+
+
+class RoomHub:
+    """Fan room events out to the local subscribers of each room"""
+
+    def __init__(self, backplane: Backplane, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.backplane = backplane
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        # Highest seq seen per room, and conditions for rooms with parked long-polls
+        self._head_seq = {}
+        self._conditions = {}
+        self._waiters = defaultdict(int)
+        self._listeners = []
+
+    async def start(self):
+        await self.backplane.start(self._receive, self._resync_all)
+        logger.info(f"📡 Room events using the {self.backplane.name} backplane")
+
+    async def stop(self):
+        await self.backplane.stop()
+
+    def add_listener(self, listener):
+        """Call listener(room_id, event) for every event received, whatever the room"""
+        self._listeners.append(listener)
+
+    def subscribe(self, room_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[room_id].add(queue)
+        return queue
+
+    def unsubscribe(self, room_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(room_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[room_id]
+
+    def subscriber_count(self, room_id: str = None) -> int:
+        if room_id is not None:
+            return len(self._subscribers.get(room_id, ()))
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    async def publish(self, room_id: str, event: dict):
+        """Publish an event to everyone watching the room, on every worker
+
+        Never raises: events follow writes that already committed, and clients
+        that miss one catch up through /since.
+        """
+        try:
+            await self.backplane.publish(room_id, event)
+        except Exception as e:
+            logger.error(f"Could not publish {event.get('event')} in room {room_id}: {e}")
+
+    def head_seq(self, room_id: str) -> int:
+        """Highest item seq this hub has seen published in the room"""
+        return self._head_seq.get(room_id, 0)
+
+    async def wait_for_seq(self, room_id: str, after: int, timeout: float) -> bool:
+        """Park until an item with seq > after is published in the room, or time out"""
+        condition = self._conditions.get(room_id)
+        if condition is None:
+            condition = self._conditions[room_id] = asyncio.Condition()
+        self._waiters[room_id] += 1
+        try:
+            async with condition:
+                await asyncio.wait_for(
+                    condition.wait_for(lambda: self._head_seq.get(room_id, 0) > after),
+                    timeout
+                )
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._waiters[room_id] -= 1
+            if not self._waiters[room_id]:
+                del self._waiters[room_id]
+                self._conditions.pop(room_id, None)
+
+    async def publish_all(self, event_factory):
+        """Publish event_factory(room_id) to every room with subscribers, on every worker"""
+        await self.publish(ALL_ROOMS, event_factory(ALL_ROOMS))
+
+    async def _resync_all(self):
+        """Backplane callback after a gap: listeners and subscribers of every room start over"""
+        logger.warning("Room events may have been missed, requesting resync in every room")
+        await self._receive(ALL_ROOMS, {"event": "resync", "room_id": ALL_ROOMS})
+
+    async def _receive(self, room_id: str, event: dict):
+        """Backplane callback: hand an event to this worker's listeners and subscribers"""
+        for listener in self._listeners:
+            try:
+                listener(room_id, event)
+            except Exception as e:
+                logger.error(f"Event listener failed on {event.get('event')} in room {room_id}: {e}")
+        if room_id != ALL_ROOMS:
+            await self._deliver(room_id, event)
+            return
+        for local_room in list(self._subscribers):
+            await self._deliver(local_room, {**event, "room_id": local_room})
+
+    async def _deliver(self, room_id: str, event: dict):
+        seq = event.get("seq")
+        if event.get("event") == "item.created" and seq and seq > self._head_seq.get(room_id, 0):
+            self._head_seq[room_id] = seq
+            condition = self._conditions.get(room_id)
+            if condition is not None:
+                async with condition:
+                    condition.notify_all()
+
+        for queue in list(self._subscribers.get(room_id, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # The subscriber fell behind: drop its backlog and ask it to resync
+                logger.warning(f"Subscriber queue full in room {room_id}, requesting resync")
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"event": "resync", "room_id": room_id})
+
+
+hub = RoomHub(create_backplane())
@@ -0,0 +1,257 @@
+"""
+Write-through cache of the newest items of active rooms.
+
+The ghost-paste hotkey reads /api/clipboard/last and clients open a room
+with the first history page; once a room is warm both are answered from
+memory. Local inserts, deletes and clears write through, and events from
+the hub (including other workers' inserts, deletes and clears) keep every
+worker's tail in step; after a resync, when events may have been missed,
+the affected tails are reloaded. Rooms are evicted least-recently-used under a byte
+budget, and concurrent loads of a cold room share one database query.
+"""
+import asyncio
+import logging
+import os
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Optional
+
+from database import clipboard_collection
+from events import ALL_ROOMS, hub
+from items import ITEM_PROJECTION, to_summary, history_query
+
+logger = logging.getLogger(__name__)
+
+HOT_TAIL_SIZE = int(os.getenv("HOT_TAIL_SIZE", "100"))
+HOT_TAIL_BUDGET = int(os.getenv("HOT_TAIL_BUDGET_MB", "16")) * 1024 * 1024
+MAX_CACHED_CONTENT = 64 * 1024  # larger texts are read from MongoDB on demand
+ITEM_OVERHEAD = 512  # rough per-item cost of the dict and its fixed fields
+ROOM_OVERHEAD = 256  # so that many empty rooms still count against the budget
+
+# Like ITEM_PROJECTION, but oversized text bodies stay in the database
+HOT_TAIL_PROJECTION = {
+    **ITEM_PROJECTION,
+    "content": {"$cond": [
+        {"$and": [
+            {"$eq": ["$type", "text"]},
+            {"$lte": [{"$strLenBytes": {"$ifNull": ["$content", ""]}}, MAX_CACHED_CONTENT]}
+        ]},
+        "$content",
+        "$$REMOVE"
+    ]},
+}
+
+
+def is_full_item(item: dict) -> bool:
+    """True if the cached entry can stand in for an ITEM_PROJECTION read"""
+    if "metadata" not in item:
+        return False
+    return item.get("type") != "text" or "content" in item
+
+
+def _summary(item: dict) -> dict:
+    return {field: value for field, value in item.items() if field not in ("metadata", "content")}
+
+
+def _estimate_size(item: dict) -> int:
+    strings = sum(len(value) for value in item.values() if isinstance(value, str))
+    return ITEM_OVERHEAD + strings + len(str(item.get("metadata", "")))
+
+
+class RoomTail:
+    """The newest items of one room, newest first
+
+    complete means the tail holds every item of the room, so any history
+    page fits; otherwise it holds an unbroken run of the newest items.
+    """
+
+    __slots__ = ("items", "complete", "size")
+
+    def __init__(self, items: list, complete: bool):
+        self.items = items
+        self.complete = complete
+        self.size = ROOM_OVERHEAD + sum(_estimate_size(item) for item in items)
+
+
+class HotTail:
+    """Per-room ring buffers of recent items with a global LRU byte budget"""
+
+    def __init__(self, per_room: int = HOT_TAIL_SIZE, budget: int = HOT_TAIL_BUDGET):
+        self.per_room = per_room
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._rooms = OrderedDict()
+        # Rooms being loaded: the shared load task and events that arrived meanwhile
+        self._loads = {}
+        self._pending = {}
+
+    async def last(self, room_id: str) -> Optional[dict]:
+        """The room's newest item, or None when the database must answer"""
+        tail = await self._room(room_id)
+        if not tail.items or not is_full_item(tail.items[0]):
+            return None
+        return dict(tail.items[0])
+
+    async def first_page(self, room_id: str, limit: int) -> Optional[list]:
+        """Summaries of the room's newest items, or None when the tail is too short"""
+        tail = await self._room(room_id)
+        if limit > len(tail.items) and not tail.complete:
+            return None
+        return [_summary(item) for item in tail.items[:limit]]
+
+    def add(self, item: dict):
+        """Write through a newly inserted item"""
+        room_id = item["room_id"]
+        tail = self._rooms.get(room_id)
+        if tail is not None:
+            self._safe_apply(room_id, tail, {"event": "item.created", "item": item})
+        elif room_id in self._pending:
+            self._pending[room_id].append({"event": "item.created", "item": item})
+
+    def remove(self, room_id: str, item_id: str):
+        """Write through a deleted item"""
+        self.apply_event(room_id, {"event": "item.deleted", "id": item_id})
+
+    def clear(self):
+        """Write through clearing every room"""
+        self.apply_event(ALL_ROOMS, {"event": "room.cleared"})
+
+    def apply_event(self, room_id: str, event: dict):
+        """Hub listener: follow inserts, deletes and clears from every worker"""
+        if room_id == ALL_ROOMS:
+            # A clear empties every room; a resync means any of them may have missed events
+            if event.get("event") in ("room.cleared", "resync"):
+                self._rooms.clear()
+                self.size = 0
+                for pending in self._pending.values():
+                    pending.append(event)
+            return
+        tail = self._rooms.get(room_id)
+        if tail is None:
+            if room_id in self._pending:
+                self._pending[room_id].append(event)
+            return
+        self._safe_apply(room_id, tail, event)
+
+    def stats(self) -> dict:
+        return {
+            "rooms": len(self._rooms),
+            "items": sum(len(tail.items) for tail in self._rooms.values()),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    async def _room(self, room_id: str) -> RoomTail:
+        tail = self._rooms.get(room_id)
+        if tail is not None:
+            self._rooms.move_to_end(room_id)
+            self.hits += 1
+            return tail
+        load = self._loads.get(room_id)
+        if load is None:
+            self.misses += 1
+            self._pending[room_id] = []
+            load = self._loads[room_id] = asyncio.ensure_future(self._load(room_id))
+        # Shield the shared load so one cancelled request doesn't fail the others
+        return await asyncio.shield(load)
+
+    async def _load(self, room_id: str) -> RoomTail:
+        try:
+            cursor = clipboard_collection.find(
+                history_query(room_id), HOT_TAIL_PROJECTION
+            ).sort("seq", -1).limit(self.per_room)
+            items = [to_summary(doc) async for doc in cursor]
+            tail = RoomTail(items, complete=len(items) < self.per_room)
+            self._rooms[room_id] = tail
+            self.size += tail.size
+            # Replay what changed while the query was in flight
+            for event in self._pending[room_id]:
+                if room_id in self._rooms:
+                    self._apply(room_id, tail, event)
+            self._evict()
+            return tail
+        finally:
+            self._loads.pop(room_id, None)
+            self._pending.pop(room_id, None)
+
+    def _safe_apply(self, room_id: str, tail: RoomTail, event: dict):
+        try:
+            self._apply(room_id, tail, event)
+        except Exception as e:
+            # A cache must never fail the write it follows; reload the room on next read
+            logger.error(f"Hot tail of room {room_id} dropped after a failed update: {e}")
+            self._drop(room_id)
+
+    def _apply(self, room_id: str, tail: RoomTail, event: dict):
+        kind = event.get("event")
+        if kind == "item.created":
+            self._insert(room_id, tail, event["item"])
+        elif kind == "item.deleted":
+            self._remove(room_id, tail, event["id"])
+        elif kind == "room.cleared":
+            self.size -= tail.size - ROOM_OVERHEAD
+            tail.items, tail.complete, tail.size = [], True, ROOM_OVERHEAD
+        elif kind == "resync":
+            # Events may have been missed; reload on next read
+            self._drop(room_id)
+
+    def _insert(self, room_id: str, tail: RoomTail, item: dict):
+        seq = item.get("seq")
+        if seq is None:
+            return
+        if item.get("copy_count", 1) > 1 and not any(entry["seq"] == seq for entry in tail.items):
+            # A repeated copy moved an existing item to the head: drop it from its old place
+            self._remove(room_id, tail, item["id"])
+            if room_id not in self._rooms:
+                return
+        seqs = [-entry["seq"] for entry in tail.items]
+        index = bisect_left(seqs, -seq)
+        if index < len(tail.items) and tail.items[index]["seq"] == seq:
+            # Already cached (write-through beat the event); keep the fuller copy
+            if is_full_item(tail.items[index]) or not is_full_item(item):
+                return
+            self._resize(tail, -_estimate_size(tail.items.pop(index)))
+        elif index == len(tail.items) and not tail.complete:
+            # Older than the cached run: the items in between aren't known
+            return
+
+        if item.get("type") == "text" and len(item.get("content") or "") > MAX_CACHED_CONTENT:
+            item = {field: value for field, value in item.items() if field != "content"}
+        tail.items.insert(index, item)
+        self._resize(tail, _estimate_size(item))
+
+        while len(tail.items) > self.per_room:
+            self._resize(tail, -_estimate_size(tail.items.pop()))
+            tail.complete = False
+        self._evict()
+
+    def _remove(self, room_id: str, tail: RoomTail, item_id: str):
+        for index, entry in enumerate(tail.items):
+            if entry["id"] == item_id:
+                self._resize(tail, -_estimate_size(tail.items.pop(index)))
+                break
+        if not tail.items and not tail.complete:
+            # Nothing left to anchor the run; reload on next read
+            self._drop(room_id)
+
+    def _resize(self, tail: RoomTail, delta: int):
+        tail.size += delta
+        self.size += delta
+
+    def _drop(self, room_id: str):
+        tail = self._rooms.pop(room_id, None)
+        if tail is not None:
+            self.size -= tail.size
+
+    def _evict(self):
+        while self.size > self.budget and len(self._rooms) > 1:
+            room_id, _ = next(iter(self._rooms.items()))
+            self._drop(room_id)
+            logger.debug(f"Evicted hot tail of room {room_id}")
+
+
+hot_tail = HotTail()
+hub.add_listener(hot_tail.apply_event)
@@ -0,0 +1,113 @@
+"""
+Idempotency keys for clipboard saves.
+
+A client whose POST timed out cannot tell whether the server committed it, so
+it retries, and the retry used to store a second copy. Saves may carry an
+Idempotency-Key header (the desktop client sends its device id plus the
+content hash). The first request with a key claims it; once the save succeeds
+its response is recorded under the key, and any retry in the same room gets
+that response back with "replayed": true instead of storing the data again.
+
+A retry that arrives while the original is still running gets 409. A failed
+save releases its claim so the retry runs normally, and a claim left behind by
+a crashed request can be taken over after IDEMPOTENCY_CLAIM_TIMEOUT seconds.
+Keys expire IDEMPOTENCY_TTL_HOURS after their first use (a TTL index).
+Save endpoints wrap their work in run_idempotent(), which does all of this.
+"""
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from fastapi import HTTPException, Request
+from pymongo.errors import DuplicateKeyError
+
+from database import idempotency_keys_collection
+
+logger = logging.getLogger(__name__)
+
+HEADER = "idempotency-key"
+MAX_KEY_LENGTH = 255
+CLAIM_TIMEOUT = timedelta(seconds=int(os.getenv("IDEMPOTENCY_CLAIM_TIMEOUT", "300")))
+
+
+def idempotency_key(request: Request) -> Optional[str]:
+    """The request's Idempotency-Key header, if it sent one"""
+    key = request.headers.get(HEADER) if request else None
+    if not key:
+        return None
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key is longer than {MAX_KEY_LENGTH} characters")
+    return key
+
+
+def _key_id(room_id: str, key: str) -> str:
+    # Scoped to the room, so a key never replays another room's response
+    return f"{room_id}:{key}"
+
+
+async def claim_key(room_id: str, key: Optional[str]) -> Optional[dict]:
+    """Claim a key for this request, or return the recorded response of an earlier one
+
+    Returns None when the caller should go ahead and save (no key, or the claim
+    is now ours).
+    """
+    if not key:
+        return None
+    now = datetime.utcnow()
+    try:
+        await idempotency_keys_collection.insert_one(
+            {"_id": _key_id(room_id, key), "created_at": now, "claimed_at": now, "response": None}
+        )
+        return None
+    except DuplicateKeyError:
+        pass
+
+    existing = await idempotency_keys_collection.find_one({"_id": _key_id(room_id, key)})
+    if existing is None:
+        # Expired in between; claim it afresh
+        return await claim_key(room_id, key)
+    if existing.get("response") is not None:
+        return {**existing["response"], "replayed": True}
+
+    # Claimed but never finished: take it over once the claim looks abandoned
+    taken = await idempotency_keys_collection.find_one_and_update(
+        {"_id": _key_id(room_id, key), "response": None, "claimed_at": {"$lt": now - CLAIM_TIMEOUT}},
+        {"$set": {"claimed_at": now}}
+    )
+    if taken is None:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+    return None
+
+
+async def finish_key(room_id: str, key: Optional[str], response: dict = None):
+    """Record the save's response for retries (or release the claim after a failure)"""
+    if not key:
+        return
+    if response is None:
+        await idempotency_keys_collection.delete_one({"_id": _key_id(room_id, key), "response": None})
+        return
+    await idempotency_keys_collection.update_one(
+        {"_id": _key_id(room_id, key)},
+        {"$set": {"response": response}, "$unset": {"claimed_at": ""}}
+    )
+
+
+async def run_idempotent(request: Request, room_id: str, save: Callable[[], Awaitable[dict]], description: str) -> dict:
+    """Run save() at most once per Idempotency-Key in the room and return its response
+
+    A retry gets the recorded response instead; `description` names the save in the log.
+    """
+    key = idempotency_key(request)
+    replay = await claim_key(room_id, key)
+    if replay:
+        logger.info(f"🔁 {description} replayed in {room_id}")
+        return replay
+
+    response = None
+    try:
+        response = await save()
+        return response
+    finally:
+        # Success is remembered for retries; a failure releases the key
+        await finish_key(room_id, key, response)
@@ -0,0 +1,302 @@
+"""
+Image thumbnails.
+
+Uploaded images get a small WebP (or JPEG) thumbnail, rendered on the CPU
+pool and stored in the blob store next to the original; the clipboard
+document keeps its reference under "thumbnail". Listings point at
+/api/clipboard/thumbnail/{id}, so a page of screenshots costs kilobytes
+per item instead of the full PNGs. Items without a thumbnail yet (older
+uploads, or one still rendering) get theirs on first request.
+
+Pillow is optional: without it, or for images it cannot decode, the
+thumbnail URL serves the original.
+
+Downloads can also ask for variants (another format via Accept or
+?format=, a bounding box via ?w=/?h=, a quality via ?q=). Rendered
+variants live in a size-bounded in-memory cache keyed by (payload hash,
+variant), and concurrent requests for the same variant share one render.
+An image that cannot be converted is downloaded as its original.
+"""
+import asyncio
+import base64
+import io
+import logging
+import os
+from collections import OrderedDict
+
+from blob_store import blob_store, BlobNotFound
+from cpu_pool import cpu_pool, CpuPoolBusy
+from database import clipboard_collection
+
+try:
+    from PIL import Image, features
+except ImportError:  # pragma: no cover - thumbnails are optional
+    Image = None
+    features = None
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_QUALITY = 75
+THUMBNAIL_UNAVAILABLE = {"unavailable": True}
+
+_renders = {}
+_background = set()
+
+
+def thumbnail_format() -> tuple:
+    """(Pillow format, mime type) used for thumbnails"""
+    if features is not None and features.check("webp"):
+        return "WEBP", "image/webp"
+    return "JPEG", "image/jpeg"
+
+
+def render_thumbnail(data: bytes) -> bytes:
+    """Downscale an image to fit THUMBNAIL_SIZE (runs on the CPU pool)"""
+    image_format, _ = thumbnail_format()
+    with Image.open(io.BytesIO(data)) as image:
+        # Lets JPEG decode at reduced scale instead of full resolution
+        image.draft("RGB", THUMBNAIL_SIZE)
+        image.thumbnail(THUMBNAIL_SIZE)
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA", "L"):
+            image = image.convert("RGBA")
+        out = io.BytesIO()
+        image.save(out, image_format, quality=THUMBNAIL_QUALITY)
+        return out.getvalue()
+
+
+async def read_payload(item: dict) -> bytes:
+    """Full bytes of an image item, wherever they are stored"""
+    if item.get("blob"):
+        return await blob_store.read(item["blob"]["sha256"])
+    if item.get("inline"):
+        return bytes(item["inline"]["data"])
+    return await cpu_pool.run("base64", base64.b64decode, item.get("content") or "")
+
+
+async def ensure_thumbnail(item: dict) -> dict:
+    """Return the item's thumbnail reference, rendering it if needed
+
+    Concurrent requests for the same item share one render.
+    """
+    if item.get("thumbnail"):
+        return item["thumbnail"]
+    render = _renders.get(item["id"])
+    if render is None:
+        render = _renders[item["id"]] = asyncio.ensure_future(_render(item))
+        render.add_done_callback(lambda _: _renders.pop(item["id"], None))
+    return await asyncio.shield(render)
+
+
+def schedule_thumbnail(item: dict):
+    """Render a new image's thumbnail in the background"""
+    if Image is None:
+        return
+    task = asyncio.ensure_future(_render_quietly(item))
+    # Keep a reference so the task is not garbage collected mid-flight
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def _render_quietly(item: dict):
+    try:
+        await ensure_thumbnail(item)
+    except Exception as e:
+        # Rendered on first request instead
+        logger.info(f"Deferred thumbnail for {item['id']}: {e}")
+
+
+async def _render(item: dict) -> dict:
+    if Image is None:
+        return THUMBNAIL_UNAVAILABLE
+    try:
+        data = await read_payload(item)
+        thumbnail_bytes = await cpu_pool.run("thumbnail", render_thumbnail, data)
+    except CpuPoolBusy:
+        # Transient: leave the item without a thumbnail so a later request retries
+        raise
+    except Exception as e:
+        logger.warning(f"Thumbnail failed for {item['id']}: {e}")
+        thumbnail = THUMBNAIL_UNAVAILABLE
+    else:
+        ref = await blob_store.put(thumbnail_bytes)
+        thumbnail = {**ref, "mime_type": thumbnail_format()[1]}
+
+    result = await clipboard_collection.update_one(
+        {"id": item["id"], "thumbnail": {"$exists": False}},
+        {"$set": {"thumbnail": thumbnail}}
+    )
+    if not result.modified_count:
+        # Item deleted meanwhile, or another worker got there first
+        if thumbnail.get("sha256"):
+            await blob_store.release(thumbnail["sha256"])
+        current = await clipboard_collection.find_one({"id": item["id"]}, {"thumbnail": 1})
+        return (current or {}).get("thumbnail") or THUMBNAIL_UNAVAILABLE
+    return thumbnail
+
+
+# ==================== VARIANTS ====================
+
+VARIANT_CACHE_BYTES = int(os.getenv("VARIANT_CACHE_MB", "32")) * 1024 * 1024
+MAX_VARIANT_DIMENSION = 4096
+DEFAULT_VARIANT_QUALITY = 80
+
+VARIANT_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+}
+_MIME_TO_FORMAT = {mime: name for name, (_, mime) in VARIANT_FORMATS.items()}
+_MIME_TO_FORMAT["image/jpg"] = "jpeg"
+
+
+class VariantNotAcceptable(Exception):
+    """Raised when no format we can produce satisfies the request"""
+
+
+class VariantRenderFailed(Exception):
+    """Raised when the stored image cannot be converted (e.g. it doesn't decode)"""
+
+
+def parse_accept(header: str) -> dict:
+    """Map the media ranges of an Accept header to their q-values"""
+    accepted = {}
+    for part in (header or "").split(","):
+        fields = [field.strip() for field in part.split(";")]
+        if not fields[0]:
+            continue
+        quality = 1.0
+        for param in fields[1:]:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted[fields[0].lower()] = quality
+    return accepted
+
+
+def _accepts(accepted: dict, mime: str) -> float:
+    if not accepted:
+        return 1.0
+    for candidate in (mime, mime.split("/")[0] + "/*", "*/*"):
+        if candidate in accepted:
+            return accepted[candidate]
+    return 0.0
+
+
+def choose_variant(accept: str, original_mime: str, width=None, height=None, quality=None, requested_format=None):
+    """Decide how to answer an image download
+
+    Returns None to serve the stored original, or the variant key
+    (format, width, height, quality). The original is kept whenever the
+    client accepts its type and no resize, quality or format was asked for.
+    """
+    accepted = parse_accept(accept)
+    if not (width or height or quality or requested_format) and original_mime \
+            and _accepts(accepted, original_mime.lower()) > 0:
+        # Plain download the client can take as stored (GIFs keep their frames)
+        return None
+    original_format = _MIME_TO_FORMAT.get((original_mime or "").lower())
+
+    if requested_format:
+        target = requested_format.lower().replace("jpg", "jpeg")
+        if target not in VARIANT_FORMATS:
+            raise VariantNotAcceptable(requested_format)
+    elif original_format and _accepts(accepted, original_mime) > 0 and not (quality and original_format == "png"):
+        target = original_format
+    else:
+        # Best format the client accepts; ties go to the smallest output
+        candidates = [name for name in ("webp", "jpeg", "png") if _accepts(accepted, VARIANT_FORMATS[name][1]) > 0]
+        if "webp" in candidates and not features.check("webp"):
+            candidates.remove("webp")
+        if not candidates:
+            raise VariantNotAcceptable(accept)
+        target = max(candidates, key=lambda name: _accepts(accepted, VARIANT_FORMATS[name][1]))
+
+    if target == original_format and not width and not height and not quality:
+        return None
+    if target == "webp" and not features.check("webp"):
+        raise VariantNotAcceptable(target)
+    width = min(max(width, 1), MAX_VARIANT_DIMENSION) if width else None
+    height = min(max(height, 1), MAX_VARIANT_DIMENSION) if height else None
+    if target == "png":
+        quality = None
+    else:
+        quality = min(max(quality, 1), 95) if quality else DEFAULT_VARIANT_QUALITY
+    return target, width, height, quality
+
+
+def render_variant(data: bytes, variant: tuple) -> bytes:
+    """Convert and/or downscale an image (runs on the CPU pool)"""
+    target, width, height, quality = variant
+    image_format = VARIANT_FORMATS[target][0]
+    with Image.open(io.BytesIO(data)) as image:
+        if width or height:
+            bounds = (width or MAX_VARIANT_DIMENSION, height or MAX_VARIANT_DIMENSION)
+            image.draft("RGB", bounds)
+            image.thumbnail(bounds)
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA", "L"):
+            image = image.convert("RGBA")
+        out = io.BytesIO()
+        options = {"quality": quality} if quality else {"optimize": True}
+        image.save(out, image_format, **options)
+        return out.getvalue()
+
+
+def variant_etag(source_key: str, variant: tuple) -> str:
+    target, width, height, quality = variant
+    return f'"{source_key}-{target}-{width or 0}x{height or 0}-q{quality or 0}"'
+
+
+class VariantCache:
+    """Size-bounded LRU of rendered variants keyed by (payload hash, variant)"""
+
+    def __init__(self, budget: int = VARIANT_CACHE_BYTES):
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._renders = {}
+
+    async def get(self, source_key: str, variant: tuple, load_source) -> bytes:
+        """Return the variant's bytes, rendering it once on a miss however many callers wait"""
+        key = (source_key, variant)
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+        render = self._renders.get(key)
+        if render is None:
+            self.misses += 1
+            render = self._renders[key] = asyncio.ensure_future(self._render(key, variant, load_source))
+            render.add_done_callback(lambda _: self._renders.pop(key, None))
+        return await asyncio.shield(render)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+    async def _render(self, key: tuple, variant: tuple, load_source) -> bytes:
+        source = await load_source()
+        try:
+            data = await cpu_pool.run("variant", render_variant, source, variant)
+        except (CpuPoolBusy, BlobNotFound):
+            raise
+        except Exception as e:
+            raise VariantRenderFailed(str(e)) from e
+        if len(data) <= self.budget:
+            self._entries[key] = data
+            self.size += len(data)
+            while self.size > self.budget:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+        return data
+
+
+variant_cache = VariantCache()
@@ -0,0 +1,149 @@
+"""
+Clipboard item summaries.
+
+History listings only need metadata and a short preview, never the payload.
+Previews are precomputed on insert; the projections below also derive them
+for items written before that, so listings never pull full documents.
+"""
+
+from database import clipboard_collection
+from upload_pipeline import STORAGE_ARCHIVE
+
+PREVIEW_LENGTH = 200
+
+_IS_TEXT = {"$eq": ["$type", "text"]}
+
+# Metadata-only view of an item; legacy documents get size/preview derived server-side
+SUMMARY_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "seq": 1,
+    "room_id": 1,
+    "username": 1,
+    "type": 1,
+    "filename": 1,
+    "file_url": 1,
+    "timestamp": 1,
+    "mime_type": "$metadata.mime_type",
+    # Lets clients skip uploading content the room already holds
+    "sha256": "$content_sha256",
+    "size": {"$ifNull": ["$size", "$metadata.original_size"]},
+    # Repeated copies of recent content bump the existing item instead of adding one
+    "copy_count": {"$ifNull": ["$copy_count", 1]},
+    "last_copied_at": {"$ifNull": ["$last_copied_at", "$timestamp"]},
+    "preview": {
+        "$ifNull": [
+            "$preview",
+            {"$cond": [
+                _IS_TEXT,
+                {"$substrCP": [{"$ifNull": ["$content", ""]}, 0, PREVIEW_LENGTH]},
+                "$filename"
+            ]}
+        ]
+    },
+}
+
+# Summary plus the full text body; image/file bytes stay behind the download endpoint
+ITEM_PROJECTION = {
+    **SUMMARY_PROJECTION,
+    "metadata": 1,
+    "content": {"$cond": [_IS_TEXT, "$content", "$$REMOVE"]},
+}
+
+
+def build_preview(item_type: str, content: str = None, filename: str = None) -> str:
+    """Short display text stored with the item"""
+    if item_type == "text":
+        return (content or "")[:PREVIEW_LENGTH]
+    return filename or ""
+
+
+def to_summary(doc: dict) -> dict:
+    """Finish a projected document for the API (adds the thumbnail URL)"""
+    doc.pop("_id", None)
+    if doc.get("type") == "image":
+        doc["thumbnail_url"] = f"/api/clipboard/thumbnail/{doc['id']}"
+    else:
+        doc["thumbnail_url"] = None
+    return doc
+
+
+def summary_from_doc(doc: dict) -> dict:
+    """Build the summary of a freshly inserted document without a database round trip"""
+    summary = {
+        field: doc.get(field)
+        for field, spec in SUMMARY_PROJECTION.items()
+        if spec == 1
+    }
+    summary["mime_type"] = doc.get("metadata", {}).get("mime_type")
+    summary["sha256"] = doc.get("content_sha256")
+    summary["size"] = doc.get("size")
+    summary["copy_count"] = doc.get("copy_count", 1)
+    summary["last_copied_at"] = doc.get("last_copied_at", doc.get("timestamp"))
+    summary["preview"] = doc.get("preview")
+    return to_summary(summary)
+
+
+def item_from_doc(doc: dict) -> dict:
+    """Same as ITEM_PROJECTION applied to a freshly inserted document"""
+    item = summary_from_doc(doc)
+    item["metadata"] = doc.get("metadata", {})
+    if doc.get("type") == "text":
+        item["content"] = doc.get("content")
+    return item
+
+
+# Item filters the routes share; test_indexes.py explains each of them
+
+def history_query(room_id: str, before_seq: int = None, after_seq: int = None) -> dict:
+    """A room's items, optionally only those between two seqs (keyset pagination)"""
+    query = {"room_id": room_id}
+    seq_range = {}
+    if before_seq is not None:
+        seq_range["$lt"] = before_seq
+    if after_seq is not None:
+        seq_range["$gt"] = after_seq
+    if seq_range:
+        query["seq"] = seq_range
+    return query
+
+
+def hash_query(room_id: str, content_sha256: str, item_type: str, filename: str = None) -> dict:
+    """The room's items with this content (a by-hash copy's source)"""
+    query = {"room_id": room_id, "content_sha256": content_sha256, "type": item_type}
+    if item_type == "file" and filename:
+        # A zipped upload names its entry after the file, so only an as-is archive can be renamed
+        query["$or"] = [{"metadata.storage": STORAGE_ARCHIVE}, {"metadata.original_filename": filename}]
+    return query
+
+
+def repeat_query(room_id: str, username: str, item_type: str, content_sha256: str, after_seq: int,
+                 filename: str = None) -> dict:
+    """The member's own items with this content and a seq above after_seq"""
+    query = {
+        "room_id": room_id,
+        "username": username,
+        "content_sha256": content_sha256,
+        "type": item_type,
+        "seq": {"$gt": after_seq}
+    }
+    if filename is not None:
+        query["metadata.original_filename"] = filename
+    return query
+
+
+def repeat_bump(now) -> dict:
+    """$set stage recording one more copy of an item at `now` (the move to the head adds its seq)"""
+    return {
+        "timestamp": now,
+        "last_copied_at": now,
+        "copy_count": {"$add": [{"$ifNull": ["$copy_count", 1]}, 1]}
+    }
+
+
+async def items_after(room_id: str, cursor: int, limit: int) -> list:
+    """Summaries of the room's items with seq > cursor, oldest first"""
+    docs = clipboard_collection.find(
+        history_query(room_id, after_seq=cursor), SUMMARY_PROJECTION
+    ).sort("seq", 1).limit(limit)
+    return [to_summary(doc) async for doc in docs]
@@ -1,28 +1,69 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, status, Request
-from fastapi.responses import FileResponse, JSONResponse, HTMLResponse
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, status, Request, Query
+from fastapi.responses import FileResponse, JSONResponse, HTMLResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
 from fastapi.staticfiles import StaticFiles
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson import Binary
 import uvicorn
 from datetime import datetime
 import os
 import uuid
 import hashlib
+import base64
 from typing import List, Optional
 import shutil
 from pathlib import Path
 from contextlib import asynccontextmanager
 import logging
+import asyncio
+import json
 
-from models import Room, RoomCreate, RoomJoin, ClipboardItem, TextClipboard
+from models import Room, RoomCreate, RoomJoin, ClipboardItem, TextClipboard, UploadSessionCreate, HashedClipboard
 from database import (
     db, 
     rooms_collection, 
     clipboard_collection, 
     users_collection,
-    init_db
+    init_db,
+    room_heads,
+    record_deletion,
+    forget_deletions,
+    deletions_after,
+    RoomNotFound
 )
 from web_dashboard import create_web_routes
+from blob_store import blob_store, BlobNotFound
+from items import (
+    SUMMARY_PROJECTION, ITEM_PROJECTION, build_preview, to_summary, summary_from_doc, item_from_doc, items_after,
+    history_query, hash_query, repeat_query, repeat_bump
+)
+from events import hub, item_created_event, item_deleted_event, room_cleared_event
+from realtime import create_realtime_routes
+from hot_tail import hot_tail
+from room_stats import (
+    room_overview,
+    global_counters,
+    count_item,
+    count_room_created,
+    count_member_joined,
+    reset_item_counters,
+    run_reconciler
+)
+from cpu_pool import cpu_pool, CpuPoolBusy
+from write_batcher import clipboard_writes
+from images import (
+    Image, ensure_thumbnail, schedule_thumbnail, read_payload,
+    choose_variant, variant_cache, variant_etag, VariantNotAcceptable, VariantRenderFailed, VARIANT_FORMATS
+)
+from auth import hash_password, verify_password, needs_rehash, issue_session, room_session
+from downloads import payload_response, memory_range, not_modified, cache_headers, etag_matches, CACHE_CONTROL_IMMUTABLE, CACHE_CONTROL_NO_STORE
+from upload_pipeline import store_upload, UploadTooLarge, STORAGE_ARCHIVE, BodySizeLimitMiddleware, MULTIPART_OVERHEAD
+from upload_sessions import (
+    create_session, get_session, session_view, read_chunk, write_chunk, claim_commit, finish_commit,
+    commit_in_progress, discard_session, SessionReader, run_session_janitor
+)
+from idempotency import run_idempotent
 
 # Configure logging
 logging.basicConfig(
@@ -40,13 +81,31 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("CloudClipboard server starting up...")
     await init_db()
+    await hub.start()
+    reconciler = asyncio.create_task(run_reconciler())
+    janitor = asyncio.create_task(run_session_janitor())
     logger.info("Server startup complete")
     yield
     # Shutdown
     logger.info("CloudClipboard server shutting down...")
+    reconciler.cancel()
+    janitor.cancel()
+    await clipboard_writes.drain()
+    cpu_pool.shutdown()
+    await hub.stop()
 
 app = FastAPI(title="Cloud Clipboard API", version="1.0.0", lifespan=lifespan)
 
+# File size limits
+MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+# Items accepted by one /api/clipboard/batch request
+MAX_BATCH_ITEMS = 100
+# A copy identical to one of the room's last REPEAT_WINDOW items bumps that item instead
+REPEAT_WINDOW = int(os.getenv("REPEAT_WINDOW", "50"))
+
+# Enforce the upload limit while bodies stream in (added first so CORS wraps its 413s)
+app.add_middleware(BodySizeLimitMiddleware, max_body_size=MAX_FILE_SIZE + MULTIPART_OVERHEAD)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -56,6 +115,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(CpuPoolBusy)
+async def cpu_pool_busy_handler(request: Request, exc: CpuPoolBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server busy, please retry"},
+        headers={"Retry-After": "5"}
+    )
+
 # Health check endpoint to keep service active on Render
 @app.get("/health")
 async def health_check():
@@ -68,14 +135,12 @@ async def health_check():
 
 # Add web routes (this must come after health check to override root)
 create_web_routes(app)
+create_realtime_routes(app)
 
 # Create uploads directory
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 
-# File size limits
-MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
-
 # ==================== AUTHENTICATION ====================
 
 @app.post("/api/room/create")
@@ -89,17 +154,19 @@ async def create_room(room: RoomCreate, request: Request):
         logger.warning(f"❌ Room creation failed - already exists: {room.room_id}")
         raise HTTPException(status_code=400, detail="Room ID already exists")
     
-    # Hash password
-    hashed_password = hashlib.sha256(room.password.encode()).hexdigest()
+    # Hash password (scrypt, off the event loop)
+    hashed_password = await hash_password(room.password)
     
     room_data = {
         "room_id": room.room_id,
         "password": hashed_password,
         "created_at": datetime.utcnow(),
-        "members": []
+        "members": [],
+        "seq": 0
     }
     
     await rooms_collection.insert_one(room_data)
+    await count_room_created()
     logger.info(f"✅ Room created successfully: {room.room_id} by {client_ip}")
     return {"status": "success", "message": "Room created successfully", "room_id": room.room_id}
 
@@ -116,23 +183,33 @@ async def join_room(join_data: RoomJoin, request: Request):
         raise HTTPException(status_code=404, detail="Room not found")
     
     # Verify password
-    hashed_password = hashlib.sha256(join_data.password.encode()).hexdigest()
-    if room["password"] != hashed_password:
+    if not await verify_password(join_data.password, room["password"]):
         logger.warning(f"❌ Join failed - invalid password: {join_data.username} -> {join_data.room_id}")
         raise HTTPException(status_code=401, detail="Invalid password")
     
+    if needs_rehash(room["password"]):
+        # Upgrade legacy SHA-256 hashes now that we know the password
+        await rooms_collection.update_one(
+            {"room_id": join_data.room_id},
+            {"$set": {"password": await hash_password(join_data.password)}}
+        )
+        logger.info(f"🔐 Password hash upgraded for room {join_data.room_id}")
+    
     # Add user to room if not already a member
+    new_member = False
     if join_data.username not in room.get("members", []):
-        await rooms_collection.update_one(
+        result = await rooms_collection.update_one(
             {"room_id": join_data.room_id},
             {"$addToSet": {"members": join_data.username}}
         )
+        # Only the request that actually added the member counts it
+        new_member = result.modified_count == 1
         logger.info(f"👤 New member added: {join_data.username} to {join_data.room_id}")
     else:
         logger.info(f"🔄 Existing member rejoined: {join_data.username} to {join_data.room_id}")
     
     # Create or update user
-    await users_collection.update_one(
+    user_result = await users_collection.update_one(
         {"username": join_data.username},
         {"$set": {
             "username": join_data.username,
@@ -141,13 +218,19 @@ async def join_room(join_data: RoomJoin, request: Request):
         }},
         upsert=True
     )
+    new_user = user_result.upserted_id is not None
+    if new_member or new_user:
+        await count_member_joined(join_data.room_id, new_member, new_user)
     
+    token, expires_at = issue_session(join_data.room_id, join_data.username)
     logger.info(f"✅ User joined successfully: {join_data.username} -> {join_data.room_id}")
     return {
         "status": "success", 
         "message": "Joined room successfully",
         "room_id": join_data.room_id,
-        "username": join_data.username
+        "username": join_data.username,
+        "token": token,
+        "expires_at": expires_at
     }
 
 @app.get("/api/room/{room_id}/members")
@@ -161,33 +244,167 @@ async def get_room_members(room_id: str):
 
 # ==================== CLIPBOARD OPERATIONS ====================
 
-@app.post("/api/clipboard/text")
-async def save_text(item: TextClipboard, request: Request):
-    """Save text clipboard"""
-    client_ip = request.client.host
-    content_preview = item.content[:50] + "..." if len(item.content) > 50 else item.content
-    
-    # Verify room exists
-    room = await rooms_collection.find_one({"room_id": item.room_id})
-    if not room:
-        logger.warning(f"❌ Text save failed - room not found: {item.room_id}")
-        raise HTTPException(status_code=404, detail="Room not found")
-    
-    clipboard_data = {
+def text_item_data(room_id: str, username: str, content: str) -> dict:
+    """Clipboard document for a text item (its seq is assigned when it commits)"""
+    return {
         "id": str(uuid.uuid4()),
-        "room_id": item.room_id,
-        "username": item.username,
+        "seq": None,
+        "room_id": room_id,
+        "username": username,
         "type": "text",
-        "content": item.content,
+        "content": content,
         "file_url": None,
         "filename": None,
+        "content_sha256": hashlib.sha256(content.encode("utf-8")).hexdigest(),
+        "size": len(content.encode("utf-8")),
+        "preview": build_preview("text", content=content),
         "timestamp": datetime.utcnow(),
         "metadata": {}
     }
+
+def image_item_data(stored: dict, room_id: str, username: str, filename: str, mime_type: Optional[str]) -> dict:
+    """Clipboard document for an image store_upload() kept inline or in the blob store"""
+    blob, inline = stored["blob"], stored["inline"]
+    item_id = str(uuid.uuid4())
+    clipboard_data = {
+        "id": item_id,
+        "seq": None,
+        "room_id": room_id,
+        "username": username,
+        "type": "image",
+        "content": None,
+        "filename": filename,
+        "size": (blob or inline)["size"],
+        "preview": build_preview("image", filename=filename),
+        "file_url": f"/api/clipboard/download/{item_id}",
+        "content_sha256": stored["sha256"],
+        "timestamp": datetime.utcnow(),
+        "metadata": {
+            "original_size": stored["original_size"],
+            "mime_type": mime_type,
+            "original_filename": filename
+        }
+    }
+    if blob:
+        clipboard_data["blob"] = blob
+    else:
+        clipboard_data["inline"] = {**inline, "data": Binary(inline["data"])}
+    return clipboard_data
+
+def file_item_data(stored: dict, room_id: str, username: str, original_filename: str, mime_type: Optional[str]) -> dict:
+    """Clipboard document for a file store_upload() put in the blob store"""
+    blob = stored["blob"]
+    item_id = str(uuid.uuid4())
+    # An uploaded .zip (e.g. a folder zipped by the client) is served as-is
+    filename = original_filename if stored["storage"] == STORAGE_ARCHIVE else f"{original_filename}.zip"
+    return {
+        "id": item_id,
+        "seq": None,
+        "room_id": room_id,
+        "username": username,
+        "type": "file",
+        "content": None,
+        "blob": blob,
+        "filename": filename,
+        "size": blob["size"],
+        "preview": build_preview("file", filename=filename),
+        "file_url": f"/api/clipboard/download/{item_id}",
+        "content_sha256": stored["sha256"],
+        "timestamp": datetime.utcnow(),
+        "metadata": {
+            "original_filename": original_filename,
+            "original_size": stored["original_size"],
+            "zip_size": blob["size"],
+            "mime_type": mime_type,
+            "storage": stored["storage"],
+            "detected_format": stored["detected"]
+        }
+    }
+
+async def require_room(request: Optional[Request], room_id: str, username: str, client_ip: str = "unknown"):
+    """Check the session token, or when none was sent that the room exists (404 otherwise)"""
+    # A valid session token vouches for the room; otherwise look it up
+    if room_session(request, room_id, username):
+        return
+    room = await rooms_collection.find_one({"room_id": room_id}, {"_id": 1})
+    if not room:
+        logger.warning(f"❌ Save failed - room not found: {room_id} from {client_ip}")
+        raise HTTPException(status_code=404, detail="Room not found")
+
+async def insert_clipboard_item(clipboard_data: dict):
+    """Persist a new clipboard item and notify the room's subscribers"""
+    # Group-committed with concurrent saves; returns once this document is stored and numbered
+    try:
+        await clipboard_writes.insert(clipboard_data)
+    except RoomNotFound:
+        raise HTTPException(status_code=404, detail="Room not found")
+    hot_tail.add(item_from_doc(clipboard_data))
+    await hub.publish(clipboard_data["room_id"], item_created_event(summary_from_doc(clipboard_data)))
+
+async def find_repeat(room_id: str, username: str, item_type: str, content_sha256: str,
+                      filename: str = None) -> Optional[str]:
+    """Id of the member's identical item among the room's last REPEAT_WINDOW items, if any"""
+    heads = await room_heads([room_id])
+    if room_id not in heads:
+        return None
+    query = repeat_query(room_id, username, item_type, content_sha256, heads[room_id] - REPEAT_WINDOW, filename)
+    repeat = await clipboard_collection.find_one(query, {"_id": 0, "id": 1}, sort=[("seq", -1)])
+    return repeat["id"] if repeat else None
+
+async def move_repeat(room_id: str, item_id: str) -> Optional[dict]:
+    """Give a repeated item the room's next seq, bump its copy_count and republish it
+    
+    Its timestamp and last_copied_at become now (listings and member activity
+    sort by timestamp). Returns the moved document, or None when it is gone.
+    """
+    moved = await clipboard_writes.move_to_head(room_id, {"id": item_id}, repeat_bump(datetime.utcnow()))
+    if moved is None:
+        # Deleted in the meantime
+        return None
+    hot_tail.add(item_from_doc(moved))
+    await hub.publish(room_id, item_created_event(summary_from_doc(moved)))
+    return moved
+
+async def collapse_repeat(room_id: str, username: str, item_type: str, content_sha256: str,
+                          filename: str = None) -> Optional[dict]:
+    """Move the member's recent identical item to the head instead of storing another copy
+    
+    Returns the moved document, or None when none of the last REPEAT_WINDOW
+    items is such a copy (the caller then inserts as usual).
+    """
+    repeat_id = await find_repeat(room_id, username, item_type, content_sha256, filename)
+    return await move_repeat(room_id, repeat_id) if repeat_id else None
+
+def collapsed_response(moved: dict) -> dict:
+    return {"status": "success", "id": moved["id"], "seq": moved["seq"], "collapsed": True, "copy_count": moved["copy_count"]}
+
+@app.post("/api/clipboard/text")
+async def save_text(item: TextClipboard, request: Request):
+    """Save text clipboard"""
+    client_ip = request.client.host
+    room_session(request, item.room_id, item.username)
+    # A retried request gets the original answer instead of a second copy
+    return await run_idempotent(
+        request, item.room_id, lambda: store_text(item, client_ip),
+        f"Text save of {item.username} from {client_ip}"
+    )
+
+async def store_text(item: TextClipboard, client_ip: str) -> dict:
+    content_preview = item.content[:50] + "..." if len(item.content) > 50 else item.content
+    clipboard_data = text_item_data(item.room_id, item.username, item.content)
+    moved = await collapse_repeat(item.room_id, item.username, "text", clipboard_data["content_sha256"])
+    if moved:
+        logger.info(f"🔂 Repeated text moved to head (x{moved['copy_count']}): {item.username} in {item.room_id} from {client_ip}")
+        return collapsed_response(moved)
     
-    await clipboard_collection.insert_one(clipboard_data)
+    # Also the room check: a missing room fails the insert with 404
+    try:
+        await insert_clipboard_item(clipboard_data)
+    except HTTPException:
+        logger.warning(f"❌ Text save failed - room not found: {item.room_id}")
+        raise
     logger.info(f"Text saved: {item.username} in {item.room_id} - '{content_preview}' from {client_ip}")
-    return {"status": "success", "id": clipboard_data["id"]}
+    return {"status": "success", "id": clipboard_data["id"], "seq": clipboard_data["seq"]}
 
 @app.post("/api/clipboard/image")
 async def save_image(
@@ -196,7 +413,7 @@ async def save_image(
     file: UploadFile = File(...),
     request: Request = None
 ):
-    """Save image clipboard as base64"""
+    """Save image clipboard in the blob store"""
     client_ip = request.client.host if request and hasattr(request, 'client') else "unknown"
     
     # Validate file size
@@ -204,48 +421,72 @@ async def save_image(
         logger.warning(f"Image upload failed - file too large: {file.size} bytes from {client_ip}")
         raise HTTPException(status_code=413, detail="File too large (max 50MB)")
     
-    room = await rooms_collection.find_one({"room_id": room_id})
-    if not room:
-        logger.warning(f"Image upload failed - room not found: {room_id} from {client_ip}")
-        raise HTTPException(status_code=404, detail="Room not found")
+    await require_room(request, room_id, username, client_ip)
     
+    return await run_idempotent(
+        request, room_id, lambda: store_image(file, room_id, username, client_ip),
+        f"Image upload of {username} - {file.filename} from {client_ip}"
+    )
+
+async def store_image(file: UploadFile, room_id: str, username: str, client_ip: str) -> dict:
     try:
-        # Read file content
-        content = await file.read()
-        
-        # Convert to base64
-        import base64
-        base64_content = base64.b64encode(content).decode('utf-8')
+        # Small images stay in the document as BSON Binary; larger ones stream into the blob store
+        stored = await store_upload(file, MAX_FILE_SIZE, allow_inline=True)
+        blob, inline = stored["blob"], stored["inline"]
+        payload = blob or inline
         
-        # Generate unique ID
-        item_id = str(uuid.uuid4())
+        moved = await collapse_repeat(room_id, username, "image", stored["sha256"])
+        if moved:
+            if blob:
+                await blob_store.release(blob["sha256"])
+            logger.info(f"🔂 Repeated image moved to head (x{moved['copy_count']}): {username} in {room_id} from {client_ip}")
+            return collapsed_response(moved)
         
-        # Store in database with base64 content
-        clipboard_data = {
-            "id": item_id,
-            "room_id": room_id,
-            "username": username,
-            "type": "image",
-            "content": base64_content,  # Store as base64
-            "filename": file.filename,
-            "file_url": f"/api/clipboard/download/{item_id}",
-            "timestamp": datetime.utcnow(),
-            "metadata": {
-                "original_size": len(content),
-                "base64_size": len(base64_content),
-                "mime_type": file.content_type,
-                "original_filename": file.filename
-            }
-        }
+        clipboard_data = image_item_data(stored, room_id, username, file.filename, file.content_type)
+        item_id = clipboard_data["id"]
         
-        await clipboard_collection.insert_one(clipboard_data)
-        logger.info(f"Image saved as base64: {username} in {room_id} - {file.filename} from {client_ip}")
-        return {"status": "success", "id": item_id}
+        try:
+            await insert_clipboard_item(clipboard_data)
+        except Exception:
+            if blob:
+                await blob_store.release(blob["sha256"])
+            raise
+        if blob:
+            # Inline images are small enough to be their own thumbnail
+            schedule_thumbnail(clipboard_data)
+        storage = "blob" if blob else "inline"
+        logger.info(f"Image saved {storage} {payload['sha256'][:12]}: {username} in {room_id} - {file.filename} from {client_ip}")
+        return {"status": "success", "id": item_id, "seq": clipboard_data["seq"]}
         
+    except HTTPException:
+        raise
+    except UploadTooLarge:
+        logger.warning(f"Image upload failed - file too large from {client_ip}")
+        raise HTTPException(status_code=413, detail="File too large (max 50MB)")
+    except CpuPoolBusy:
+        raise
     except Exception as e:
         logger.error(f"Error saving image: {e}")
         raise HTTPException(status_code=500, detail="Error saving image")
 
+async def insert_file_item(stored: dict, room_id: str, username: str, original_filename: str, mime_type: Optional[str]):
+    """Insert a file item for a payload store_upload() put in the blob store; returns the save response"""
+    blob = stored["blob"]
+    moved = await collapse_repeat(room_id, username, "file", stored["sha256"], filename=original_filename)
+    if moved:
+        await blob_store.release(blob["sha256"])
+        logger.info(f"🔂 Repeated file moved to head (x{moved['copy_count']}): {username} in {room_id} - {original_filename}")
+        return collapsed_response(moved)
+    
+    clipboard_data = file_item_data(stored, room_id, username, original_filename, mime_type)
+    
+    try:
+        await insert_clipboard_item(clipboard_data)
+    except Exception:
+        await blob_store.release(blob["sha256"])
+        raise
+    return {"status": "success", "id": clipboard_data["id"], "seq": clipboard_data["seq"]}
+
 @app.post("/api/clipboard/file")
 async def save_file(
     room_id: str = Form(...),
@@ -261,84 +502,449 @@ async def save_file(
         logger.warning(f"File upload failed - file too large: {file.size} bytes from {client_ip}")
         raise HTTPException(status_code=413, detail="File too large (max 50MB)")
     
-    room = await rooms_collection.find_one({"room_id": room_id})
-    if not room:
-        logger.warning(f"File upload failed - room not found: {room_id} from {client_ip}")
-        raise HTTPException(status_code=404, detail="Room not found")
+    await require_room(request, room_id, username, client_ip)
     
+    return await run_idempotent(
+        request, room_id, lambda: store_file(file, room_id, username, client_ip),
+        f"File upload of {username} - {file.filename} from {client_ip}"
+    )
+
+async def store_file(file: UploadFile, room_id: str, username: str, client_ip: str) -> dict:
     try:
-        # Read file content
-        content = await file.read()
-        
-        # Create zip file
-        import zipfile
-        import io
-        
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            zip_file.writestr(file.filename, content)
+        # Zip while streaming into the blob store; the document only keeps a reference
+        stored = await store_upload(file, MAX_FILE_SIZE, archive_name=file.filename)
+        response = await insert_file_item(stored, room_id, username, file.filename, file.content_type)
+        logger.info(f"File saved as {stored['storage']} blob {stored['blob']['sha256'][:12]}: {username} in {room_id} - {file.filename} from {client_ip}")
+        return response
         
-        zip_content = zip_buffer.getvalue()
+    except HTTPException:
+        raise
+    except UploadTooLarge:
+        logger.warning(f"File upload failed - file too large from {client_ip}")
+        raise HTTPException(status_code=413, detail="File too large (max 50MB)")
+    except CpuPoolBusy:
+        raise
+    except Exception as e:
+        logger.error(f"Error saving file: {e}")
+        raise HTTPException(status_code=500, detail="Error saving file")
+
+async def ndjson_lines(request: Request):
+    """Non-empty lines of an NDJSON request body, as they arrive"""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+async def prepare_batch_entry(kind: str, value) -> tuple:
+    """Store one batch entry's payload; returns (type, payload, filename, mime type)"""
+    if kind == "ndjson":
+        entry = json.loads(value)
+        if not isinstance(entry, dict) or entry.get("type", "text") != "text" or not isinstance(entry.get("content"), str):
+            raise ValueError('NDJSON items must be {"type": "text", "content": "..."}')
+        return "text", entry["content"], None, None
+    if kind == "text":
+        if not isinstance(value, str):
+            raise ValueError('"text" parts must be plain form fields')
+        return "text", value, None, None
+    if not hasattr(value, "read"):
+        raise ValueError('"file" parts must be file uploads')
+    if (value.content_type or "").startswith("image/"):
+        stored = await store_upload(value, MAX_FILE_SIZE, allow_inline=True)
+        return "image", stored, value.filename, value.content_type
+    stored = await store_upload(value, MAX_FILE_SIZE, archive_name=value.filename)
+    return "file", stored, value.filename, value.content_type
+
+async def release_batch_entry(entry: tuple):
+    item_type, payload = entry[0], entry[1]
+    if item_type != "text" and payload["blob"]:
+        await blob_store.release(payload["blob"]["sha256"])
+
+@app.post("/api/clipboard/batch")
+async def save_batch(room_id: str, username: str, request: Request):
+    """Save many clipboard items in one request, with a result per item
+    
+    The body is multipart/form-data with any number of "text" fields and
+    "file" parts (image/* parts are stored as images), or NDJSON with one
+    {"type": "text", "content": ...} object per line. The room is checked
+    once, sequence numbers are reserved in one step and the items are
+    committed together.
+    """
+    client_ip = request.client.host
+    await require_room(request, room_id, username, client_ip)
+    
+    return await run_idempotent(
+        request, room_id, lambda: store_batch(request, room_id, username, client_ip),
+        f"Batch save of {username} from {client_ip}"
+    )
+
+async def store_batch(request: Request, room_id: str, username: str, client_ip: str) -> dict:
+    content_type = request.headers.get("content-type", "")
+    form = None
+    try:
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form(max_files=MAX_BATCH_ITEMS, max_fields=MAX_BATCH_ITEMS)
+            parts = [(key, value) for key, value in form.multi_items() if key in ("text", "file")]
+        elif content_type.startswith(("application/x-ndjson", "application/jsonl")):
+            parts = []
+            async for line in ndjson_lines(request):
+                parts.append(("ndjson", line))
+                if len(parts) > MAX_BATCH_ITEMS:
+                    break
+        else:
+            raise HTTPException(status_code=415, detail="Send multipart/form-data or application/x-ndjson")
+        if len(parts) > MAX_BATCH_ITEMS:
+            raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ITEMS} items per batch")
         
-        # Convert to base64 for storage
-        import base64
-        base64_content = base64.b64encode(zip_content).decode('utf-8')
+        results = [None] * len(parts)
+        prepared = []
+        for index, (kind, value) in enumerate(parts):
+            try:
+                prepared.append((index, await prepare_batch_entry(kind, value)))
+            except UploadTooLarge:
+                results[index] = {"index": index, "status": "error", "detail": "File too large (max 50MB)"}
+            except CpuPoolBusy:
+                results[index] = {"index": index, "status": "error", "detail": "Server busy, please retry"}
+            except ValueError as e:
+                results[index] = {"index": index, "status": "error", "detail": str(e)}
+            except Exception as e:
+                logger.error(f"Error storing batch item {index}: {e}")
+                results[index] = {"index": index, "status": "error", "detail": "Error storing item"}
         
-        # Generate unique ID
-        item_id = str(uuid.uuid4())
+        docs = []
+        for _, (item_type, payload, filename, mime_type) in prepared:
+            if item_type == "text":
+                docs.append(text_item_data(room_id, username, payload))
+            elif item_type == "image":
+                docs.append(image_item_data(payload, room_id, username, filename, mime_type))
+            else:
+                docs.append(file_item_data(payload, room_id, username, filename, mime_type))
         
-        # Store in database with base64 zip content
-        clipboard_data = {
-            "id": item_id,
-            "room_id": room_id,
-            "username": username,
-            "type": "file",
-            "content": base64_content,  # Store as base64 zip
-            "filename": f"{file.filename}.zip",
-            "file_url": f"/api/clipboard/download/{item_id}",
-            "timestamp": datetime.utcnow(),
-            "metadata": {
-                "original_filename": file.filename,
-                "original_size": len(content),
-                "zip_size": len(zip_content),
-                "base64_size": len(base64_content),
-                "mime_type": file.content_type
-            }
-        }
+        # Repeats collapse as in single saves: onto the member's recent copy, or onto an
+        # earlier entry still waiting to be inserted, which then takes the later entry's place
+        saved = 0
+        pending = {}
         
-        await clipboard_collection.insert_one(clipboard_data)
-        logger.info(f"File saved as zip: {username} in {room_id} - {file.filename} from {client_ip}")
-        return {"status": "success", "id": item_id}
+        async def insert_pending():
+            nonlocal saved
+            inserts = list(pending.values())
+            pending.clear()
+            # Concurrent inserts land in the same write batch and get consecutive seqs in order
+            outcomes = await asyncio.gather(*(insert_clipboard_item(insert["doc"]) for insert in inserts), return_exceptions=True)
+            for insert, outcome in zip(inserts, outcomes):
+                doc, indexes = insert["doc"], [insert["index"]] + insert["collapsed"]
+                if isinstance(outcome, Exception):
+                    logger.error(f"Error saving batch item {insert['index']}: {outcome}")
+                    await release_batch_entry(insert["entry"])
+                    detail = outcome.detail if isinstance(outcome, HTTPException) else "Error saving item"
+                    for index in indexes:
+                        results[index] = {"index": index, "status": "error", "detail": detail}
+                    continue
+                saved += len(indexes)
+                if doc.get("blob") and doc["type"] == "image":
+                    schedule_thumbnail(doc)
+                for index in indexes:
+                    results[index] = {"index": index, "status": "success", "id": doc["id"], "seq": doc["seq"], "type": doc["type"]}
+                    if index != insert["index"]:
+                        results[index].update(collapsed=True, copy_count=doc["copy_count"])
         
+        for (index, entry), doc in zip(prepared, docs):
+            filename = doc["metadata"].get("original_filename") if doc["type"] == "file" else None
+            key = (doc["type"], doc["content_sha256"], filename)
+            earlier = pending.pop(key, None)
+            if earlier is not None:
+                await release_batch_entry(entry)
+                earlier["doc"]["copy_count"] = earlier["doc"].get("copy_count", 1) + 1
+                earlier["doc"]["last_copied_at"] = earlier["doc"]["timestamp"]
+                earlier["collapsed"].append(index)
+                pending[key] = earlier
+                continue
+            repeat_id = await find_repeat(room_id, username, doc["type"], doc["content_sha256"], filename)
+            if repeat_id:
+                # Entries before this one take their seqs first
+                await insert_pending()
+                moved = await move_repeat(room_id, repeat_id)
+                if moved:
+                    await release_batch_entry(entry)
+                    saved += 1
+                    results[index] = {"index": index, **collapsed_response(moved), "type": moved["type"]}
+                    continue
+            pending[key] = {"index": index, "entry": entry, "doc": doc, "collapsed": []}
+        await insert_pending()
+        logger.info(f"📚 Batch saved {saved}/{len(parts)} items: {username} in {room_id} from {client_ip}")
+        return {"status": "success", "saved": saved, "results": results}
+    finally:
+        if form is not None:
+            await form.close()
+
+@app.post("/api/clipboard/by-hash")
+async def save_by_hash(item: HashedClipboard, request: Request):
+    """Conditional create: add an image or file the room already holds without sending its bytes
+    
+    Answers 404 when the room has no such content; the client then uploads it
+    as usual. Only the room's own items are matched, so knowing a hash never
+    yields content from another room.
+    """
+    if item.type not in ("image", "file"):
+        raise HTTPException(status_code=400, detail="Only image and file items can be created by hash")
+    await require_room(request, item.room_id, item.username)
+    
+    return await run_idempotent(
+        request, item.room_id, lambda: copy_by_hash(item),
+        f"{item.type.capitalize()} by hash of {item.username}"
+    )
+
+async def copy_by_hash(item: HashedClipboard) -> dict:
+    """New item sharing the payload of the room's latest item with the same content"""
+    query = hash_query(item.room_id, item.sha256.lower(), item.type, item.filename)
+    source = await clipboard_collection.find_one(query, sort=[("seq", -1)])
+    if not source:
+        raise HTTPException(status_code=404, detail="Content not found, upload it")
+    
+    moved = await collapse_repeat(
+        item.room_id, item.username, item.type, source["content_sha256"],
+        filename=item.filename if item.type == "file" else None
+    )
+    if moved:
+        logger.info(f"🔂 Repeated {item.type} moved to head (x{moved['copy_count']}): {item.username} in {item.room_id}, upload skipped")
+        return {**collapsed_response(moved), "deduplicated": True}
+    
+    if source.get("blob") and not await blob_store.retain(source["blob"]["sha256"]):
+        raise HTTPException(status_code=404, detail="Content not found, upload it")
+    thumbnail = source.get("thumbnail")
+    if thumbnail and thumbnail.get("sha256") and not await blob_store.retain(thumbnail["sha256"]):
+        thumbnail = None
+    
+    item_id = str(uuid.uuid4())
+    filename = source.get("filename")
+    if item.filename and (item.type == "image" or source["metadata"].get("storage") == STORAGE_ARCHIVE):
+        filename = item.filename
+    clipboard_data = {
+        **{key: value for key, value in source.items() if key not in ("_id", "thumbnail", "copy_count", "last_copied_at")},
+        "id": item_id,
+        "seq": None,
+        "username": item.username,
+        "filename": filename,
+        "preview": build_preview(item.type, filename=filename),
+        "file_url": f"/api/clipboard/download/{item_id}",
+        "timestamp": datetime.utcnow()
+    }
+    if thumbnail:
+        clipboard_data["thumbnail"] = thumbnail
+    
+    try:
+        await insert_clipboard_item(clipboard_data)
+    except Exception:
+        for ref in (source.get("blob"), thumbnail):
+            if ref and ref.get("sha256"):
+                await blob_store.release(ref["sha256"])
+        raise
+    logger.info(f"♻️ {item.type.capitalize()} added by hash {item.sha256[:12]}: {item.username} in {item.room_id}, upload skipped")
+    return {"status": "success", "id": item_id, "seq": clipboard_data["seq"], "deduplicated": True}
+
+# ==================== UPLOAD SESSIONS ====================
+
+@app.post("/api/clipboard/uploads")
+async def create_upload_session(upload: UploadSessionCreate, request: Request):
+    """Open a resumable chunked upload for a large file or zipped folder"""
+    if upload.size < 0 or upload.size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail="File too large (max 50MB)")
+    await require_room(request, upload.room_id, upload.username)
+    
+    session = await create_session(
+        upload.room_id, upload.username, upload.filename, upload.size, upload.mime_type, upload.chunk_size
+    )
+    logger.info(f"📦 Upload session {session['_id']} opened: {upload.username} in {upload.room_id} - {upload.filename} ({upload.size} bytes in {session['chunk_count']} chunks)")
+    return session_view(session)
+
+@app.get("/api/clipboard/uploads/{upload_id}")
+async def get_upload_session(upload_id: str, request: Request):
+    """Session status; `received` lists the chunks already stored, so clients resume with the rest"""
+    session = await get_session(upload_id)
+    room_session(request, session["room_id"], session["username"])
+    return session_view(session)
+
+@app.put("/api/clipboard/uploads/{upload_id}/{index}")
+async def put_upload_chunk(upload_id: str, index: int, request: Request):
+    """Store one chunk; its SHA-256 is checked when sent as X-Chunk-SHA256"""
+    session = await get_session(upload_id)
+    room_session(request, session["room_id"], session["username"])
+    data = await read_chunk(session, index, request)
+    session = await write_chunk(session, index, data, request.headers.get("x-chunk-sha256"))
+    return {"index": index, "received": len(session["received"]), "chunk_count": session["chunk_count"]}
+
+@app.post("/api/clipboard/uploads/{upload_id}/commit")
+async def commit_upload_session(upload_id: str, request: Request):
+    """Assemble a complete session into a file item (retrying a finished commit returns the same item)"""
+    session = await get_session(upload_id)
+    room_session(request, session["room_id"], session["username"])
+    if session.get("committed"):
+        return {"status": "success", **session["committed"]}
+    
+    session = await claim_commit(session)
+    result = None
+    try:
+        stored = await store_upload(SessionReader(session), MAX_FILE_SIZE, archive_name=session["filename"])
+        result = await insert_file_item(
+            stored, session["room_id"], session["username"], session["filename"], session.get("mime_type")
+        )
+        logger.info(f"File saved from upload session {upload_id} as {stored['storage']} blob {stored['blob']['sha256'][:12]}: {session['username']} in {session['room_id']} - {session['filename']}")
+        return result
+    except HTTPException:
+        raise
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="File too large (max 50MB)")
+    except CpuPoolBusy:
+        raise
     except Exception as e:
-        logger.error(f"Error saving file: {e}")
+        logger.error(f"Error committing upload {upload_id}: {e}")
         raise HTTPException(status_code=500, detail="Error saving file")
+    finally:
+        # Success is remembered for retried commits; a failure releases the claim
+        await finish_commit(session, result)
+
+@app.delete("/api/clipboard/uploads/{upload_id}")
+async def abort_upload_session(upload_id: str, request: Request):
+    """Abandon an upload session and free its chunks"""
+    session = await get_session(upload_id)
+    room_session(request, session["room_id"], session["username"])
+    if commit_in_progress(session):
+        raise HTTPException(status_code=409, detail="Upload is being committed")
+    await discard_session(upload_id)
+    return {"status": "success"}
+
+def history_page(items: list, limit: int, direction: int, after_seq: Optional[int], deleted_cursor: Optional[int]) -> dict:
+    full_page = len(items) == limit
+    return {
+        "items": items,
+        "next_before_seq": items[-1].get("seq") if full_page and direction == -1 else None,
+        "latest_seq": items[0].get("seq") if items else after_seq,
+        # Pass to /since with latest_seq to hear about deletions too
+        "deleted_cursor": deleted_cursor,
+        "has_more": full_page
+    }
 
 @app.get("/api/clipboard/history/{room_id}")
-async def get_history(room_id: str, limit: int = 100):
-    """Get clipboard history for a room"""
-    items = []
-    cursor = clipboard_collection.find({"room_id": room_id}).sort("timestamp", -1).limit(limit)
+async def get_history(
+    room_id: str,
+    limit: int = 100,
+    before_seq: Optional[int] = None,
+    after_seq: Optional[int] = None
+):
+    """Get clipboard history for a room (metadata and previews only), newest first
+    
+    Keyset pagination: pass before_seq=next_before_seq to page back, or
+    after_seq=latest_seq to fetch what changed since then.
+    """
+    limit = max(1, limit)
+    deleted_cursor = None
+    if before_seq is None:
+        # Read before the items, so any deletion they miss is reported by /since
+        room = await rooms_collection.find_one({"room_id": room_id}, {"deleted_seq": 1})
+        deleted_cursor = (room or {}).get("deleted_seq", 0)
+    if before_seq is None and after_seq is None:
+        # The first page is the room's hot tail
+        items = await hot_tail.first_page(room_id, limit)
+        if items is not None:
+            return history_page(items, limit, -1, after_seq, deleted_cursor)
     
-    async for doc in cursor:
-        doc["_id"] = str(doc["_id"])
-        items.append(doc)
+    query = history_query(room_id, before_seq, after_seq)
     
-    return {"items": items}
+    # Paging forward walks the (room_id, seq) index upwards from the cursor
+    direction = 1 if after_seq is not None and before_seq is None else -1
+    cursor = clipboard_collection.find(query, SUMMARY_PROJECTION).sort("seq", direction).limit(limit)
+    
+    items = [to_summary(doc) async for doc in cursor]
+    if direction == 1:
+        items.reverse()
+    return history_page(items, limit, direction, after_seq, deleted_cursor)
+
+@app.get("/api/clipboard/since/{room_id}")
+async def get_changes_since(
+    room_id: str,
+    request: Request,
+    cursor: int = 0,
+    limit: int = 100,
+    deleted_cursor: Optional[int] = None
+):
+    """Delta sync: items newer than the client's cursor (a seq), oldest first
+    
+    With deleted_cursor (from the history page or the last delta) the ids of
+    items deleted since then come back in "deleted". Answers 304 with no body
+    when nothing changed, which costs one indexed lookup of the room.
+    """
+    room = await rooms_collection.find_one({"room_id": room_id}, {"seq": 1, "deleted_seq": 1, "deletions": 1})
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    
+    head_seq = room.get("seq", 0)
+    deleted_seq = room.get("deleted_seq", 0)
+    if cursor > head_seq:
+        # The room's seq is advanced just after each commit; check the items before calling the cursor stale
+        head_seq = (await room_heads([room_id], exact=True)).get(room_id, head_seq)
+    etag = f'"{room_id}:{head_seq}:{deleted_seq}"'
+    unchanged = cursor == head_seq and deleted_cursor in (None, deleted_seq)
+    if unchanged or etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    
+    # A cursor ahead of the room means the client synced against other data; resend from the start.
+    # So do deletions older than the room's log.
+    deleted = []
+    reset = cursor > head_seq
+    if deleted_cursor is not None and not reset:
+        deleted = deletions_after(room, deleted_cursor)
+        reset = deleted is None
+    if reset:
+        cursor = 0
+        deleted = []
+    
+    limit = max(1, limit)
+    items = await items_after(room_id, cursor, limit)
+    
+    return JSONResponse(
+        content=jsonable_encoder({
+            "items": items,
+            # Only move past what was returned; anything above commits with a higher seq
+            "cursor": items[-1]["seq"] if items else cursor,
+            "head_seq": head_seq,
+            "deleted": deleted,
+            "deleted_cursor": deleted_seq,
+            "has_more": len(items) == limit,
+            "reset": reset
+        }),
+        headers={"ETag": etag, "Cache-Control": "no-cache"}
+    )
+
+@app.get("/api/clipboard/item/{item_id}")
+async def get_clipboard_item(item_id: str):
+    """Get one clipboard item with its full text body (binary payloads via /download)"""
+    item = await clipboard_collection.find_one({"id": item_id}, ITEM_PROJECTION)
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    
+    return {"item": to_summary(item)}
 
 @app.get("/api/clipboard/last/{room_id}")
 async def get_last_item(room_id: str):
     """Get the most recent clipboard item in a room"""
+    item = await hot_tail.last(room_id)
+    if item:
+        return {"item": item}
+    
     item = await clipboard_collection.find_one(
         {"room_id": room_id},
-        sort=[("timestamp", -1)]
+        ITEM_PROJECTION,
+        sort=[("seq", -1)]
     )
     
     if not item:
         raise HTTPException(status_code=404, detail="No clipboard items found")
     
-    item["_id"] = str(item["_id"])
-    return {"item": item}
+    return {"item": to_summary(item)}
 
 @app.get("/uploads/{filename}")
 async def download_file(filename: str):
@@ -360,32 +966,23 @@ async def api_info():
 async def get_room_info(room_id: str):
     """Get detailed room information"""
     try:
-        room = await rooms_collection.find_one({"room_id": room_id})
+        room = await rooms_collection.find_one({"room_id": room_id}, {"created_at": 1})
         if not room:
             raise HTTPException(status_code=404, detail="Room not found")
         
-        # Get members
-        members = await users_collection.find({"room_id": room_id}).to_list(length=None)
-        
-        # Get total items count
-        total_items = await clipboard_collection.count_documents({"room_id": room_id})
+        overview = await room_overview(room_id)
         
         return {
             "room_id": room_id,
             "created_at": room.get("created_at"),
-            "members": [
-                {
-                    "username": member.get("username"),
-                    "last_active": member.get("last_active"),
-                    "items_count": await clipboard_collection.count_documents({
-                        "room_id": room_id,
-                        "username": member.get("username")
-                    })
-                }
-                for member in members
-            ],
-            "total_items": total_items
+            "members": overview["members"],
+            "member_count": overview["member_count"],
+            "total_items": overview["total_items"],
+            "items_by_type": overview["items_by_type"],
+            "total_bytes": overview["total_bytes"]
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting room info: {e}")
         raise HTTPException(status_code=500, detail="Error getting room info")
@@ -394,20 +991,10 @@ async def get_room_info(room_id: str):
 async def get_room_members(room_id: str):
     """Get room members"""
     try:
-        members = await users_collection.find({"room_id": room_id}).to_list(length=None)
+        overview = await room_overview(room_id)
         return {
             "room_id": room_id,
-            "members": [
-                {
-                    "username": member.get("username"),
-                    "last_active": member.get("last_active"),
-                    "items_count": await clipboard_collection.count_documents({
-                        "room_id": room_id,
-                        "username": member.get("username")
-                    })
-                }
-                for member in members
-            ]
+            "members": overview["members"]
         }
     except Exception as e:
         logger.error(f"Error getting room members: {e}")
@@ -512,7 +1099,7 @@ async def web_interface():
                             <p><strong>Room:</strong> ${item.room_id}</p>
                             <p><strong>Time:</strong> ${new Date(item.timestamp).toLocaleString()}</p>
                             ${item.type === 'text' ? `
-                                <div class="content-preview">${item.content.substring(0, 200)}${item.content.length > 200 ? '...' : ''}</div>
+                                <div class="content-preview">${item.preview}${item.preview.length >= 200 ? '...' : ''}</div>
                             ` : ''}
                             ${item.type === 'file' ? `
                                 <p><strong>File:</strong> ${item.filename}</p>
@@ -580,19 +1167,22 @@ async def web_interface():
 async def get_stats():
     """Get server statistics"""
     try:
-        total_rooms = await rooms_collection.count_documents({})
-        total_items = await clipboard_collection.count_documents({})
-        total_users = await users_collection.count_documents({})
-        
-        return {
-            "total_rooms": total_rooms,
-            "total_items": total_items,
-            "total_users": total_users
-        }
+        # Maintained counters: one document read regardless of data size
+        return await global_counters()
     except Exception as e:
         logger.error(f"Error getting stats: {e}")
         raise HTTPException(status_code=500, detail="Error getting statistics")
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """In-process performance metrics of this worker"""
+    return {
+        "cpu_pool": cpu_pool.stats(),
+        "hot_tail": hot_tail.stats(),
+        "variant_cache": variant_cache.stats(),
+        "write_batcher": clipboard_writes.stats()
+    }
+
 @app.get("/api/clipboard/all")
 async def get_all_clipboard_content(room_id: Optional[str] = None):
     """Get all clipboard content, optionally filtered by room"""
@@ -604,24 +1194,45 @@ async def get_all_clipboard_content(room_id: Optional[str] = None):
         if room_id and room_id.lower() != "hassan":
             query["room_id"] = room_id
         
-        async for item in clipboard_collection.find(query).sort("timestamp", -1).limit(100):
-            items.append({
-                "id": str(item["_id"]),
-                "type": item.get("type", "unknown"),
-                "username": item.get("username", "unknown"),
-                "room_id": item.get("room_id", "unknown"),
-                "content": item.get("content", ""),
-                "filename": item.get("filename", ""),
-                "timestamp": item.get("timestamp", datetime.now())
-            })
+        async for item in clipboard_collection.find(query, SUMMARY_PROJECTION).sort("timestamp", -1).limit(100):
+            items.append(to_summary(item))
         return items
     except Exception as e:
         logger.error(f"Error getting all clipboard content: {e}")
         raise HTTPException(status_code=500, detail="Error getting clipboard content")
 
+async def item_payload_source(item: dict):
+    """Return (etag, size, open_range) for an image/file item's stored bytes"""
+    blob = item.get("blob")
+    if blob:
+        sha256 = blob["sha256"]
+        return f'"{sha256}"', blob["size"], lambda start, end: blob_store.open_range(sha256, start, end)
+    
+    inline = item.get("inline")
+    if inline:
+        return f'"{inline["sha256"]}"', inline["size"], memory_range(bytes(inline["data"]))
+    
+    # Items written before the blob store keep base64 in "content"
+    base64_content = item.get("content", "")
+    if not base64_content:
+        raise HTTPException(status_code=404, detail="No content found")
+    data = await cpu_pool.run("base64", base64.b64decode, base64_content)
+    return f'"{item["id"]}"', len(data), memory_range(data)
+
 @app.get("/api/clipboard/download/{item_id}")
-async def download_clipboard_item(item_id: str):
-    """Download a specific clipboard item"""
+async def download_clipboard_item(
+    item_id: str,
+    request: Request,
+    w: Optional[int] = None,
+    h: Optional[int] = None,
+    q: Optional[int] = None,
+    image_format: Optional[str] = Query(None, alias="format")
+):
+    """Download a specific clipboard item (ETag, conditional GET and byte ranges supported)
+    
+    Images honor Accept and optional w/h (bounding box), q (quality) and
+    format parameters; converted or resized variants come from a bounded cache.
+    """
     try:
         # Use the correct ID field that we store in the database
         item = await clipboard_collection.find_one({"id": item_id})
@@ -629,57 +1240,158 @@ async def download_clipboard_item(item_id: str):
             raise HTTPException(status_code=404, detail="Item not found")
         
         if item["type"] == "text":
-            return JSONResponse(content={"content": item["content"]})
+            etag = f'"{item_id}"'
+            cached = not_modified(request, etag)
+            if cached:
+                return cached
+            return JSONResponse(content={"content": item["content"]}, headers=cache_headers(etag))
         elif item["type"] == "image":
-            # Handle base64 image content
-            import base64
-            import io
-            from fastapi.responses import Response
-            
-            base64_content = item.get("content", "")
-            if not base64_content:
-                raise HTTPException(status_code=404, detail="No image content found")
-            
-            # Decode base64 to bytes
-            image_bytes = base64.b64decode(base64_content)
-            
             # Determine content type
             mime_type = item.get("metadata", {}).get("mime_type", "image/png")
+            disposition = f"inline; filename={item.get('filename', 'image.png')}"
             
-            return Response(
-                content=image_bytes,
-                media_type=mime_type,
-                headers={"Content-Disposition": f"inline; filename={item.get('filename', 'image.png')}"}
-            )
-        elif item["type"] == "file":
-            # Handle base64 zip content
-            import base64
-            import io
-            from fastapi.responses import Response
-            
-            base64_content = item.get("content", "")
-            if not base64_content:
-                raise HTTPException(status_code=404, detail="No file content found")
+            variant = None
+            if Image is not None:
+                try:
+                    variant = choose_variant(request.headers.get("accept"), mime_type, w, h, q, image_format)
+                except VariantNotAcceptable:
+                    raise HTTPException(status_code=406, detail="No acceptable image format")
             
-            # Decode base64 to bytes
-            zip_bytes = base64.b64decode(base64_content)
+            response = None
+            if variant:
+                stored = item.get("blob") or item.get("inline") or {}
+                source_key = stored.get("sha256") or item_id
+                etag = variant_etag(source_key, variant)
+                # Answer revalidations before rendering anything
+                response = not_modified(request, etag)
+                if response is None:
+                    try:
+                        data = await variant_cache.get(source_key, variant, lambda: read_payload(item))
+                    except VariantRenderFailed as e:
+                        # Not a convertible image after all: hand out what was stored
+                        logger.warning(f"Variant {variant} of {item_id} failed, serving original: {e}")
+                    else:
+                        response = await payload_response(
+                            request,
+                            etag=etag,
+                            size=len(data),
+                            media_type=VARIANT_FORMATS[variant[0]][1],
+                            disposition=disposition,
+                            open_range=memory_range(data)
+                        )
+            if response is None:
+                etag, size, open_range = await item_payload_source(item)
+                response = await payload_response(
+                    request,
+                    etag=etag,
+                    size=size,
+                    media_type=mime_type,
+                    disposition=disposition,
+                    open_range=open_range
+                )
+            # The same URL answers with different bytes depending on Accept
+            response.headers["Vary"] = "Accept"
+            return response
+        elif item["type"] == "file":
+            etag, size, open_range = await item_payload_source(item)
             
-            return Response(
-                content=zip_bytes,
+            return await payload_response(
+                request,
+                etag=etag,
+                size=size,
                 media_type="application/zip",
-                headers={"Content-Disposition": f"attachment; filename={item.get('filename', 'file.zip')}"}
+                disposition=f"attachment; filename={item.get('filename', 'file.zip')}",
+                open_range=open_range
             )
         else:
             raise HTTPException(status_code=400, detail="Unsupported item type")
+    except (HTTPException, CpuPoolBusy):
+        raise
+    except BlobNotFound:
+        logger.error(f"Blob missing for item {item_id}")
+        raise HTTPException(status_code=404, detail="Item content not found")
     except Exception as e:
         logger.error(f"Error downloading item {item_id}: {e}")
         raise HTTPException(status_code=500, detail="Error downloading item")
 
+@app.get("/api/clipboard/thumbnail/{item_id}")
+async def get_thumbnail(item_id: str, request: Request):
+    """Small cacheable preview of an image item (the original when no thumbnail can be made)"""
+    try:
+        item = await clipboard_collection.find_one({"id": item_id, "type": "image"})
+        if not item:
+            raise HTTPException(status_code=404, detail="Image not found")
+        
+        thumbnail = None
+        busy = False
+        if not item.get("inline"):
+            try:
+                thumbnail = await ensure_thumbnail(item)
+            except CpuPoolBusy:
+                logger.warning(f"CPU pool busy, serving original image for {item_id}")
+                busy = True
+        if thumbnail and thumbnail.get("sha256"):
+            sha256 = thumbnail["sha256"]
+            return await payload_response(
+                request,
+                etag=f'"{sha256}"',
+                size=thumbnail["size"],
+                media_type=thumbnail["mime_type"],
+                disposition="inline; filename=thumbnail",
+                open_range=lambda start, end: blob_store.open_range(sha256, start, end)
+            )
+        
+        etag, size, open_range = await item_payload_source(item)
+        return await payload_response(
+            request,
+            etag=etag,
+            size=size,
+            media_type=item.get("metadata", {}).get("mime_type", "image/png"),
+            disposition=f"inline; filename={item.get('filename', 'image.png')}",
+            open_range=open_range,
+            # A stand-in for a thumbnail that can be made later must not be cached as it
+            cache_control=CACHE_CONTROL_NO_STORE if busy else CACHE_CONTROL_IMMUTABLE
+        )
+    except HTTPException:
+        raise
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail="Item content not found")
+    except Exception as e:
+        logger.error(f"Error serving thumbnail {item_id}: {e}")
+        raise HTTPException(status_code=500, detail="Error serving thumbnail")
+
+@app.delete("/api/clipboard/item/{item_id}")
+async def delete_clipboard_item(item_id: str):
+    """Delete one clipboard item"""
+    item = await clipboard_collection.find_one_and_delete(
+        {"id": item_id},
+        projection={"room_id": 1, "seq": 1, "blob": 1, "thumbnail": 1, "type": 1, "size": 1, "metadata.original_size": 1}
+    )
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    hot_tail.remove(item["room_id"], item_id)
+    
+    await count_item(item, -1)
+    if item.get("blob"):
+        await blob_store.release(item["blob"]["sha256"])
+    if item.get("thumbnail", {}).get("sha256"):
+        await blob_store.release(item["thumbnail"]["sha256"])
+    deleted_seq = await record_deletion(item["room_id"], item_id)
+    await hub.publish(item["room_id"], item_deleted_event(item["room_id"], item_id, item.get("seq"), deleted_seq))
+    logger.info(f"🗑️ Deleted clipboard item {item_id} from {item['room_id']}")
+    return {"status": "success", "id": item_id}
+
 @app.delete("/api/clipboard/clear")
 async def clear_all_clipboard_content():
     """Clear all clipboard content"""
     try:
         result = await clipboard_collection.delete_many({})
+        hot_tail.clear()
+        # Nothing references any blob anymore
+        await blob_store.purge()
+        await reset_item_counters()
+        await forget_deletions()
+        await hub.publish_all(room_cleared_event)
         logger.info(f"Cleared {result.deleted_count} clipboard items")
         return {"message": f"Cleared {result.deleted_count} items"}
     except Exception as e:
@@ -36,3 +36,18 @@ class TextClipboard(BaseModel):
     room_id: str
     username: str
     content: str
+
+class UploadSessionCreate(BaseModel):
+    room_id: str
+    username: str
+    filename: str
+    size: int
+    mime_type: Optional[str] = None
+    chunk_size: Optional[int] = None
+
+class HashedClipboard(BaseModel):
+    room_id: str
+    username: str
+    sha256: str
+    type: str  # image or file
+    filename: Optional[str] = None
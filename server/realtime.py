@@ -0,0 +1,204 @@
+"""
+Push channels for room clipboard events.
+
+WebSocket is the primary channel; Server-Sent Events and long-polling serve
+clients behind proxies that drop WebSockets. All three are driven by the
+same RoomHub that the upload handlers signal.
+"""
+import asyncio
+import json
+import logging
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from database import rooms_collection, deletions_after
+from events import hub, item_deleted_event
+from items import items_after
+
+logger = logging.getLogger(__name__)
+
+SSE_KEEPALIVE_SECONDS = 15
+LONG_POLL_MAX_TIMEOUT = 55  # stay under typical 60s proxy idle timeouts
+REPLAY_LIMIT = 100
+
+
+def sse_message(event: dict, event_id: str = None) -> str:
+    """Format an event as an SSE frame"""
+    frame = f"id: {event_id}\n" if event_id is not None else ""
+    return frame + f"data: {json.dumps(event)}\n\n"
+
+
+def sse_event_id(seq: int, deleted_seq: int) -> str:
+    """Resume point of a stream: the last item seq and deletion number the client has"""
+    return f"{seq}:{deleted_seq}"
+
+
+def parse_sse_event_id(value: Optional[str]) -> tuple:
+    """(seq, deleted_seq) from a Last-Event-ID; (None, None) if unusable, deleted_seq None for a bare seq"""
+    seq, _, deleted_seq = (value or "").partition(":")
+    if not seq.isdigit():
+        return None, None
+    return int(seq), int(deleted_seq) if deleted_seq.isdigit() else None
+
+
+def create_realtime_routes(app: FastAPI):
+    """Add push notification routes to the FastAPI app"""
+
+    @app.websocket("/ws/room/{room_id}")
+    async def room_socket(websocket: WebSocket, room_id: str):
+        """Push item.created / item.deleted events (metadata only) for a room"""
+        room = await rooms_collection.find_one({"room_id": room_id}, {"seq": 1})
+        if not room:
+            await websocket.close(code=4404)
+            return
+
+        await websocket.accept()
+        queue = hub.subscribe(room_id)
+        logger.info(f"🔌 WebSocket subscribed to {room_id} ({hub.subscriber_count(room_id)} in room)")
+
+        async def pump():
+            while True:
+                await websocket.send_json(await queue.get())
+
+        sender = None
+        try:
+            # Tell the client where the room stands so it can catch up with /since
+            await websocket.send_json({"event": "hello", "room_id": room_id, "head_seq": room.get("seq", 0)})
+            sender = asyncio.create_task(pump())
+            while True:
+                # Clients may send keepalive pings as text; the content is ignored
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("text") is None:
+                    # Binary frames are not part of the protocol
+                    await websocket.close(code=1003)
+                    break
+        except WebSocketDisconnect:
+            pass
+        finally:
+            if sender:
+                sender.cancel()
+                # Collect how the sender ended; only a real failure is worth a log line
+                outcome, = await asyncio.gather(sender, return_exceptions=True)
+                if isinstance(outcome, Exception):
+                    logger.warning(f"WebSocket sender in {room_id} failed: {outcome}")
+            hub.unsubscribe(room_id, queue)
+            logger.info(f"🔌 WebSocket left {room_id}")
+
+    @app.get("/api/clipboard/stream/{room_id}")
+    async def room_event_stream(room_id: str, request: Request, last_event_id: Optional[str] = None):
+        """Server-Sent Events feed of room events, resumable with Last-Event-ID
+
+        Event ids are "seq:deleted_seq"; on resume the items created and
+        deleted since then are replayed, or a resync is sent when the room's
+        deletion log no longer reaches back that far.
+        """
+        # Subscribe before reading the room so nothing committed in between is lost
+        queue = hub.subscribe(room_id)
+        room = await rooms_collection.find_one({"room_id": room_id}, {"seq": 1, "deleted_seq": 1, "deletions": 1})
+        if not room:
+            hub.unsubscribe(room_id, queue)
+            raise HTTPException(status_code=404, detail="Room not found")
+
+        sent_seq, deleted_cursor = parse_sse_event_id(request.headers.get("last-event-id") or last_event_id)
+
+        async def stream():
+            nonlocal sent_seq, deleted_cursor
+            try:
+                yield "retry: 3000\n\n"
+                head_deleted = room.get("deleted_seq", 0)
+                if sent_seq is None:
+                    sent_seq, deleted_cursor = room.get("seq", 0), head_deleted
+                    yield sse_message(
+                        {"event": "hello", "room_id": room_id, "head_seq": sent_seq, "deleted_cursor": deleted_cursor},
+                        sse_event_id(sent_seq, deleted_cursor)
+                    )
+                else:
+                    # Resume: replay what the client missed while disconnected
+                    while True:
+                        missed = await items_after(room_id, sent_seq, REPLAY_LIMIT)
+                        for item in missed:
+                            sent_seq = item["seq"]
+                            yield sse_message(jsonable_encoder({
+                                "event": "item.created", "room_id": room_id, "seq": item["seq"], "item": item
+                            }), sse_event_id(sent_seq, deleted_cursor if deleted_cursor is not None else head_deleted))
+                        if len(missed) < REPLAY_LIMIT:
+                            break
+                    deleted = deletions_after(room, deleted_cursor) if deleted_cursor is not None else None
+                    if deleted is None:
+                        deleted_cursor = head_deleted
+                        yield sse_message({"event": "resync", "room_id": room_id}, sse_event_id(sent_seq, deleted_cursor))
+                    else:
+                        for item_id in deleted:
+                            deleted_cursor += 1
+                            yield sse_message(item_deleted_event(room_id, item_id, deleted_seq=deleted_cursor),
+                                              sse_event_id(sent_seq, deleted_cursor))
+                # Deletions up to here were replayed; their live events may still be queued
+                replayed_deleted = deleted_cursor
+
+                while True:
+                    try:
+                        event = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+                    except asyncio.TimeoutError:
+                        # Comment frame keeps proxies from closing an idle stream
+                        yield ": keepalive\n\n"
+                        continue
+                    kind = event.get("event")
+                    if kind == "item.created" and event.get("seq") is not None:
+                        if event["seq"] <= sent_seq:
+                            continue
+                        sent_seq = event["seq"]
+                    elif kind == "item.deleted" and event.get("deleted_seq") is not None:
+                        if event["deleted_seq"] <= replayed_deleted:
+                            continue
+                        deleted_cursor = max(deleted_cursor, event["deleted_seq"])
+                    elif kind == "room.cleared":
+                        # Clearing restarts every deletion log; resume from its new position
+                        cleared = await rooms_collection.find_one({"room_id": room_id}, {"deleted_seq": 1})
+                        deleted_cursor = replayed_deleted = (cleared or {}).get("deleted_seq", deleted_cursor)
+                    elif kind != "resync":
+                        yield sse_message(event)
+                        continue
+                    yield sse_message(event, sse_event_id(sent_seq, deleted_cursor))
+            finally:
+                hub.unsubscribe(room_id, queue)
+
+        return StreamingResponse(
+            stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    @app.get("/api/clipboard/wait/{room_id}")
+    async def wait_for_items(room_id: str, after: int = 0, timeout: float = 25, limit: int = 100):
+        """Long-poll: return items with seq > after as soon as one lands, or 304 on timeout"""
+        room = await rooms_collection.find_one({"room_id": room_id}, {"_id": 1})
+        if not room:
+            raise HTTPException(status_code=404, detail="Room not found")
+
+        limit = max(1, limit)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + min(max(timeout, 0), LONG_POLL_MAX_TIMEOUT)
+        while True:
+            # The hub head can be past `after` with nothing to return (the newest items were
+            # deleted), so wait for a seq beyond the head as it was before querying
+            seen = max(after, hub.head_seq(room_id))
+            items = await items_after(room_id, after, limit)
+            remaining = deadline - loop.time()
+            if items or remaining <= 0 or not await hub.wait_for_seq(room_id, seen, remaining):
+                break
+        if not items:
+            return Response(status_code=304, headers={"Cache-Control": "no-cache"})
+
+        return JSONResponse(
+            content=jsonable_encoder({
+                "items": items,
+                "cursor": items[-1]["seq"],
+                "has_more": len(items) == limit
+            }),
+            headers={"Cache-Control": "no-cache"}
+        )
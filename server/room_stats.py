@@ -0,0 +1,191 @@
+"""
+Room and member statistics.
+
+Per-member figures come from one $group over the room's items (served by
+the (room_id, username) index) instead of a count per member.
+
+Totals are kept in a counters collection: one document per room
+("room:<room_id>") and one "global" document, holding item counts by type,
+byte totals and member/room/user counts. Writers $inc them alongside each
+insert or delete so reads are a single _id lookup; a background reconciler
+recomputes them from the source collections to repair any drift.
+"""
+import asyncio
+import logging
+import os
+from collections import Counter, defaultdict
+
+from pymongo import UpdateOne
+
+from database import clipboard_collection, counters_collection, rooms_collection, users_collection
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_COUNTERS = "global"
+RECONCILE_INTERVAL = int(os.getenv("COUNTER_RECONCILE_SECONDS", "900"))
+
+_ITEM_BYTES = {"$ifNull": ["$size", {"$ifNull": ["$metadata.original_size", 0]}]}
+
+
+def room_counter_id(room_id: str) -> str:
+    return f"room:{room_id}"
+
+
+def item_bytes(doc: dict) -> int:
+    """Size counted for an item; matches _ITEM_BYTES for legacy documents"""
+    if doc.get("size") is not None:
+        return doc["size"]
+    return (doc.get("metadata") or {}).get("original_size") or 0
+
+
+async def member_activity(room_id: str) -> dict:
+    """Item count, last activity and bytes shared per username, in one aggregation"""
+    pipeline = [
+        {"$match": {"room_id": room_id}},
+        {"$group": {
+            "_id": "$username",
+            "items_count": {"$sum": 1},
+            "last_activity": {"$max": "$timestamp"},
+            "total_bytes": {"$sum": _ITEM_BYTES}
+        }}
+    ]
+    return {group["_id"]: group async for group in clipboard_collection.aggregate(pipeline)}
+
+
+async def room_overview(room_id: str) -> dict:
+    """Members of a room with their activity plus room totals, in a constant number of round trips"""
+    users, activity, counters = await asyncio.gather(
+        users_collection.find({"room_id": room_id}, {"_id": 0, "username": 1, "last_active": 1}).to_list(length=None),
+        member_activity(room_id),
+        room_counters(room_id)
+    )
+    members = []
+    for user in users:
+        stats = activity.get(user.get("username"), {})
+        members.append({
+            "username": user.get("username"),
+            "last_active": user.get("last_active"),
+            "items_count": stats.get("items_count", 0),
+            "last_activity": stats.get("last_activity"),
+            "total_bytes": stats.get("total_bytes", 0)
+        })
+    return {"members": members, **counters}
+
+
+# ==================== COUNTERS ====================
+
+async def count_item(doc: dict, delta: int):
+    """Add (delta=1) or remove (delta=-1) an item from its room's and the global counters"""
+    await count_items([doc], delta)
+
+
+async def count_items(docs: list, delta: int = 1):
+    """count_item() for a batch of items, merged into one bulk write"""
+    increments = defaultdict(Counter)
+    for doc in docs:
+        for counter_id in (room_counter_id(doc["room_id"]), GLOBAL_COUNTERS):
+            inc = increments[counter_id]
+            inc["items"] += delta
+            inc[f"types.{doc.get('type', 'text')}"] += delta
+            inc["bytes"] += delta * item_bytes(doc)
+    await counters_collection.bulk_write([
+        UpdateOne({"_id": counter_id}, {"$inc": dict(inc)}, upsert=True)
+        for counter_id, inc in increments.items()
+    ], ordered=False)
+
+
+async def count_room_created():
+    await counters_collection.update_one({"_id": GLOBAL_COUNTERS}, {"$inc": {"rooms": 1}}, upsert=True)
+
+
+async def count_member_joined(room_id: str, new_member: bool, new_user: bool):
+    """Count a join that added a room member and/or a never-seen username"""
+    updates = []
+    if new_member:
+        updates.append(UpdateOne({"_id": room_counter_id(room_id)}, {"$inc": {"members": 1}}, upsert=True))
+    if new_user:
+        updates.append(UpdateOne({"_id": GLOBAL_COUNTERS}, {"$inc": {"users": 1}}, upsert=True))
+    await counters_collection.bulk_write(updates, ordered=False)
+
+
+async def reset_item_counters():
+    """Every item was deleted"""
+    await counters_collection.update_many({}, {"$set": {"items": 0, "types": {}, "bytes": 0}})
+
+
+async def room_counters(room_id: str) -> dict:
+    doc = await counters_collection.find_one({"_id": room_counter_id(room_id)}) or {}
+    return {
+        "total_items": doc.get("items", 0),
+        "items_by_type": doc.get("types", {}),
+        "total_bytes": doc.get("bytes", 0),
+        "member_count": doc.get("members", 0)
+    }
+
+
+async def global_counters() -> dict:
+    doc = await counters_collection.find_one({"_id": GLOBAL_COUNTERS}) or {}
+    return {
+        "total_rooms": doc.get("rooms", 0),
+        "total_items": doc.get("items", 0),
+        "total_users": doc.get("users", 0),
+        "items_by_type": doc.get("types", {}),
+        "total_bytes": doc.get("bytes", 0)
+    }
+
+
+async def reconcile_counters():
+    """Recompute every counter from the source collections
+
+    Increments that land while this runs can be overwritten; the next pass
+    repairs them, so drift stays bounded by one interval.
+    """
+    per_room = {}
+    pipeline = [{"$group": {
+        "_id": {"room_id": "$room_id", "type": "$type"},
+        "items": {"$sum": 1},
+        "bytes": {"$sum": _ITEM_BYTES}
+    }}]
+    async for group in clipboard_collection.aggregate(pipeline):
+        room = per_room.setdefault(group["_id"]["room_id"], {"items": 0, "types": {}, "bytes": 0})
+        room["items"] += group["items"]
+        room["types"][group["_id"]["type"] or "text"] = group["items"]
+        room["bytes"] += group["bytes"]
+
+    members = rooms_collection.aggregate([
+        {"$project": {"room_id": 1, "members": {"$size": {"$ifNull": ["$members", []]}}}}
+    ])
+    rooms = {room["room_id"]: room["members"] async for room in members}
+
+    totals = {"items": 0, "types": {}, "bytes": 0}
+    updates = []
+    for room_id in rooms.keys() | per_room.keys():
+        counts = per_room.get(room_id, {"items": 0, "types": {}, "bytes": 0})
+        totals["items"] += counts["items"]
+        totals["bytes"] += counts["bytes"]
+        for item_type, count in counts["types"].items():
+            totals["types"][item_type] = totals["types"].get(item_type, 0) + count
+        updates.append(UpdateOne(
+            {"_id": room_counter_id(room_id)},
+            {"$set": {**counts, "members": rooms.get(room_id, 0)}},
+            upsert=True
+        ))
+
+    totals["rooms"] = len(rooms)
+    totals["users"] = await users_collection.count_documents({})
+    updates.append(UpdateOne({"_id": GLOBAL_COUNTERS}, {"$set": totals}, upsert=True))
+    await counters_collection.bulk_write(updates, ordered=False)
+    return len(updates) - 1
+
+
+async def run_reconciler():
+    """Background task: reconcile counters at startup and every RECONCILE_INTERVAL seconds"""
+    while True:
+        try:
+            rooms = await reconcile_counters()
+            logger.info(f"🧮 Counters reconciled for {rooms} rooms")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Counter reconciliation failed: {e}")
+        await asyncio.sleep(RECONCILE_INTERVAL)
@@ -12,6 +12,13 @@ echo [INFO] Starting API tests...
 echo.
 
 python test_api.py
+python test_components.py
+
+if defined MONGODB_URL (
+    python test_indexes.py
+) else (
+    echo [INFO] Skipping index test: set MONGODB_URL to a scratch MongoDB server
+)
 
 echo.
 echo ====================================
@@ -13,9 +13,14 @@ Make sure the server is running on http://localhost:8000
 """
 
 import requests
+import hashlib
+import io
 import json
+import threading
 import time
 import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Configuration
@@ -394,6 +399,483 @@ def test_file_upload():
         print_test("File Upload", "FAIL", f"Error: {e}")
         return False
 
+def test_download_range_and_etag():
+    """Test conditional GET and byte-range downloads of a blob-stored payload"""
+    print_header("DOWNLOAD RANGE / ETAG TEST")
+    
+    try:
+        # Larger than the 64KB inline limit, so it is read back from the blob store
+        payload = bytes(range(256)) * 1200
+        files = {"file": ("range_test.png", payload, "image/png")}
+        data = {"room_id": TEST_ROOM_ID, "username": TEST_USERNAME}
+        response = requests.post(f"{BASE_URL}/api/clipboard/image", files=files, data=data, timeout=10)
+        if response.status_code != 200:
+            print_test("Download Range", "FAIL", f"Upload failed: HTTP {response.status_code}")
+            return False
+        
+        url = f"{BASE_URL}/api/clipboard/download/{response.json()['id']}"
+        full = requests.get(url, timeout=10)
+        etag = full.headers.get("ETag")
+        if full.content != payload or not etag:
+            print_test("Download Range", "FAIL", "Full download mismatch or missing ETag")
+            return False
+        
+        # Spans the boundary between two 256KB blob reads
+        for byte_range, expected in (("bytes=262000-262999", payload[262000:263000]), ("bytes=-100", payload[-100:])):
+            partial = requests.get(url, headers={"Range": byte_range}, timeout=10)
+            if partial.status_code != 206 or partial.content != expected:
+                print_test("Download Range", "FAIL", f"{byte_range}: expected 206 with {len(expected)} bytes, "
+                           f"got {partial.status_code} with {len(partial.content)}")
+                return False
+        
+        cached = requests.get(url, headers={"If-None-Match": etag}, timeout=10)
+        if cached.status_code != 304:
+            print_test("Download Range", "FAIL", f"Expected 304, got {cached.status_code}")
+            return False
+        
+        # The payload isn't a decodable image, so a variant request falls back to the original
+        variant = requests.get(url, headers={"Accept": "image/webp"}, timeout=10)
+        if variant.status_code != 200 or variant.content != payload:
+            print_test("Download Range", "FAIL", f"Variant fallback gave HTTP {variant.status_code}")
+            return False
+        
+        print_test("Download Range", "PASS", f"ETag {etag[:14]}... honored, ranges served from the blob")
+        return True
+    except requests.exceptions.RequestException as e:
+        print_test("Download Range", "FAIL", f"Connection error: {e}")
+        return False
+
+def test_session_token():
+    """Test that join issues a session token that uploads accept"""
+    print_header("SESSION TOKEN TEST")
+    
+    try:
+        payload = {"room_id": TEST_ROOM_ID, "password": TEST_PASSWORD, "username": TEST_USERNAME}
+        response = requests.post(f"{BASE_URL}/api/room/join", json=payload, timeout=10)
+        token = response.json().get("token") if response.status_code == 200 else None
+        if not token:
+            print_test("Session Token", "FAIL", f"No token from join: HTTP {response.status_code}")
+            return False
+        
+        item = {"room_id": TEST_ROOM_ID, "username": TEST_USERNAME, "content": "Sent with a session token"}
+        signed = requests.post(
+            f"{BASE_URL}/api/clipboard/text",
+            json=item,
+            headers={"Authorization": f"Bearer {token}"},
+            timeout=5
+        )
+        if signed.status_code != 200:
+            print_test("Session Token", "FAIL", f"Upload with token failed: HTTP {signed.status_code}")
+            return False
+        
+        forged = requests.post(
+            f"{BASE_URL}/api/clipboard/text",
+            json=item,
+            headers={"Authorization": f"Bearer {token[:-4]}AAAA"},
+            timeout=5
+        )
+        if forged.status_code != 401:
+            print_test("Session Token", "FAIL", f"Forged token gave HTTP {forged.status_code}, expected 401")
+            return False
+        
+        print_test("Session Token", "PASS", "Token accepted, forged token rejected")
+        return True
+    except requests.exceptions.RequestException as e:
+        print_test("Session Token", "FAIL", f"Connection error: {e}")
+        return False
+
+def test_chunked_upload():
+    """Test a resumable upload session: chunks out of order, status, commit and retried commit"""
+    print_header("CHUNKED UPLOAD TEST")
+    
+    try:
+        data = os.urandom(600 * 1024)
+        session = requests.post(
+            f"{BASE_URL}/api/clipboard/uploads",
+            json={"room_id": TEST_ROOM_ID, "username": TEST_USERNAME, "filename": "chunked.bin",
+                  "size": len(data), "chunk_size": 256 * 1024},
+            timeout=10
+        ).json()
+        session_url = f"{BASE_URL}/api/clipboard/uploads/{session['upload_id']}"
+        chunk_size = session["chunk_size"]
+        chunks = [data[i * chunk_size:(i + 1) * chunk_size] for i in range(session["chunk_count"])]
+        
+        bad = requests.put(f"{session_url}/0", data=chunks[0], headers={"X-Chunk-SHA256": "0" * 64}, timeout=10)
+        if bad.status_code != 422:
+            print_test("Chunked Upload", "FAIL", f"Corrupt chunk gave HTTP {bad.status_code}, expected 422")
+            return False
+        
+        for index in reversed(range(1, len(chunks))):
+            headers = {"X-Chunk-SHA256": hashlib.sha256(chunks[index]).hexdigest()}
+            requests.put(f"{session_url}/{index}", data=chunks[index], headers=headers, timeout=10).raise_for_status()
+        status = requests.get(session_url, timeout=5).json()
+        if 0 in status["received"] or len(status["received"]) != len(chunks) - 1:
+            print_test("Chunked Upload", "FAIL", f"Unexpected received chunks: {status['received']}")
+            return False
+        
+        requests.put(f"{session_url}/0", data=chunks[0], timeout=10).raise_for_status()
+        first = requests.post(f"{session_url}/commit", timeout=30).json()
+        retried = requests.post(f"{session_url}/commit", timeout=30).json()
+        if first.get("id") is None or retried.get("id") != first["id"]:
+            print_test("Chunked Upload", "FAIL", f"Commit results differ: {first} / {retried}")
+            return False
+        
+        print_test("Chunked Upload", "PASS", f"{len(chunks)} chunks committed as item {first['id']}")
+        return True
+    except requests.exceptions.RequestException as e:
+        print_test("Chunked Upload", "FAIL", f"Connection error: {e}")
+        return False
+
+def test_upload_by_hash():
+    """Test that content already in the room can be added by its hash alone"""
+    print_header("UPLOAD BY HASH TEST")
+    
+    try:
+        content = f"Dedupe me {time.time()}".encode() * 100
+        body = {"room_id": TEST_ROOM_ID, "username": TEST_USERNAME, "sha256": hashlib.sha256(content).hexdigest(),
+                "type": "file", "filename": "dedupe.txt"}
+        
+        unknown = requests.post(f"{BASE_URL}/api/clipboard/by-hash", json=body, timeout=5)
+        if unknown.status_code != 404:
+            print_test("Upload By Hash", "FAIL", f"Unknown content gave HTTP {unknown.status_code}, expected 404")
+            return False
+        
+        files = {"file": ("dedupe.txt", content, "text/plain")}
+        data = {"room_id": TEST_ROOM_ID, "username": TEST_USERNAME}
+        requests.post(f"{BASE_URL}/api/clipboard/file", files=files, data=data, timeout=10).raise_for_status()
+        
+        known = requests.post(f"{BASE_URL}/api/clipboard/by-hash", json=body, timeout=5)
+        if known.status_code != 200 or not known.json().get("deduplicated"):
+            print_test("Upload By Hash", "FAIL", f"Known content gave HTTP {known.status_code}")
+            return False
+        
+        print_test("Upload By Hash", "PASS", "Second copy created without re-sending bytes")
+        return True
+    except requests.exceptions.RequestException as e:
+        print_test("Upload By Hash", "FAIL", f"Connection error: {e}")
+        return False
+
+def test_batch_upload():
+    """Test saving several items in one NDJSON request with per-item results"""
+    print_header("BATCH UPLOAD TEST")
+    
+    try:
+        lines = [json.dumps({"type": "text", "content": f"Batch item {i} {time.time()}"}) for i in range(3)]
+        lines.append(json.dumps({"type": "text"}))
+        response = requests.post(
+            f"{BASE_URL}/api/clipboard/batch",
+            params={"room_id": TEST_ROOM_ID, "username": TEST_USERNAME},
+            data="\n".join(lines),
+            headers={"Content-Type": "application/x-ndjson"},
+            timeout=10
+        )
+        if response.status_code != 200:
+            print_test("Batch Upload", "FAIL", f"HTTP {response.status_code}")
+            return False
+        
+        result = response.json()
+        statuses = [entry["status"] for entry in result.get("results", [])]
+        if result.get("saved") != 3 or statuses[-1] != "error":
+            print_test("Batch Upload", "FAIL", f"Unexpected results: {statuses}")
+            return False
+        
+        print_test("Batch Upload", "PASS", "3 items saved, invalid item reported on its own")
+        return True
+    except requests.exceptions.RequestException as e:
+        print_test("Batch Upload", "FAIL", f"Connection error: {e}")
+        return False
+
+def test_idempotent_retry():
+    """Test that a retried save with the same Idempotency-Key returns the original item"""
+    print_header("IDEMPOTENT RETRY TEST")
+    
+    try:
+        body = {"room_id": TEST_ROOM_ID, "username": TEST_USERNAME, "content": f"Retry me {time.time()}"}
+        headers = {"Idempotency-Key": f"test-device:{time.time()}"}
+        first = requests.post(f"{BASE_URL}/api/clipboard/text", json=body, headers=headers, timeout=5)
+        retry = requests.post(f"{BASE_URL}/api/clipboard/text", json=body, headers=headers, timeout=5)
+        if first.status_code != 200 or retry.status_code != 200:
+            print_test("Idempotent Retry", "FAIL", f"HTTP {first.status_code} / {retry.status_code}")
+            return False
+        
+        if retry.json().get("id") != first.json().get("id") or not retry.json().get("replayed"):
+            print_test("Idempotent Retry", "FAIL", "Retry stored a second item")
+            return False
+        
+        print_test("Idempotent Retry", "PASS", f"Retry answered with item {first.json()['id']}")
+        return True
+    except requests.exceptions.RequestException as e:
+        print_test("Idempotent Retry", "FAIL", f"Connection error: {e}")
+        return False
+
+def test_repeated_copy_collapse():
+    """Test that copying the same text again moves the existing item to the head"""
+    print_header("REPEATED COPY TEST")
+    
+    try:
+        body = {"room_id": TEST_ROOM_ID, "username": TEST_USERNAME, "content": f"Copied twice {time.time()}"}
+        first = requests.post(f"{BASE_URL}/api/clipboard/text", json=body, timeout=5).json()
+        requests.post(f"{BASE_URL}/api/clipboard/text", json={**body, "content": "Something in between"}, timeout=5)
+        repeat = requests.post(f"{BASE_URL}/api/clipboard/text", json=body, timeout=5).json()
+        
+        if repeat.get("id") != first.get("id") or repeat.get("copy_count") != 2:
+            print_test("Repeated Copy", "FAIL", f"Repeat stored a new item: {repeat}")
+            return False
+        
+        last = requests.get(f"{BASE_URL}/api/clipboard/last/{TEST_ROOM_ID}", timeout=5).json()
+        if last.get("item", {}).get("id") != first["id"]:
+            print_test("Repeated Copy", "FAIL", "Repeated item is not at the head of history")
+            return False
+        
+        print_test("Repeated Copy", "PASS", f"Item {first['id']} moved to seq {repeat['seq']} (copied 2x)")
+        return True
+    except requests.exceptions.RequestException as e:
+        print_test("Repeated Copy", "FAIL", f"Connection error: {e}")
+        return False
+
+def test_streamed_file_upload():
+    """Test that a multi-chunk file is zipped on the fly and downloads intact"""
+    print_header("STREAMED FILE UPLOAD TEST")
+    
+    try:
+        content = b"".join(f"line {i} of a compressible log file\n".encode() for i in range(150000))
+        before = requests.get(f"{BASE_URL}/api/metrics", timeout=5).json()["cpu_pool"]["tasks"]
+        files = {"file": ("streamed.log", content, "text/plain")}
+        data = {"room_id": TEST_ROOM_ID, "username": TEST_USERNAME}
+        response = requests.post(f"{BASE_URL}/api/clipboard/file", files=files, data=data, timeout=60)
+        if response.status_code != 200:
+            print_test("Streamed File Upload", "FAIL", f"HTTP {response.status_code}: {response.text}")
+            return False
+        
+        download = requests.get(f"{BASE_URL}/api/clipboard/download/{response.json()['id']}", timeout=60)
+        with zipfile.ZipFile(io.BytesIO(download.content)) as archive:
+            stored = archive.read("streamed.log")
+        if stored != content or len(download.content) >= len(content):
+            print_test("Streamed File Upload", "FAIL", "Zip entry differs from the upload or wasn't compressed")
+            return False
+        
+        after = requests.get(f"{BASE_URL}/api/metrics", timeout=5).json()["cpu_pool"]["tasks"]
+        deflated = after.get("deflate", {}).get("tasks", 0) - before.get("deflate", {}).get("tasks", 0)
+        if deflated < 2:
+            print_test("Streamed File Upload", "FAIL", f"Expected several deflate tasks on the CPU pool, got {deflated}")
+            return False
+        
+        print_test("Streamed File Upload", "PASS",
+                   f"{len(content)} bytes deflated to {len(download.content)} in {deflated} pool tasks")
+        return True
+    except requests.exceptions.RequestException as e:
+        print_test("Streamed File Upload", "FAIL", f"Connection error: {e}")
+        return False
+    except zipfile.BadZipFile as e:
+        print_test("Streamed File Upload", "FAIL", f"Download is not a zip: {e}")
+        return False
+
+def test_long_poll():
+    """Test that a parked long-poll wakes up on a new item and times out with 304"""
+    print_header("LONG POLL TEST")
+    
+    try:
+        head = requests.get(f"{BASE_URL}/api/clipboard/history/{TEST_ROOM_ID}", timeout=5).json()["latest_seq"]
+        idle = requests.get(f"{BASE_URL}/api/clipboard/wait/{TEST_ROOM_ID}",
+                            params={"after": head, "timeout": 1}, timeout=10)
+        if idle.status_code != 304:
+            print_test("Long Poll", "FAIL", f"Idle wait gave HTTP {idle.status_code}, expected 304")
+            return False
+
+        # A deleted newest item must not end the wait early
+        body = {"room_id": TEST_ROOM_ID, "username": TEST_USERNAME, "content": f"Deleted at once {time.time()}"}
+        deleted = requests.post(f"{BASE_URL}/api/clipboard/text", json=body, timeout=5).json()
+        requests.delete(f"{BASE_URL}/api/clipboard/item/{deleted['id']}", timeout=5).raise_for_status()
+        started = time.time()
+        idle = requests.get(f"{BASE_URL}/api/clipboard/wait/{TEST_ROOM_ID}",
+                            params={"after": head, "timeout": 1}, timeout=10)
+        if idle.status_code != 304 or time.time() - started < 0.9:
+            print_test("Long Poll", "FAIL", f"Wait past a deleted item gave HTTP {idle.status_code} "
+                       f"after {time.time() - started:.1f}s, expected 304 after the timeout")
+            return False
+
+        result = {}
+        def wait():
+            result["response"] = requests.get(f"{BASE_URL}/api/clipboard/wait/{TEST_ROOM_ID}",
+                                              params={"after": head, "timeout": 20}, timeout=30)
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        time.sleep(0.5)
+        content = f"Wake the poll {time.time()}"
+        body = {"room_id": TEST_ROOM_ID, "username": TEST_USERNAME, "content": content}
+        saved = requests.post(f"{BASE_URL}/api/clipboard/text", json=body, timeout=5).json()
+        waiter.join(30)
+        
+        response = result.get("response")
+        if response is None or response.status_code != 200:
+            print_test("Long Poll", "FAIL", f"Parked wait gave {response and response.status_code}")
+            return False
+        if saved["id"] not in [item["id"] for item in response.json()["items"]]:
+            print_test("Long Poll", "FAIL", f"New item missing from the wait result: {response.json()}")
+            return False
+        
+        print_test("Long Poll", "PASS", f"Woke up with item {saved['id']} (seq {saved['seq']})")
+        return True
+    except requests.exceptions.RequestException as e:
+        print_test("Long Poll", "FAIL", f"Connection error: {e}")
+        return False
+
+def test_event_stream():
+    """Test that the SSE stream sends hello, then item.created and item.deleted events"""
+    print_header("EVENT STREAM TEST")
+    
+    try:
+        stream = requests.get(f"{BASE_URL}/api/clipboard/stream/{TEST_ROOM_ID}", stream=True, timeout=10)
+        events = (json.loads(line[len("data: "):]) for line in stream.iter_lines(decode_unicode=True)
+                  if line.startswith("data: "))
+        hello = next(events)
+        if hello.get("event") != "hello":
+            print_test("Event Stream", "FAIL", f"First event was {hello}")
+            return False
+        
+        # The stream is subscribed once hello arrives, so these can't be missed
+        body = {"room_id": TEST_ROOM_ID, "username": TEST_USERNAME, "content": f"Streamed {time.time()}"}
+        saved = requests.post(f"{BASE_URL}/api/clipboard/text", json=body, timeout=5).json()
+        requests.delete(f"{BASE_URL}/api/clipboard/item/{saved['id']}", timeout=5).raise_for_status()
+        
+        seen = []
+        for event in events:
+            if event.get("event") in ("item.created", "item.deleted"):
+                seen.append((event["event"], event.get("id") or event.get("item", {}).get("id")))
+            if len(seen) == 2:
+                break
+        stream.close()
+        
+        if seen != [("item.created", saved["id"]), ("item.deleted", saved["id"])]:
+            print_test("Event Stream", "FAIL", f"Unexpected events: {seen}")
+            return False
+        
+        print_test("Event Stream", "PASS", f"Created and deleted events for item {saved['id']}")
+        return True
+    except requests.exceptions.RequestException as e:
+        print_test("Event Stream", "FAIL", f"Connection error: {e}")
+        return False
+
+def test_delta_sync_deletions():
+    """Test that /since reports new items and deleted ids past the client's cursors"""
+    print_header("DELTA SYNC TEST")
+    
+    try:
+        page = requests.get(f"{BASE_URL}/api/clipboard/history/{TEST_ROOM_ID}", timeout=5).json()
+        params = {"cursor": page["latest_seq"], "deleted_cursor": page["deleted_cursor"]}
+        since_url = f"{BASE_URL}/api/clipboard/since/{TEST_ROOM_ID}"
+        # latest_seq is the newest surviving item; catch up to the room's head first
+        first = requests.get(since_url, params=params, timeout=5)
+        if first.status_code == 200:
+            params = {"cursor": first.json()["head_seq"], "deleted_cursor": first.json()["deleted_cursor"]}
+        idle = requests.get(since_url, params=params, timeout=5)
+        if idle.status_code != 304:
+            print_test("Delta Sync", "FAIL", f"Unchanged room gave HTTP {idle.status_code}, expected 304")
+            return False
+        
+        body = {"room_id": TEST_ROOM_ID, "username": TEST_USERNAME, "content": f"Delta {time.time()}"}
+        kept = requests.post(f"{BASE_URL}/api/clipboard/text", json=body, timeout=5).json()
+        gone = requests.post(f"{BASE_URL}/api/clipboard/text", json={**body, "content": "Deleted again"}, timeout=5).json()
+        requests.delete(f"{BASE_URL}/api/clipboard/item/{gone['id']}", timeout=5).raise_for_status()
+        
+        delta = requests.get(since_url, params=params, timeout=5).json()
+        if kept["id"] not in [item["id"] for item in delta["items"]] or gone["id"] not in delta["deleted"]:
+            print_test("Delta Sync", "FAIL", f"Unexpected delta: {delta}")
+            return False
+        
+        caught_up = requests.get(since_url, params={"cursor": delta["head_seq"], "deleted_cursor": delta["deleted_cursor"]},
+                                 timeout=5)
+        if caught_up.status_code != 304:
+            print_test("Delta Sync", "FAIL", f"Caught-up client gave HTTP {caught_up.status_code}, expected 304")
+            return False
+        
+        print_test("Delta Sync", "PASS", f"{len(delta['items'])} new, {len(delta['deleted'])} deleted since the cursor")
+        return True
+    except requests.exceptions.RequestException as e:
+        print_test("Delta Sync", "FAIL", f"Connection error: {e}")
+        return False
+
+def test_hot_tail_and_counters():
+    """Test that the cached head of history and the room counters follow inserts and deletes"""
+    print_header("HOT TAIL / COUNTERS TEST")
+    
+    try:
+        info_url = f"{BASE_URL}/api/room/info/{TEST_ROOM_ID}"
+        last_url = f"{BASE_URL}/api/clipboard/last/{TEST_ROOM_ID}"
+        before = requests.get(info_url, timeout=5).json()
+        requests.get(last_url, timeout=5)
+        hits = requests.get(f"{BASE_URL}/api/metrics", timeout=5).json()["hot_tail"]["hits"]
+        
+        content = f"Cached {time.time()}"
+        body = {"room_id": TEST_ROOM_ID, "username": TEST_USERNAME, "content": content}
+        saved = requests.post(f"{BASE_URL}/api/clipboard/text", json=body, timeout=5).json()
+        last = requests.get(last_url, timeout=5).json()["item"]
+        during = requests.get(info_url, timeout=5).json()
+        if last["id"] != saved["id"] or last.get("content") != content:
+            print_test("Hot Tail / Counters", "FAIL", f"Last item is {last['id']}, expected {saved['id']}")
+            return False
+        if during["total_items"] != before["total_items"] + 1 or during["total_bytes"] <= before["total_bytes"]:
+            print_test("Hot Tail / Counters", "FAIL", f"Counters didn't grow: {before} -> {during}")
+            return False
+        
+        requests.delete(f"{BASE_URL}/api/clipboard/item/{saved['id']}", timeout=5).raise_for_status()
+        last = requests.get(last_url, timeout=5).json().get("item", {})
+        page = requests.get(f"{BASE_URL}/api/clipboard/history/{TEST_ROOM_ID}", timeout=5).json()
+        after = requests.get(info_url, timeout=5).json()
+        if last.get("id") == saved["id"] or saved["id"] in [item["id"] for item in page["items"]]:
+            print_test("Hot Tail / Counters", "FAIL", "Deleted item is still served")
+            return False
+        if after["total_items"] != before["total_items"] or after["total_bytes"] != before["total_bytes"]:
+            print_test("Hot Tail / Counters", "FAIL", f"Counters didn't return: {before} -> {after}")
+            return False
+        
+        metrics = requests.get(f"{BASE_URL}/api/metrics", timeout=5).json()["hot_tail"]
+        if metrics["hits"] <= hits:
+            print_test("Hot Tail / Counters", "FAIL", f"No hot tail hits recorded: {metrics}")
+            return False
+        
+        print_test("Hot Tail / Counters", "PASS", f"{metrics['hits'] - hits} cache hits, counters back at {after['total_items']}")
+        return True
+    except requests.exceptions.RequestException as e:
+        print_test("Hot Tail / Counters", "FAIL", f"Connection error: {e}")
+        return False
+
+def test_concurrent_saves():
+    """Test that a burst of saves is group-committed with distinct, gap-free seqs"""
+    print_header("CONCURRENT SAVES TEST")
+    
+    try:
+        count = 20
+        before = requests.get(f"{BASE_URL}/api/metrics", timeout=5).json()["write_batcher"]
+        stamp = time.time()
+        
+        def save(i):
+            body = {"room_id": TEST_ROOM_ID, "username": TEST_USERNAME, "content": f"Burst {i} {stamp}"}
+            return requests.post(f"{BASE_URL}/api/clipboard/text", json=body, timeout=10)
+        with ThreadPoolExecutor(max_workers=count) as pool:
+            responses = list(pool.map(save, range(count)))
+        
+        if any(response.status_code != 200 for response in responses):
+            print_test("Concurrent Saves", "FAIL", f"Statuses: {[response.status_code for response in responses]}")
+            return False
+        seqs = sorted(response.json()["seq"] for response in responses)
+        if seqs != list(range(seqs[0], seqs[0] + count)):
+            print_test("Concurrent Saves", "FAIL", f"Seqs not distinct and contiguous: {seqs}")
+            return False
+        
+        after = requests.get(f"{BASE_URL}/api/metrics", timeout=5).json()["write_batcher"]
+        documents = after["documents"] - before["documents"]
+        batches = after["batches"] - before["batches"]
+        if documents < count:
+            print_test("Concurrent Saves", "FAIL", f"Batcher committed {documents} documents, expected {count}")
+            return False
+        
+        print_test("Concurrent Saves", "PASS", f"Seqs {seqs[0]}-{seqs[-1]} in {batches} batches")
+        return True
+    except requests.exceptions.RequestException as e:
+        print_test("Concurrent Saves", "FAIL", f"Connection error: {e}")
+        return False
+
 def run_all_tests():
     """Run all tests and provide summary"""
     print_header("CLOUDCLIPBOARD API TEST SUITE")
@@ -414,6 +896,19 @@ def run_all_tests():
         ("Get History", test_get_clipboard_history),
         ("Get Last Item", test_get_last_clipboard_item),
         ("File Upload", test_file_upload),
+        ("Download Range", test_download_range_and_etag),
+        ("Session Token", test_session_token),
+        ("Chunked Upload", test_chunked_upload),
+        ("Upload By Hash", test_upload_by_hash),
+        ("Batch Upload", test_batch_upload),
+        ("Idempotent Retry", test_idempotent_retry),
+        ("Repeated Copy", test_repeated_copy_collapse),
+        ("Streamed File Upload", test_streamed_file_upload),
+        ("Long Poll", test_long_poll),
+        ("Event Stream", test_event_stream),
+        ("Delta Sync", test_delta_sync_deletions),
+        ("Hot Tail / Counters", test_hot_tail_and_counters),
+        ("Concurrent Saves", test_concurrent_saves),
     ]
     
     passed = 0
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+CloudClipboard Component Test
+=============================
+
+Exercises the in-process building blocks behind the API without a server
+or database: the room event hub and its backplanes, the hot tail cache,
+the CPU pool and the insert batcher. Everything runs on fakes or on local
+sockets, so these checks are deterministic where test_api.py can only
+observe the effects through HTTP.
+
+Usage:
+    python test_components.py
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+import cpu_pool as cpu_pool_module
+from backplane import InMemoryBackplane, UnixSocketBackplane
+from cpu_pool import CpuPool, CpuPoolBusy
+from events import ALL_ROOMS, RoomHub, item_created_event, item_deleted_event, room_cleared_event
+from hot_tail import ROOM_OVERHEAD, HotTail, RoomTail
+from write_batcher import InsertBatcher
+from test_api import Colors, print_header, print_test, print_info
+
+
+def item(room_id: str, seq: int, **fields) -> dict:
+    """A full cached item as the upload handlers write it through"""
+    return {"id": f"{room_id}-{seq}", "room_id": room_id, "seq": seq, "type": "text",
+            "content": f"item {seq}", "metadata": {}, **fields}
+
+
+def created(room_id: str, seq: int, **fields) -> dict:
+    return item_created_event(item(room_id, seq, **fields))
+
+
+async def test_hub_fan_out() -> bool:
+    hub = RoomHub(InMemoryBackplane())
+    await hub.start()
+    first, second, other = hub.subscribe("a"), hub.subscribe("a"), hub.subscribe("b")
+    await hub.publish("a", created("a", 1))
+    if first.qsize() != 1 or second.qsize() != 1 or other.qsize() != 0:
+        print_test("Hub Fan-out", "FAIL", f"Queue sizes {first.qsize()}/{second.qsize()}/{other.qsize()}")
+        return False
+
+    await hub.publish_all(room_cleared_event)
+    events = [first.get_nowait(), first.get_nowait(), other.get_nowait()]
+    if [event["event"] for event in events] != ["item.created", "room.cleared", "room.cleared"] \
+            or events[2]["room_id"] != "b":
+        print_test("Hub Fan-out", "FAIL", f"Unexpected events: {events}")
+        return False
+
+    hub.unsubscribe("a", first)
+    hub.unsubscribe("a", second)
+    hub.unsubscribe("b", other)
+    await hub.stop()
+    if hub.subscriber_count():
+        print_test("Hub Fan-out", "FAIL", f"{hub.subscriber_count()} subscribers left after unsubscribe")
+        return False
+    print_test("Hub Fan-out", "PASS", "Room events reach their room, clears reach every room")
+    return True
+
+
+async def test_hub_resync() -> bool:
+    hub = RoomHub(InMemoryBackplane(), queue_size=2)
+    await hub.start()
+    queue = hub.subscribe("a")
+    for seq in range(1, 4):
+        await hub.publish("a", created("a", seq))
+    events = [queue.get_nowait() for _ in range(queue.qsize())]
+    await hub.stop()
+    if events != [{"event": "resync", "room_id": "a"}]:
+        print_test("Hub Resync", "FAIL", f"Slow subscriber got {events}")
+        return False
+    print_test("Hub Resync", "PASS", "Full queue replaced by a resync request")
+    return True
+
+
+async def test_hub_wait_for_seq() -> bool:
+    hub = RoomHub(InMemoryBackplane())
+    await hub.start()
+    if await hub.wait_for_seq("a", 0, 0.1):
+        print_test("Hub Wait", "FAIL", "Idle wait returned True")
+        return False
+
+    waiter = asyncio.ensure_future(hub.wait_for_seq("a", 1, 5))
+    await asyncio.sleep(0.05)
+    # Neither a deletion nor an old seq moves the head past the cursor
+    await hub.publish("a", item_deleted_event("a", "a-1", 1))
+    await hub.publish("a", created("a", 1))
+    await asyncio.sleep(0.05)
+    if waiter.done():
+        print_test("Hub Wait", "FAIL", "Waiter woke up before a newer item")
+        return False
+    await hub.publish("a", created("a", 2))
+    woke = await asyncio.wait_for(waiter, 1)
+    await hub.stop()
+    if not woke:
+        print_test("Hub Wait", "FAIL", "Waiter timed out after seq 2 was published")
+        return False
+    print_test("Hub Wait", "PASS", "Long-poll waiter woke up on the next seq only")
+    return True
+
+
+async def test_unix_socket_backplane() -> bool:
+    socket_path = os.path.join(tempfile.mkdtemp(), "events.sock")
+    hubs = [RoomHub(UnixSocketBackplane(socket_path)) for _ in range(2)]
+    for hub in hubs:
+        await hub.start()
+    try:
+        deadline = time.monotonic() + 5
+        while any(hub.backplane._writer is None for hub in hubs):
+            if time.monotonic() > deadline:
+                print_test("Unix Socket Backplane", "FAIL", "Workers did not connect to the broker")
+                return False
+            await asyncio.sleep(0.05)
+
+        queues = [hub.subscribe("a") for hub in hubs]
+        await hubs[1].publish("a", created("a", 1))
+        events = [await asyncio.wait_for(queue.get(), 2) for queue in queues]
+        if any(event.get("seq") != 1 for event in events):
+            print_test("Unix Socket Backplane", "FAIL", f"Unexpected events: {events}")
+            return False
+        hosts = sum(hub.backplane._server is not None for hub in hubs)
+        if hosts != 1:
+            print_test("Unix Socket Backplane", "FAIL", f"{hosts} workers host the broker")
+            return False
+    except asyncio.TimeoutError:
+        print_test("Unix Socket Backplane", "FAIL", "Event not delivered to every worker")
+        return False
+    finally:
+        for hub in hubs:
+            await hub.stop()
+    print_test("Unix Socket Backplane", "PASS", "One broker, event delivered to both workers")
+    return True
+
+
+def warm_tail(tail: HotTail, room_id: str, items: list, complete: bool = True):
+    """Seed a room as if it had been loaded from the database"""
+    room = RoomTail(items, complete)
+    tail._rooms[room_id] = room
+    tail.size += room.size
+
+
+async def test_hot_tail_events() -> bool:
+    tail = HotTail(per_room=3)
+    warm_tail(tail, "a", [])
+    for seq in range(1, 5):
+        tail.add(item("a", seq))
+    page = await tail.first_page("a", 3)
+    if [entry["seq"] for entry in page] != [4, 3, 2] or await tail.first_page("a", 4) is not None:
+        print_test("Hot Tail Events", "FAIL", f"Unexpected page after inserts: {page}")
+        return False
+
+    # The hub echoes write-through inserts and deletes back; each is applied once
+    tail.apply_event("a", created("a", 4))
+    tail.remove("a", "a-4")
+    tail.apply_event("a", item_deleted_event("a", "a-4", 4))
+    last = await tail.last("a")
+    if last is None or last["seq"] != 3 or len(tail._rooms["a"].items) != 2:
+        print_test("Hot Tail Events", "FAIL", f"Unexpected tail after delete: {tail._rooms['a'].items}")
+        return False
+
+    tail.apply_event("a", created("a", 5, id="a-2", copy_count=2))
+    page = await tail.first_page("a", 2)
+    if [(entry["id"], entry["seq"]) for entry in page] != [("a-2", 5), ("a-3", 3)] or "content" in page[0]:
+        print_test("Hot Tail Events", "FAIL", f"Repeated copy not moved to the head: {page}")
+        return False
+
+    warm_tail(tail, "b", [item("b", 1)])
+    tail.apply_event("b", {"event": "resync", "room_id": "b"})
+    if list(tail._rooms) != ["a"]:
+        print_test("Hot Tail Events", "FAIL", f"Resync of one room left {list(tail._rooms)}")
+        return False
+
+    tail.apply_event(ALL_ROOMS, room_cleared_event(ALL_ROOMS))
+    if tail.stats()["rooms"] or tail.size:
+        print_test("Hot Tail Events", "FAIL", f"Clear left {tail.stats()}")
+        return False
+    print_test("Hot Tail Events", "PASS", f"Inserts, deletes, repeats, resyncs and clears applied ({tail.stats()['hits']} hits)")
+    return True
+
+
+async def test_hot_tail_eviction() -> bool:
+    tail = HotTail(budget=ROOM_OVERHEAD * 3)
+    warm_tail(tail, "a", [])
+    warm_tail(tail, "b", [])
+    await tail.first_page("a", 1)  # "b" is now least recently used
+    tail.add(item("a", 1))
+    if list(tail._rooms) != ["a"]:
+        print_test("Hot Tail Eviction", "FAIL", f"Rooms {list(tail._rooms)}, {tail.size} bytes")
+        return False
+
+    expected = sum(room.size for room in tail._rooms.values())
+    if tail.size != expected:
+        print_test("Hot Tail Eviction", "FAIL", f"Byte count {tail.size}, rooms hold {expected}")
+        return False
+    print_test("Hot Tail Eviction", "PASS", f"Least recently used room evicted, {tail.size} bytes kept")
+    return True
+
+
+async def test_cpu_pool() -> bool:
+    pool = CpuPool("thread", workers=1, queue_size=1)
+    timeout = cpu_pool_module.CPU_QUEUE_TIMEOUT
+    try:
+        if await pool.run("power", pow, 3, 2) != 9:
+            print_test("CPU Pool", "FAIL", "Wrong result")
+            return False
+
+        cpu_pool_module.CPU_QUEUE_TIMEOUT = 0.2
+        blocker = asyncio.ensure_future(pool.run("sleep", time.sleep, 0.5))
+        await asyncio.sleep(0.05)
+        try:
+            await pool.run("power", pow, 2, 2)
+            print_test("CPU Pool", "FAIL", "Saturated pool accepted another task")
+            return False
+        except CpuPoolBusy:
+            pass
+        await blocker
+    finally:
+        cpu_pool_module.CPU_QUEUE_TIMEOUT = timeout
+        pool.shutdown()
+
+    stats = pool.stats()
+    if stats["tasks"]["power"]["tasks"] != 1 or stats["tasks"]["sleep"]["run_seconds"] < 0.4 or stats["pending"]:
+        print_test("CPU Pool", "FAIL", f"Unexpected metrics: {stats}")
+        return False
+    print_test("CPU Pool", "PASS", "Result returned, saturation rejected, run time measured")
+    return True
+
+
+class FakeCollection:
+    """Records insert_many calls; documents with "fail" set come back as duplicate key errors"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def insert_many(self, docs, ordered=True):
+        self.calls.append(list(docs))
+        errors = [{"index": index, "code": 11000, "errmsg": "duplicate key"}
+                  for index, doc in enumerate(docs) if doc.get("fail")]
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+async def test_insert_batcher() -> bool:
+    collection = FakeCollection()
+    committed = []
+
+    async def on_commit(docs):
+        committed.extend(docs)
+
+    batcher = InsertBatcher(collection, max_batch=3, max_delay=0.05, on_commit=on_commit)
+    results = await asyncio.gather(*(batcher.insert({"n": n}) for n in range(2)), return_exceptions=True)
+    if len(collection.calls) != 1 or len(collection.calls[0]) != 2 or any(results):
+        print_test("Insert Batcher", "FAIL", f"Two inserts gave calls {collection.calls}, results {results}")
+        return False
+
+    started = time.monotonic()
+    docs = [{"n": 2}, {"n": 3, "fail": True}, {"n": 4}]
+    results = await asyncio.gather(*(batcher.insert(doc) for doc in docs), return_exceptions=True)
+    if time.monotonic() - started >= 0.05:
+        print_test("Insert Batcher", "FAIL", "Full batch waited for the delay")
+        return False
+    if results[0] is not None or not isinstance(results[1], DuplicateKeyError) or results[2] is not None:
+        print_test("Insert Batcher", "FAIL", f"Per-document results {results}")
+        return False
+
+    stats = batcher.stats()
+    if [doc["n"] for doc in committed] != [0, 1, 2, 4] or stats["batches"] != 2 or stats["documents"] != 4:
+        print_test("Insert Batcher", "FAIL", f"Committed {committed}, stats {stats}")
+        return False
+    print_test("Insert Batcher", "PASS", "Inserts coalesced, failed document reported to its caller only")
+    return True
+
+
+TESTS = [
+    ("Hub Fan-out", test_hub_fan_out),
+    ("Hub Resync", test_hub_resync),
+    ("Hub Wait", test_hub_wait_for_seq),
+    ("Unix Socket Backplane", test_unix_socket_backplane),
+    ("Hot Tail Events", test_hot_tail_events),
+    ("Hot Tail Eviction", test_hot_tail_eviction),
+    ("CPU Pool", test_cpu_pool),
+    ("Insert Batcher", test_insert_batcher),
+]
+
+
+async def run_all_tests_async() -> bool:
+    print_header("CLOUDCLIPBOARD COMPONENT TEST")
+    print_info(f"Running {len(TESTS)} component checks")
+
+    passed = 0
+    for name, test in TESTS:
+        try:
+            if await test():
+                passed += 1
+        except Exception as e:
+            print_test(name, "ERROR", f"Test crashed: {e}")
+
+    print_header("TEST SUMMARY")
+    print(f"{Colors.BOLD}Total Tests: {len(TESTS)}{Colors.END}")
+    print(f"{Colors.GREEN}Passed: {passed}{Colors.END}")
+    print(f"{Colors.RED}Failed: {len(TESTS) - passed}{Colors.END}")
+    return passed == len(TESTS)
+
+
+def run_all_tests() -> bool:
+    return asyncio.run(run_all_tests_async())
+
+
+if __name__ == "__main__":
+    success = run_all_tests()
+    exit(0 if success else 1)
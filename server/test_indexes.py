@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+CloudClipboard Index Usage Test
+===============================
+
+Runs explain() on every query the API routes issue, against a scratch
+database seeded with a few rooms of history. A query fails when its plan
+contains a COLLSCAN or when it examines more than MAX_EXAMINED_RATIO times
+the documents it returns. Add an entry to QUERIES whenever a route gains a
+new query.
+
+Usage:
+    python test_indexes.py
+
+Needs a scratch MongoDB server, given explicitly in MONGODB_URL (the test
+refuses to fall back to the server's default database). Uses the database
+cloudclipboard_index_test and drops it afterwards.
+
+Full passes by design are not listed: counter reconciliation, the startup
+sequence backfill and clearing all data.
+"""
+
+import asyncio
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+if not os.getenv("MONGODB_URL"):
+    print("❌ Set MONGODB_URL to a scratch MongoDB server to run the index test")
+    sys.exit(2)
+
+# Must be set before database.py is imported; never point this at real data
+os.environ["DATABASE_NAME"] = "cloudclipboard_index_test"
+
+from database import (
+    client, db, init_db, DATABASE_NAME,
+    rooms_collection, clipboard_collection, users_collection,
+    blob_refs_collection, counters_collection, upload_sessions_collection,
+    idempotency_keys_collection
+)
+from items import history_query, hash_query, repeat_query, repeat_bump
+from test_api import Colors, print_header, print_test, print_info
+
+ROOMS = 4
+ITEMS_PER_ROOM = 250
+USERS_PER_ROOM = 5
+MAX_EXAMINED_RATIO = 2
+REPEAT_WINDOW = 50
+
+ROOM = "room_1"
+NOW = datetime.utcnow()
+
+
+def find(collection, filter, sort=None, limit=None, projection=None):
+    command = {"find": collection.name, "filter": filter}
+    if sort:
+        command["sort"] = sort
+    if limit:
+        command["limit"] = limit
+    if projection:
+        command["projection"] = projection
+    return command
+
+
+def update(collection, filter, change, upsert=False):
+    return {"update": collection.name, "updates": [{"q": filter, "u": change, "upsert": upsert}]}
+
+
+def find_and_modify(collection, filter, change=None, sort=None):
+    command = {"findAndModify": collection.name, "query": filter}
+    if change is None:
+        command["remove"] = True
+    else:
+        command["update"] = change
+    if sort:
+        command["sort"] = sort
+    return command
+
+
+def aggregate(collection, pipeline):
+    return {"aggregate": collection.name, "pipeline": pipeline, "cursor": {}}
+
+
+def item_id(room: int, seq: int) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"room_{room}/{seq}"))
+
+
+def content_hash(room: int, seq: int) -> str:
+    return uuid.uuid5(uuid.NAMESPACE_DNS, f"room_{room}/{seq}").hex * 2
+
+
+SOME_ITEM = item_id(1, ITEMS_PER_ROOM // 2)
+SOME_FILE_SEQ = 3  # seq % 3 == 0 is a file, see seed()
+SOME_TEXT_SEQ = 1  # seq % 3 == 1 is a text
+SOME_USER = f"user_1_{SOME_FILE_SEQ % USERS_PER_ROOM}"
+REPEAT_AFTER = ITEMS_PER_ROOM - REPEAT_WINDOW
+
+# Filters come from the builders the routes use, so the two can't drift apart
+# (name, command, documents the query has to read when they are not all returned)
+QUERIES = [
+    ("get item by id", find(clipboard_collection, {"id": SOME_ITEM}, limit=1), None),
+    ("thumbnail lookup", find(clipboard_collection, {"id": SOME_ITEM, "type": "image"}, limit=1), None),
+    ("thumbnail store", update(
+        clipboard_collection, {"id": SOME_ITEM, "thumbnail": {"$exists": False}}, {"$set": {"thumbnail": {}}}
+    ), None),
+    ("delete item", find_and_modify(clipboard_collection, {"id": SOME_ITEM}), None),
+    ("history first page / hot tail", find(clipboard_collection, history_query(ROOM), sort={"seq": -1}, limit=100), None),
+    ("history before_seq", find(
+        clipboard_collection, history_query(ROOM, before_seq=ITEMS_PER_ROOM // 2), sort={"seq": -1}, limit=50
+    ), None),
+    ("history after_seq / since", find(
+        clipboard_collection, history_query(ROOM, after_seq=ITEMS_PER_ROOM - 20), sort={"seq": 1}, limit=100
+    ), None),
+    ("last item", find(clipboard_collection, history_query(ROOM), sort={"seq": -1}, limit=1), None),
+    ("image by hash", find(
+        clipboard_collection, hash_query(ROOM, content_hash(1, SOME_FILE_SEQ + 2), "image"), sort={"seq": -1}, limit=1
+    ), None),
+    ("file by hash", find(
+        clipboard_collection, hash_query(ROOM, content_hash(1, SOME_FILE_SEQ), "file", f"file_{SOME_FILE_SEQ}.txt"),
+        sort={"seq": -1}, limit=1
+    ), None),
+    ("recent repeat of a file", find(clipboard_collection, repeat_query(
+        ROOM, SOME_USER, "file", content_hash(1, SOME_FILE_SEQ), REPEAT_AFTER, f"file_{SOME_FILE_SEQ}.txt"
+    ), sort={"seq": -1}, limit=1, projection={"_id": 0, "id": 1}), None),
+    ("recent repeat of a text or image (also batch entries)", find(clipboard_collection, repeat_query(
+        ROOM, SOME_USER, "text", content_hash(1, SOME_TEXT_SEQ), REPEAT_AFTER
+    ), sort={"seq": -1}, limit=1, projection={"_id": 0, "id": 1}), None),
+    ("repeat to head", find_and_modify(
+        clipboard_collection, {"id": SOME_ITEM}, [{"$set": {**repeat_bump(NOW), "seq": ITEMS_PER_ROOM + 1}}]
+    ), None),
+    ("all items of a room", find(clipboard_collection, {"room_id": ROOM}, sort={"timestamp": -1}, limit=100), None),
+    ("all items", find(clipboard_collection, {}, sort={"timestamp": -1}, limit=100), None),
+    ("member activity", aggregate(clipboard_collection, [
+        {"$match": {"room_id": ROOM}},
+        {"$group": {"_id": "$username", "items_count": {"$sum": 1}}}
+    ]), {"room_id": ROOM}),
+    ("room lookup", find(rooms_collection, {"room_id": ROOM}, limit=1), None),
+    ("room heads", find(rooms_collection, {"room_id": {"$in": [ROOM]}}, projection={"room_id": 1, "seq": 1}), None),
+    ("exact room head", find(
+        clipboard_collection, {"room_id": ROOM, "seq": {"$exists": True}}, sort={"seq": -1}, limit=1
+    ), None),
+    ("advance room head", update(rooms_collection, {"room_id": ROOM}, {"$max": {"seq": ITEMS_PER_ROOM}}), None),
+    ("room members", find(users_collection, {"room_id": ROOM}, projection={"_id": 0, "username": 1}), None),
+    ("join upsert user", update(
+        users_collection, {"username": SOME_USER}, {"$set": {"room_id": ROOM}}, upsert=True
+    ), None),
+    ("blob retain", update(
+        blob_refs_collection, {"_id": content_hash(1, SOME_FILE_SEQ), "refs": {"$gt": 0}}, {"$inc": {"refs": 1}}
+    ), None),
+    ("room counters", find(counters_collection, {"_id": f"room:{ROOM}"}, limit=1), None),
+    ("upload session", find(upload_sessions_collection, {"_id": "session_1"}, limit=1), None),
+    ("expired upload sessions", find(upload_sessions_collection, {"expires_at": {"$lt": NOW}}), None),
+    ("idempotency key", find(idempotency_keys_collection, {"_id": f"{ROOM}:device:hash:1"}, limit=1), None),
+]
+
+
+async def seed():
+    """A few rooms with mixed history, their members, counters, blobs and upload sessions"""
+    await client.drop_database(DATABASE_NAME)
+    items, users, rooms = [], [], []
+    for room in range(ROOMS):
+        room_id = f"room_{room}"
+        rooms.append({"room_id": room_id, "password": "x", "seq": ITEMS_PER_ROOM,
+                      "members": [f"user_{room}_{n}" for n in range(USERS_PER_ROOM)]})
+        users.extend({"username": f"user_{room}_{n}", "room_id": room_id} for n in range(USERS_PER_ROOM))
+        for seq in range(1, ITEMS_PER_ROOM + 1):
+            item_type = ("file", "text", "image")[seq % 3]
+            item = {
+                "id": item_id(room, seq),
+                "seq": seq,
+                "room_id": room_id,
+                "username": f"user_{room}_{seq % USERS_PER_ROOM}",
+                "type": item_type,
+                "timestamp": NOW - timedelta(minutes=ROOMS * ITEMS_PER_ROOM - seq * ROOMS - room),
+                "content_sha256": content_hash(room, seq),
+                "metadata": {}
+            }
+            if item_type == "text":
+                item["content"] = f"text {seq}"
+            else:
+                item["metadata"] = {"original_filename": f"file_{seq}.txt", "storage": "deflate"}
+            items.append(item)
+    await rooms_collection.insert_many(rooms)
+    await users_collection.insert_many(users)
+    await clipboard_collection.insert_many(items)
+    await blob_refs_collection.insert_many([{"_id": item["content_sha256"], "refs": 1} for item in items if item["type"] != "text"])
+    await counters_collection.insert_many([{"_id": f"room:{room['room_id']}", "items": ITEMS_PER_ROOM} for room in rooms])
+    await upload_sessions_collection.insert_many([
+        {"_id": f"session_{n}", "expires_at": NOW + timedelta(hours=1 if n % 5 else -1)} for n in range(20)
+    ])
+    await init_db()
+
+
+def plan_stages(explain) -> list:
+    """Every stage name in the winning plan(s) of an explain document"""
+    stages = []
+
+    def walk(node, in_plan):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key == "stage" and in_plan and isinstance(value, str):
+                    stages.append(value)
+                elif key == "rejectedPlans":
+                    continue
+                else:
+                    walk(value, in_plan or key == "winningPlan")
+        elif isinstance(node, list):
+            for value in node:
+                walk(value, in_plan)
+
+    walk(explain, False)
+    return stages
+
+
+def execution_stats(explain) -> dict:
+    """The first executionStats block of an explain document (aggregations nest it per stage)"""
+    if isinstance(explain, dict):
+        if "totalDocsExamined" in explain:
+            return explain
+        values = explain.values()
+    elif isinstance(explain, list):
+        values = explain
+    else:
+        return None
+    for value in values:
+        stats = execution_stats(value)
+        if stats:
+            return stats
+    return None
+
+
+def check_plan(name: str, explain: dict, reads: int = None) -> bool:
+    stages = plan_stages(explain)
+    stats = execution_stats(explain) or {}
+    examined = stats.get("totalDocsExamined", 0)
+    returned = max(stats.get("nReturned", 0), reads or 0, 1)
+
+    if not stages:
+        print_test(name, "FAIL", "No winning plan in explain output")
+        return False
+    if "COLLSCAN" in stages:
+        print_test(name, "FAIL", f"Collection scan: {' <- '.join(stages)}")
+        return False
+    if examined > returned * MAX_EXAMINED_RATIO:
+        print_test(name, "FAIL", f"Examined {examined} documents to return {returned}")
+        return False
+    print_test(name, "PASS", f"{' <- '.join(stages)}, examined {examined} for {returned}")
+    return True
+
+
+async def run_all_tests_async() -> bool:
+    print_header("CLOUDCLIPBOARD INDEX USAGE TEST")
+    print_info(f"Database: {DATABASE_NAME}")
+    await seed()
+    print_info(f"Seeded {ROOMS} rooms x {ITEMS_PER_ROOM} items")
+
+    passed = 0
+    try:
+        for name, command, reads_filter in QUERIES:
+            try:
+                explain = await db.command({"explain": command, "verbosity": "executionStats"})
+                reads = await clipboard_collection.count_documents(reads_filter) if reads_filter else None
+                if check_plan(name, explain, reads):
+                    passed += 1
+            except Exception as e:
+                print_test(name, "ERROR", f"Explain failed: {e}")
+    finally:
+        await client.drop_database(DATABASE_NAME)
+
+    print_header("TEST SUMMARY")
+    print(f"{Colors.BOLD}Total Queries: {len(QUERIES)}{Colors.END}")
+    print(f"{Colors.GREEN}Passed: {passed}{Colors.END}")
+    print(f"{Colors.RED}Failed: {len(QUERIES) - passed}{Colors.END}")
+    return passed == len(QUERIES)
+
+
+def run_all_tests() -> bool:
+    return asyncio.run(run_all_tests_async())
+
+
+if __name__ == "__main__":
+    success = run_all_tests()
+    exit(0 if success else 1)
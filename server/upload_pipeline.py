@@ -0,0 +1,204 @@
+"""
+Bounded-memory upload pipeline.
+
+Request bodies are consumed in fixed-size chunks and pushed through hashing,
+optional zip compression and the blob store, so peak memory per upload stays
+around UPLOAD_CHUNK_SIZE regardless of the file size. Deflating and hashing
+each chunk runs on the CPU pool so other requests keep being served.
+"""
+import hashlib
+import logging
+import math
+import zipfile
+from collections import Counter
+from datetime import datetime
+
+from fastapi import HTTPException, UploadFile
+
+from blob_store import blob_store
+from cpu_pool import cpu_pool
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+# Slack for multipart boundaries and form fields on top of the payload limit
+MULTIPART_OVERHEAD = 64 * 1024
+# Payloads up to this size can live in the clipboard document as BSON Binary
+INLINE_PAYLOAD_LIMIT = 64 * 1024
+
+
+# Bits per byte above which a sample is treated as already compressed
+ENTROPY_THRESHOLD = 7.5
+ENTROPY_SAMPLE_SIZE = 64 * 1024
+
+# Leading bytes of formats that are already compressed
+COMPRESSED_SIGNATURES = [
+    (b"PK\x03\x04", "zip"),
+    (b"PK\x05\x06", "zip"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF8", "gif"),
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bzip2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+    (b"7z\xbc\xaf\x27\x1c", "7z"),
+    (b"Rar!\x1a\x07", "rar"),
+    (b"ID3", "mp3"),
+    (b"OggS", "ogg"),
+    (b"fLaC", "flac"),
+    (b"\x1a\x45\xdf\xa3", "matroska"),
+]
+
+# How a file upload was stored (recorded as metadata["storage"])
+STORAGE_DEFLATE = "deflate"  # zip entry compressed with DEFLATE
+STORAGE_STORED = "stored"    # zip entry kept uncompressed
+STORAGE_ARCHIVE = "archive"  # the upload already was the zip, kept as-is
+
+
+def detect_format(head: bytes) -> str:
+    """Name of the compressed format the payload starts with, or None"""
+    for signature, name in COMPRESSED_SIGNATURES:
+        if head.startswith(signature):
+            return name
+    if head[4:8] == b"ftyp":
+        return "mp4"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def byte_entropy(sample: bytes) -> float:
+    """Shannon entropy of the sample in bits per byte (8.0 = random)"""
+    if not sample:
+        return 0.0
+    total = len(sample)
+    return -sum(count / total * math.log2(count / total) for count in Counter(sample).values())
+
+
+def choose_storage(head: bytes, filename: str) -> tuple:
+    """Pick (storage, detected format) for a file upload from its first chunk"""
+    detected = detect_format(head)
+    if detected == "zip" and filename.lower().endswith(".zip"):
+        # e.g. a folder the client zipped: wrapping it again would only add a layer
+        return STORAGE_ARCHIVE, detected
+    if detected:
+        return STORAGE_STORED, detected
+    if byte_entropy(head[:ENTROPY_SAMPLE_SIZE]) > ENTROPY_THRESHOLD:
+        return STORAGE_STORED, "high-entropy"
+    return STORAGE_DEFLATE, None
+
+
+class UploadTooLarge(Exception):
+    """Raised as soon as an upload exceeds its size limit"""
+
+
+async def store_upload(file: UploadFile, max_size: int, archive_name: str = None, allow_inline: bool = False) -> dict:
+    """Stream an UploadFile into the blob store
+
+    When archive_name is given the payload goes into a single-entry zip on
+    the fly. The first chunk decides how: zip uploads named .zip are kept
+    as-is, already-compressed or high-entropy data is stored uncompressed,
+    everything else is deflated. Returns the blob reference, the original
+    payload size, its SHA-256 (of the bytes as uploaded, before any zip
+    wrapping) and the storage choice.
+
+    With allow_inline, a payload of at most INLINE_PAYLOAD_LIMIT bytes skips
+    the blob store and is returned as {"inline": {"sha256", "size", "data"}}.
+    """
+    head = await file.read(UPLOAD_CHUNK_SIZE)
+    if allow_inline and not archive_name and len(head) <= min(INLINE_PAYLOAD_LIMIT, max_size) \
+            and len(head) < UPLOAD_CHUNK_SIZE:
+        # A short read means the whole payload is already in hand
+        inline = {"sha256": hashlib.sha256(head).hexdigest(), "size": len(head), "data": head}
+        return {"blob": None, "inline": inline, "original_size": len(head), "sha256": inline["sha256"],
+                "storage": None, "detected": None}
+
+    writer = blob_store.open_writer()
+    storage, detected = None, None
+    content_hash = None
+    try:
+        if archive_name:
+            storage, detected = await cpu_pool.run("sniff", choose_storage, head, file.filename or "")
+        if storage in (STORAGE_DEFLATE, STORAGE_STORED):
+            # The blob hashes the zip; dedupe lookups need the hash of the content itself
+            content_hash = hashlib.sha256()
+            zip_info = zipfile.ZipInfo(archive_name, date_time=datetime.now().timetuple()[:6])
+            zip_info.compress_type = zipfile.ZIP_DEFLATED if storage == STORAGE_DEFLATE else zipfile.ZIP_STORED
+            with zipfile.ZipFile(writer, "w") as zip_file:
+                with zip_file.open(zip_info, "w") as entry:
+                    original_size = await _pump(file, head, entry, max_size, storage, content_hash)
+        else:
+            original_size = await _pump(file, head, writer, max_size, "hash")
+        blob = await blob_store.put_writer(writer)
+    except BaseException:
+        writer.discard()
+        raise
+    sha256 = content_hash.hexdigest() if content_hash else blob["sha256"]
+    return {"blob": blob, "inline": None, "original_size": original_size, "sha256": sha256,
+            "storage": storage, "detected": detected}
+
+
+def _feed(sink, content_hash, chunk: bytes):
+    if content_hash is not None:
+        content_hash.update(chunk)
+    sink.write(chunk)
+
+
+async def _pump(file: UploadFile, head: bytes, sink, max_size: int, task: str, content_hash=None) -> int:
+    """Copy head and the rest of the upload into sink chunk by chunk, enforcing max_size as bytes arrive"""
+    total = 0
+    chunk = head
+    while chunk:
+        total += len(chunk)
+        if total > max_size:
+            raise UploadTooLarge(f"Upload exceeds {max_size} bytes")
+        # The sink holds zip/hash state of this request, so it stays on the thread pool
+        await cpu_pool.run(task, _feed, sink, content_hash, chunk, local=True)
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+    return total
+
+
+class BodySizeLimitMiddleware:
+    """Reject clipboard upload bodies larger than the limit while they are being received
+
+    Checks Content-Length up front and counts streamed bytes for chunked requests,
+    so oversized uploads fail with 413 before they are fully spooled.
+    """
+
+    def __init__(self, app, max_body_size: int, path_prefix: str = "/api/clipboard"):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_body_size:
+                await self._reject(send)
+                return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    raise HTTPException(status_code=413, detail="Request body too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    async def _reject(self, send):
+        logger.warning("Upload rejected - declared body too large")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json")]
+        })
+        await send({"type": "http.response.body", "body": b'{"detail":"Request body too large"}'})
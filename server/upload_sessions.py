@@ -0,0 +1,275 @@
+"""
+Resumable chunked upload sessions.
+
+Large files go up as a session instead of one long request:
+
+    POST   /api/clipboard/uploads                        open a session (room, filename, size)
+    PUT    /api/clipboard/uploads/{upload_id}/{index}    one chunk, checked against X-Chunk-SHA256
+    GET    /api/clipboard/uploads/{upload_id}            which chunks arrived (to resume)
+    POST   /api/clipboard/uploads/{upload_id}/commit     assemble into a file item
+    DELETE /api/clipboard/uploads/{upload_id}            abort
+
+Chunks may arrive in any order and in parallel, so a dropped connection only
+costs the chunks in flight. Session state lives in MongoDB and chunk bytes in
+the blob store's staging directory, one file per chunk digest; the commit
+streams the chunks it claimed through the same pipeline as /api/clipboard/file
+and remembers its result, so a retried commit returns the same item. Chunks
+are refused with 409 once a commit has started; a commit claim left behind by
+a crashed request can be taken over after UPLOAD_COMMIT_CLAIM_TIMEOUT seconds.
+Sessions expire UPLOAD_SESSION_TTL_HOURS after their last chunk.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from blob_store import blob_store
+from cpu_pool import cpu_pool
+from database import upload_sessions_collection
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+SESSION_TTL = timedelta(hours=int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24")))
+JANITOR_INTERVAL = 3600
+COMMIT_CLAIM_TIMEOUT = timedelta(seconds=int(os.getenv("UPLOAD_COMMIT_CLAIM_TIMEOUT", "600")))
+
+SESSIONS_DIR = blob_store.staging_dir / "sessions"
+
+
+def _sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def chunk_path(upload_id: str, index: int, sha256: str) -> Path:
+    # Named by digest, so re-sending a chunk never rewrites a file a commit is reading
+    return SESSIONS_DIR / upload_id / f"{index:06d}-{sha256}"
+
+
+def _write_chunk_sync(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # A chunk file only appears complete, so a retried PUT can safely replace it
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def session_view(session: dict) -> dict:
+    """What clients see of a session"""
+    return {
+        "upload_id": session["_id"],
+        "filename": session["filename"],
+        "size": session["size"],
+        "chunk_size": session["chunk_size"],
+        "chunk_count": session["chunk_count"],
+        "received": sorted(int(index) for index in session.get("received", {})),
+        "expires_at": session["expires_at"].isoformat(),
+        "committed": session.get("committed")
+    }
+
+
+async def create_session(room_id: str, username: str, filename: str, size: int,
+                         mime_type: str = None, chunk_size: int = None) -> dict:
+    """Open an upload session for a file of `size` bytes"""
+    chunk_size = min(max(chunk_size or DEFAULT_CHUNK_SIZE, MIN_CHUNK_SIZE), MAX_CHUNK_SIZE)
+    session = {
+        "_id": str(uuid.uuid4()),
+        "room_id": room_id,
+        "username": username,
+        "filename": filename,
+        "mime_type": mime_type,
+        "size": size,
+        "chunk_size": chunk_size,
+        "chunk_count": max(1, math.ceil(size / chunk_size)),
+        "received": {},
+        "created_at": datetime.utcnow(),
+        "expires_at": datetime.utcnow() + SESSION_TTL
+    }
+    await upload_sessions_collection.insert_one(session)
+    return session
+
+
+async def get_session(upload_id: str) -> dict:
+    session = await upload_sessions_collection.find_one({"_id": upload_id})
+    if not session or session["expires_at"] < datetime.utcnow():
+        raise HTTPException(status_code=404, detail="Upload session not found or expired")
+    return session
+
+
+def commit_in_progress(session: dict) -> bool:
+    """True while a commit holds the session; an older claim counts as abandoned"""
+    claimed_at = session.get("committing")
+    return claimed_at is not None and claimed_at > datetime.utcnow() - COMMIT_CLAIM_TIMEOUT
+
+
+def _unclaimed(session_id: str) -> dict:
+    """Filter for a session no live commit holds (never claimed, or the claim was abandoned)"""
+    return {
+        "_id": session_id,
+        "committed": None,
+        "$or": [
+            {"committing": {"$exists": False}},
+            {"committing": {"$lt": datetime.utcnow() - COMMIT_CLAIM_TIMEOUT}}
+        ]
+    }
+
+
+def expected_chunk_size(session: dict, index: int) -> int:
+    if index == session["chunk_count"] - 1:
+        return session["size"] - session["chunk_size"] * index
+    return session["chunk_size"]
+
+
+def check_chunk(session: dict, index: int):
+    """Refuse a chunk the session can't take any more"""
+    if session.get("committed"):
+        raise HTTPException(status_code=409, detail="Upload already committed")
+    if commit_in_progress(session):
+        raise HTTPException(status_code=409, detail="Upload is being committed")
+    if not 0 <= index < session["chunk_count"]:
+        raise HTTPException(status_code=400, detail=f"Chunk index must be 0..{session['chunk_count'] - 1}")
+
+
+async def read_chunk(session: dict, index: int, request) -> bytes:
+    """Read a chunk's request body, never buffering more than the chunk's size"""
+    check_chunk(session, index)
+    expected = expected_chunk_size(session, index)
+    too_large = HTTPException(status_code=413, detail=f"Chunk {index} must be {expected} bytes")
+    length = request.headers.get("content-length")
+    if length is not None:
+        if not length.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid Content-Length")
+        if int(length) > expected:
+            raise too_large
+
+    data = bytearray()
+    async for part in request.stream():
+        data += part
+        if len(data) > expected:
+            raise too_large
+    return bytes(data)
+
+
+async def write_chunk(session: dict, index: int, data: bytes, sha256: str = None) -> dict:
+    """Verify and stage one chunk, then record it on the session"""
+    check_chunk(session, index)
+    if len(data) != expected_chunk_size(session, index):
+        raise HTTPException(status_code=400, detail=f"Chunk {index} must be {expected_chunk_size(session, index)} bytes")
+
+    digest = await cpu_pool.run("hash", _sha256_hex, data)
+    if sha256 and sha256.lower() != digest:
+        raise HTTPException(status_code=422, detail=f"Chunk {index} does not match its SHA-256")
+
+    await asyncio.to_thread(_write_chunk_sync, chunk_path(session["_id"], index, digest), data)
+    updated = await upload_sessions_collection.find_one_and_update(
+        _unclaimed(session["_id"]),
+        {"$set": {f"received.{index}": digest, "expires_at": datetime.utcnow() + SESSION_TTL}},
+        return_document=ReturnDocument.AFTER
+    )
+    if updated is None:
+        # A commit claimed the session while this chunk was being staged
+        raise HTTPException(status_code=409, detail="Upload is being committed")
+    return updated
+
+
+async def claim_commit(session: dict) -> dict:
+    """Mark a complete session as committing; only one request gets it
+
+    The claim is the time it was taken, so a commit that died midway can be
+    taken over once COMMIT_CLAIM_TIMEOUT has passed.
+    """
+    missing = session["chunk_count"] - len(session.get("received", {}))
+    if missing:
+        raise HTTPException(status_code=409, detail=f"{missing} chunks still missing")
+    claimed = await upload_sessions_collection.find_one_and_update(
+        _unclaimed(session["_id"]),
+        {"$set": {"committing": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if claimed is None:
+        raise HTTPException(status_code=409, detail="Upload is already being committed")
+    return claimed
+
+
+async def finish_commit(session: dict, result: dict = None):
+    """Record the commit's result (or release the claim after a failure)"""
+    if result is None:
+        # Only our own claim: a slow commit may have been taken over in the meantime
+        await upload_sessions_collection.update_one(
+            {"_id": session["_id"], "committing": session["committing"]},
+            {"$unset": {"committing": ""}}
+        )
+        return
+    await upload_sessions_collection.update_one(
+        {"_id": session["_id"]},
+        {"$set": {"committed": result}, "$unset": {"committing": ""}}
+    )
+    await asyncio.to_thread(shutil.rmtree, SESSIONS_DIR / session["_id"], True)
+
+
+async def discard_session(upload_id: str):
+    await upload_sessions_collection.delete_one({"_id": upload_id})
+    await asyncio.to_thread(shutil.rmtree, SESSIONS_DIR / upload_id, True)
+
+
+class SessionReader:
+    """UploadFile stand-in that reads a session's chunks back in order"""
+
+    def __init__(self, session: dict):
+        self.filename = session["filename"]
+        self.content_type = session.get("mime_type")
+        self._paths = [
+            chunk_path(session["_id"], index, session["received"][str(index)])
+            for index in range(session["chunk_count"])
+        ]
+        self._buffer = b""
+
+    async def read(self, size: int) -> bytes:
+        while len(self._buffer) < size and self._paths:
+            self._buffer += await asyncio.to_thread(self._paths.pop(0).read_bytes)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+async def expire_sessions() -> int:
+    """Delete sessions past their expiry and chunk directories no session owns"""
+    expired = await upload_sessions_collection.find(
+        {"expires_at": {"$lt": datetime.utcnow()}}, {"_id": 1}
+    ).to_list(length=None)
+    for session in expired:
+        await discard_session(session["_id"])
+
+    if SESSIONS_DIR.exists():
+        live = {session["_id"] async for session in upload_sessions_collection.find({}, {"_id": 1})}
+        stale_before = time.time() - JANITOR_INTERVAL
+        for path in SESSIONS_DIR.iterdir():
+            # Recent directories may belong to a session created after the query above
+            if path.name not in live and path.stat().st_mtime < stale_before:
+                await asyncio.to_thread(shutil.rmtree, path, True)
+    return len(expired)
+
+
+async def run_session_janitor():
+    """Background task: drop abandoned upload sessions every JANITOR_INTERVAL seconds"""
+    while True:
+        try:
+            expired = await expire_sessions()
+            if expired:
+                logger.info(f"🧹 Expired {expired} upload sessions")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Upload session cleanup failed: {e}")
+        await asyncio.sleep(JANITOR_INTERVAL)
@@ -476,19 +476,22 @@ def create_web_routes(app: FastAPI):
             <script>
                 let currentRoomId = '';
                 let autoRefreshInterval = null;
+                let currentItems = [];
+                let nextBeforeSeq = null;
+                let latestSeq = null;
+                let deletedCursor = null;
+                let roomSocket = null;
+                let roomEvents = null;
                 
                 function toggleAutoRefresh() {
                     const btn = document.getElementById('autoRefreshBtn');
-                    if (autoRefreshInterval) {
-                        clearInterval(autoRefreshInterval);
-                        autoRefreshInterval = null;
+                    if (autoRefreshInterval || roomSocket || roomEvents) {
+                        stopLiveUpdates();
                         btn.textContent = '⏸️ Auto Refresh OFF';
                         btn.style.backgroundColor = '#6c757d';
                     } else {
                         if (currentRoomId) {
-                            autoRefreshInterval = setInterval(() => {
-                                loadRoomData();
-                            }, 5000); // Refresh every 5 seconds
+                            startLiveUpdates();
                             btn.textContent = '▶️ Auto Refresh ON';
                             btn.style.backgroundColor = '#28a745';
                         } else {
@@ -497,6 +500,108 @@ def create_web_routes(app: FastAPI):
                     }
                 }
                 
+                function startLiveUpdates() {
+                    // Prefer a WebSocket, then Server-Sent Events (for proxies that drop
+                    // WebSockets), and only poll deltas when neither is available
+                    if (currentRoomId.toLowerCase() === 'hassan') {
+                        startPolling();
+                        return;
+                    }
+                    if ('WebSocket' in window) {
+                        const scheme = location.protocol === 'https:' ? 'wss' : 'ws';
+                        const socket = new WebSocket(`${scheme}://${location.host}/ws/room/${encodeURIComponent(currentRoomId)}`);
+                        let opened = false;
+                        roomSocket = socket;
+                        socket.onopen = () => { opened = true; };
+                        socket.onmessage = (message) => handleRoomEvent(JSON.parse(message.data));
+                        socket.onclose = () => {
+                            if (roomSocket === socket) {
+                                roomSocket = null;
+                                opened ? startLiveUpdates() : startEventStream();
+                            }
+                        };
+                        return;
+                    }
+                    startEventStream();
+                }
+                
+                function startEventStream() {
+                    if (!('EventSource' in window)) {
+                        startPolling();
+                        return;
+                    }
+                    // EventSource reconnects by itself and resumes with Last-Event-ID
+                    roomEvents = new EventSource(`/api/clipboard/stream/${encodeURIComponent(currentRoomId)}`);
+                    roomEvents.onmessage = (message) => handleRoomEvent(JSON.parse(message.data));
+                }
+                
+                function startPolling() {
+                    autoRefreshInterval = setInterval(() => {
+                        syncRoom();
+                    }, 5000); // Delta sync every 5 seconds
+                }
+                
+                function stopLiveUpdates() {
+                    if (autoRefreshInterval) {
+                        clearInterval(autoRefreshInterval);
+                        autoRefreshInterval = null;
+                    }
+                    if (roomSocket) {
+                        const socket = roomSocket;
+                        roomSocket = null;
+                        socket.close();
+                    }
+                    if (roomEvents) {
+                        roomEvents.close();
+                        roomEvents = null;
+                    }
+                }
+                
+                function handleRoomEvent(event) {
+                    if (event.event === 'hello' || event.event === 'resync') {
+                        // Catch up on anything committed before we subscribed (or that we dropped)
+                        syncRoom();
+                    } else if (event.event === 'item.created') {
+                        if (latestSeq === null || event.seq <= latestSeq) {
+                            return;
+                        }
+                        if (event.seq === latestSeq + 1) {
+                            latestSeq = event.seq;
+                            prependItems([event.item]);
+                        } else {
+                            syncRoom();
+                        }
+                    } else if (event.event === 'item.deleted') {
+                        removeItems([event.id]);
+                    } else if (event.event === 'room.cleared') {
+                        loadRoomData();
+                    }
+                }
+                
+                function removeItems(ids) {
+                    const gone = new Set(ids);
+                    const before = currentItems.length;
+                    currentItems = currentItems.filter(item => !gone.has(item.id));
+                    if (currentItems.length !== before) {
+                        const totalEl = document.getElementById('totalItems');
+                        totalEl.textContent = Math.max((parseInt(totalEl.textContent) || 0) - (before - currentItems.length), 0);
+                        displayItems(currentItems);
+                    }
+                }
+                
+                function prependItems(newestFirst) {
+                    // A repeated copy arrives again with a new seq; move it rather than count it twice
+                    const freshIds = new Set(newestFirst.map(item => item.id));
+                    const kept = currentItems.filter(item => !freshIds.has(item.id));
+                    const added = newestFirst.length - (currentItems.length - kept.length);
+                    currentItems = newestFirst.concat(kept);
+                    const totalEl = document.getElementById('totalItems');
+                    totalEl.textContent = (parseInt(totalEl.textContent) || 0) + added;
+                    document.getElementById('textItems').textContent = currentItems.filter(item => item.type === 'text').length;
+                    document.getElementById('fileItems').textContent = currentItems.filter(item => item.type !== 'text').length;
+                    displayItems(currentItems);
+                }
+                
                 function showTab(tabName) {
                     // Hide all tab contents
                     document.querySelectorAll('.tab-content').forEach(content => {
@@ -522,7 +627,13 @@ def create_web_routes(app: FastAPI):
                         return;
                     }
                     
+                    const roomChanged = roomId !== currentRoomId;
                     currentRoomId = roomId;
+                    if (roomChanged && (roomSocket || roomEvents || autoRefreshInterval)) {
+                        // Follow the newly selected room
+                        stopLiveUpdates();
+                        startLiveUpdates();
+                    }
                     const contentDiv = document.getElementById('content');
                     contentDiv.innerHTML = '<div class="loading">🔄 Loading room data...</div>';
                     
@@ -545,20 +656,74 @@ def create_web_routes(app: FastAPI):
                         const historyData = await historyResponse.ok ? await historyResponse.json() : { items: [] };
                         
                         // Update stats
-                        document.getElementById('totalItems').textContent = roomData.total_items || 0;
-                        document.getElementById('totalUsers').textContent = roomData.members?.length || 0;
-                        document.getElementById('textItems').textContent = historyData.items?.filter(item => item.type === 'text').length || 0;
-                        document.getElementById('fileItems').textContent = historyData.items?.filter(item => item.type !== 'text').length || 0;
+                        showCounts(roomData.total_items, roomData.members?.length, roomData.items_by_type);
                         document.getElementById('stats').style.display = 'grid';
                         
                         // Display items
-                        displayItems(historyData.items || []);
+                        currentItems = historyData.items || [];
+                        nextBeforeSeq = historyData.next_before_seq;
+                        latestSeq = historyData.latest_seq ?? 0;
+                        deletedCursor = historyData.deleted_cursor ?? null;
+                        displayItems(currentItems);
                         
                     } catch (error) {
                         contentDiv.innerHTML = `<div class="error">❌ Error: ${error.message}</div>`;
                     }
                 }
                 
+                function showCounts(totalItems, totalUsers, itemsByType) {
+                    const textItems = (itemsByType && itemsByType.text) || 0;
+                    document.getElementById('totalItems').textContent = totalItems || 0;
+                    document.getElementById('totalUsers').textContent = totalUsers || 0;
+                    document.getElementById('textItems').textContent = textItems;
+                    document.getElementById('fileItems').textContent = Math.max((totalItems || 0) - textItems, 0);
+                    document.getElementById('stats').style.display = 'grid';
+                }
+                
+                async function syncRoom() {
+                    // Fetch only items newer than latestSeq and deletions past deletedCursor;
+                    // an idle room answers 304 with no body
+                    if (!currentRoomId || currentRoomId.toLowerCase() === 'hassan' || latestSeq === null) {
+                        await loadRoomData();
+                        return;
+                    }
+                    
+                    try {
+                        let url = `/api/clipboard/since/${currentRoomId}?cursor=${latestSeq}`;
+                        if (deletedCursor !== null) {
+                            url += `&deleted_cursor=${deletedCursor}`;
+                        }
+                        const response = await fetch(url, { cache: 'no-store' });
+                        if (response.status === 304 || !response.ok) {
+                            return;
+                        }
+                        
+                        const delta = await response.json();
+                        if (delta.reset) {
+                            await loadRoomData();
+                            return;
+                        }
+                        
+                        // Skip anything a pushed event already added
+                        const fresh = delta.items.filter(item => item.seq > latestSeq);
+                        latestSeq = Math.max(latestSeq, delta.cursor);
+                        deletedCursor = delta.deleted_cursor ?? deletedCursor;
+                        if (fresh.length) {
+                            // Delta comes oldest first; history is shown newest first
+                            prependItems(fresh.reverse());
+                        }
+                        if (delta.deleted && delta.deleted.length) {
+                            removeItems(delta.deleted);
+                        }
+                        
+                        if (delta.has_more) {
+                            await syncRoom();
+                        }
+                    } catch (error) {
+                        console.error('Sync failed:', error);
+                    }
+                }
+                
                 async function loadAllData() {
                     try {
                         const response = await fetch('/api/clipboard/all');
@@ -568,16 +733,12 @@ def create_web_routes(app: FastAPI):
                         
                         const allItems = await response.json();
                         
-                        // Update stats for all data
-                        const uniqueUsers = new Set(allItems.map(item => item.username)).size;
-                        const textItems = allItems.filter(item => item.type === 'text').length;
-                        const fileItems = allItems.filter(item => item.type !== 'text').length;
-                        
-                        document.getElementById('totalItems').textContent = allItems.length;
-                        document.getElementById('totalUsers').textContent = uniqueUsers;
-                        document.getElementById('textItems').textContent = textItems;
-                        document.getElementById('fileItems').textContent = fileItems;
-                        document.getElementById('stats').style.display = 'grid';
+                        // Server-side counters cover every item, not just the ones listed
+                        const statsResponse = await fetch('/api/stats');
+                        if (statsResponse.ok) {
+                            const stats = await statsResponse.json();
+                            showCounts(stats.total_items, stats.total_users, stats.items_by_type);
+                        }
                         
                         // Display items with room info
                         displayAllItems(allItems);
@@ -610,10 +771,9 @@ def create_web_routes(app: FastAPI):
                         
                         let content = '';
                         if (item.type === 'text') {
-                            content = item.content.substring(0, 100) + (item.content.length > 100 ? '...' : '');
+                            content = item.preview.substring(0, 100) + (item.preview.length > 100 ? '...' : '');
                         } else if (item.type === 'image') {
-                            const mimeType = item.metadata?.mime_type || 'image/png';
-                            content = `<img src="data:${mimeType};base64,${item.content}" class="item-image" alt="Uploaded image">`;
+                            content = `<img src="${item.thumbnail_url}" loading="lazy" class="item-image" alt="Uploaded image">`;
                         } else {
                             content = `${item.type.toUpperCase()}: ${item.filename || 'Unknown'}`;
                         }
@@ -657,11 +817,11 @@ def create_web_routes(app: FastAPI):
                         
                         let content = '';
                         if (item.type === 'text') {
-                            content = item.content.substring(0, 200) + (item.content.length > 200 ? '...' : '');
+                            // Preview is precomputed server-side (first 200 characters)
+                            content = item.preview + (item.preview.length >= 200 ? '...' : '');
                         } else if (item.type === 'image') {
-                            // Display base64 image directly
-                            const mimeType = item.metadata?.mime_type || 'image/png';
-                            content = `<img src="data:${mimeType};base64,${item.content}" class="item-image" alt="Uploaded image">`;
+                            // Images load lazily from their (cacheable) thumbnail URL
+                            content = `<img src="${item.thumbnail_url}" loading="lazy" class="item-image" alt="Uploaded image">`;
                         } else {
                             content = `${item.type.toUpperCase()}: ${item.filename || 'Unknown'}`;
                         }
@@ -680,9 +840,24 @@ def create_web_routes(app: FastAPI):
                     });
                     
                     html += '</div>';
+                    if (nextBeforeSeq !== null && nextBeforeSeq !== undefined) {
+                        html += '<button class="copy-btn" onclick="loadOlderItems()">⬇️ Load older items</button>';
+                    }
                     contentDiv.innerHTML = html;
                 }
                 
+                async function loadOlderItems() {
+                    // Keyset pagination: continue below the oldest item shown
+                    const response = await fetch(`/api/clipboard/history/${currentRoomId}?before_seq=${nextBeforeSeq}`);
+                    if (!response.ok) {
+                        return;
+                    }
+                    const page = await response.json();
+                    currentItems = currentItems.concat(page.items || []);
+                    nextBeforeSeq = page.next_before_seq;
+                    displayItems(currentItems);
+                }
+                
             async function copyItem(itemId, itemType) {
                 try {
                     const response = await fetch(`/api/clipboard/download/${itemId}`);
@@ -692,14 +867,15 @@ def create_web_routes(app: FastAPI):
                             await navigator.clipboard.writeText(data.content);
                             alert('✅ Text copied to clipboard!');
                         } else if (itemType === 'image') {
-                            // For images, copy the base64 data URL
+                            // Copy the image bytes themselves; fall back to the URL where unsupported
                             const blob = await response.blob();
-                            const reader = new FileReader();
-                            reader.onload = function() {
-                                navigator.clipboard.writeText(reader.result);
-                                alert('✅ Image data URL copied to clipboard!');
-                            };
-                            reader.readAsDataURL(blob);
+                            if (window.ClipboardItem && blob.type === 'image/png') {
+                                await navigator.clipboard.write([new ClipboardItem({ [blob.type]: blob })]);
+                                alert('✅ Image copied to clipboard!');
+                            } else {
+                                await navigator.clipboard.writeText(window.location.origin + `/api/clipboard/download/${itemId}`);
+                                alert('✅ Image URL copied to clipboard!');
+                            }
                         } else {
                             // For files, copy the URL
                             const blob = await response.blob();
@@ -714,6 +890,88 @@ def create_web_routes(app: FastAPI):
                 }
             }
                 
+                // Files larger than one chunk go up as a resumable upload session
+                const UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024;
+                const UPLOAD_PARALLEL_CHUNKS = 4;
+                const UPLOAD_RETRIES = 5;
+                
+                async function sha256Hex(buffer) {
+                    // crypto.subtle only exists on https/localhost; the server then skips the check
+                    if (!window.crypto || !crypto.subtle) return null;
+                    const digest = await crypto.subtle.digest('SHA-256', buffer);
+                    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+                }
+                
+                async function uploadChunked(file, roomId, username, resultDiv) {
+                    // Re-selecting the same file after a failure resumes its session
+                    const resumeKey = `upload:${roomId}:${file.name}:${file.size}:${file.lastModified}`;
+                    let session = null;
+                    const savedId = localStorage.getItem(resumeKey);
+                    if (savedId) {
+                        const response = await fetch(`/api/clipboard/uploads/${savedId}`);
+                        if (response.ok) session = await response.json();
+                    }
+                    if (!session) {
+                        const response = await fetch('/api/clipboard/uploads', {
+                            method: 'POST',
+                            headers: { 'Content-Type': 'application/json' },
+                            body: JSON.stringify({
+                                room_id: roomId,
+                                username: username,
+                                filename: file.name,
+                                size: file.size,
+                                mime_type: file.type || null,
+                                chunk_size: UPLOAD_CHUNK_SIZE
+                            })
+                        });
+                        if (!response.ok) throw new Error(`Could not start upload (${response.status})`);
+                        session = await response.json();
+                        localStorage.setItem(resumeKey, session.upload_id);
+                    }
+                    
+                    const sessionUrl = `/api/clipboard/uploads/${session.upload_id}`;
+                    for (let attempt = 0; attempt < UPLOAD_RETRIES; attempt++) {
+                        try {
+                            if (attempt) {
+                                await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** attempt));
+                                const status = await fetch(sessionUrl);
+                                if (!status.ok) throw new Error(`Upload session lost (${status.status})`);
+                                session = await status.json();
+                            }
+                            const received = new Set(session.received);
+                            const missing = [];
+                            for (let index = 0; index < session.chunk_count; index++) {
+                                if (!received.has(index)) missing.push(index);
+                            }
+                            let done = session.chunk_count - missing.length;
+                            const sendNext = async () => {
+                                while (missing.length) {
+                                    const index = missing.shift();
+                                    const start = index * session.chunk_size;
+                                    const chunk = await file.slice(start, start + session.chunk_size).arrayBuffer();
+                                    const headers = { 'Content-Type': 'application/octet-stream' };
+                                    const hash = await sha256Hex(chunk);
+                                    if (hash) headers['X-Chunk-SHA256'] = hash;
+                                    const response = await fetch(`${sessionUrl}/${index}`, { method: 'PUT', headers, body: chunk });
+                                    if (!response.ok) throw new Error(`Chunk ${index} failed (${response.status})`);
+                                    done++;
+                                    resultDiv.innerHTML = `<div class="loading">📤 Uploading ${file.name}: ${Math.round(100 * done / session.chunk_count)}%</div>`;
+                                }
+                            };
+                            await Promise.all(Array.from({ length: UPLOAD_PARALLEL_CHUNKS }, sendNext));
+                            // Committing twice returns the same item, so a lost reply is safe to retry
+                            const response = await fetch(`${sessionUrl}/commit`, { method: 'POST' });
+                            if (response.status < 500) {
+                                localStorage.removeItem(resumeKey);
+                                return response;
+                            }
+                        } catch (error) {
+                            console.warn(`Chunked upload interrupted (attempt ${attempt + 1}):`, error);
+                        }
+                    }
+                    throw new Error('Upload interrupted, select the file again to resume');
+                }
+                
                 // Upload form handling
                 document.getElementById('uploadForm').addEventListener('submit', async function(e) {
                     e.preventDefault();
@@ -764,11 +1022,17 @@ def create_web_routes(app: FastAPI):
                             formData.append('username', username);
                             formData.append('file', fileInput.files[0]);
                             
-                            const endpoint = fileInput.files[0].type.startsWith('image/') ? '/api/clipboard/image' : '/api/clipboard/file';
-                            const response = await fetch(endpoint, {
-                                method: 'POST',
-                                body: formData
-                            });
+                            const file = fileInput.files[0];
+                            let response;
+                            if (!file.type.startsWith('image/') && file.size > UPLOAD_CHUNK_SIZE) {
+                                response = await uploadChunked(file, roomId, username, resultDiv);
+                            } else {
+                                const endpoint = file.type.startsWith('image/') ? '/api/clipboard/image' : '/api/clipboard/file';
+                                response = await fetch(endpoint, {
+                                    method: 'POST',
+                                    body: formData
+                                });
+                            }
                             
                             if (response.ok) {
                                 resultDiv.innerHTML = '<div class="success">✅ File uploaded successfully!</div>';
@@ -780,7 +1044,7 @@ def create_web_routes(app: FastAPI):
                         
                         // Auto-refresh room data if viewing the same room
                         if (currentRoomId === roomId) {
-                            setTimeout(() => loadRoomData(), 1000);
+                            setTimeout(() => syncRoom(), 1000);
                         }
                         
                     } catch (error) {
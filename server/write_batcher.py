@@ -0,0 +1,244 @@
+"""
+Group commit for clipboard inserts.
+
+Under bursty copy traffic (scripted copies, several devices in one room) each
+save used to be its own insert_one round trip. Inserts now queue here for at
+most WRITE_BATCH_DELAY_MS, or until WRITE_BATCH_SIZE documents are waiting,
+and go out as one unordered insert_many. Every caller still awaits its own
+document: it resumes only once the batch is acknowledged, and gets that
+document's own error if it failed, so a save never reports success early.
+
+Sequence numbers are assigned here, at commit time, from the room's head.
+Writes to a room run one after another in the order they were flushed (a
+batch waits only for earlier writes to its own rooms), so within a worker a
+seq only becomes visible after every lower one; other workers writing the
+same room collide on the unique (room_id, seq) index and retry above the new
+head. Readers can therefore move their cursor to the highest seq they saw
+without ever skipping an item that commits later.
+
+Counter increments for a committed batch are merged into one bulk write too.
+"""
+import asyncio
+import logging
+import os
+from collections import defaultdict
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteError
+
+from database import clipboard_collection, room_heads, advance_heads, RoomNotFound
+from room_stats import count_items
+
+logger = logging.getLogger(__name__)
+
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "64"))
+WRITE_BATCH_DELAY = float(os.getenv("WRITE_BATCH_DELAY_MS", "5")) / 1000
+# Rounds of seq collisions with other workers before a write gives up
+SEQ_ATTEMPTS = 5
+
+
+def _is_seq_conflict(error: dict) -> bool:
+    if error.get("code") != 11000:
+        return False
+    return "seq" in (error.get("keyPattern") or {}) or "seq" in error.get("errmsg", "")
+
+
+class InsertBatcher:
+    """Coalesces concurrent insert() calls into insert_many batches
+
+    With sequenced=True every document gets the next seq of its room_id when
+    its batch is written.
+    """
+
+    def __init__(self, collection, max_batch: int = WRITE_BATCH_SIZE, max_delay: float = WRITE_BATCH_DELAY,
+                 on_commit=None, sequenced: bool = False):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.on_commit = on_commit
+        self.sequenced = sequenced
+        self._pending = []
+        self._timer = None
+        self._writes = set()
+        # Latest write of each room, which the room's next write waits for
+        self._room_writes = {}
+        self.batches = 0
+        self.documents = 0
+        self.largest_batch = 0
+        self.seq_retries = 0
+
+    async def insert(self, doc: dict):
+        """Insert one document as part of the next batch; returns once it is committed"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((doc, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._flush)
+        # A caller that goes away must not cancel the write the others share
+        await asyncio.shield(future)
+
+    async def move_to_head(self, room_id: str, filter: dict, changes: dict):
+        """Give an existing document the room's next seq (plus a $set of `changes`), in order with inserts
+
+        Returns the updated document, or None when it or the room is gone.
+        """
+        earlier = self._earlier_writes({room_id})
+        move = asyncio.ensure_future(self._move(room_id, filter, changes, earlier))
+        self._track(move, {room_id})
+        return await asyncio.shield(move)
+
+    async def _move(self, room_id: str, filter: dict, changes: dict, earlier: set):
+        if earlier:
+            await asyncio.wait(earlier)
+        exact = False
+        for _ in range(SEQ_ATTEMPTS):
+            heads = await room_heads([room_id], exact=exact)
+            if room_id not in heads:
+                return None
+            seq = heads[room_id] + 1
+            try:
+                moved = await self.collection.find_one_and_update(
+                    filter, [{"$set": {**changes, "seq": seq}}], return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                # Another worker committed this seq first
+                self.seq_retries += 1
+                exact = True
+                continue
+            if moved is not None:
+                await self._advance({room_id: seq})
+            return moved
+        raise DuplicateKeyError(f"No free seq in room {room_id} after {SEQ_ATTEMPTS} attempts", 11000)
+
+    async def drain(self):
+        """Write whatever is queued and wait for batches in flight (used at shutdown)"""
+        self._flush()
+        await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "documents": self.documents,
+            "largest_batch": self.largest_batch,
+            "seq_retries": self.seq_retries,
+            "pending": len(self._pending)
+        }
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            rooms = {doc["room_id"] for doc, _ in batch} if self.sequenced else set()
+            earlier = self._earlier_writes(rooms)
+            write = asyncio.ensure_future(self._write(batch, earlier))
+            self._track(write, rooms)
+
+    def _earlier_writes(self, room_ids: set) -> set:
+        return {self._room_writes[room_id] for room_id in room_ids if room_id in self._room_writes}
+
+    def _track(self, write: asyncio.Future, room_ids: set):
+        """Keep a write in flight until it is done, as the latest write of its rooms"""
+        self._writes.add(write)
+        for room_id in room_ids:
+            self._room_writes[room_id] = write
+
+        def done(_):
+            self._writes.discard(write)
+            for room_id in room_ids:
+                if self._room_writes.get(room_id) is write:
+                    del self._room_writes[room_id]
+
+        write.add_done_callback(done)
+
+    async def _write(self, batch: list, earlier: set):
+        docs = [doc for doc, _ in batch]
+        # After the earlier writes to these rooms, so their seqs become visible in order
+        if earlier:
+            await asyncio.wait(earlier)
+        errors = await self._insert(docs)
+
+        committed = [doc for index, doc in enumerate(docs) if index not in errors]
+        self.batches += 1
+        self.documents += len(committed)
+        self.largest_batch = max(self.largest_batch, len(docs))
+        if committed and self.on_commit:
+            try:
+                await self.on_commit(committed)
+            except Exception as e:
+                # The documents are stored; the counter reconciler repairs the totals
+                logger.error(f"Post-commit hook failed for {len(committed)} documents: {e}")
+
+        for index, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if index in errors:
+                future.set_exception(errors[index])
+            else:
+                future.set_result(None)
+
+    async def _insert(self, docs: list) -> dict:
+        """insert_many the documents (numbering them first); returns {index: error} for the ones not stored"""
+        errors = {}
+        todo = list(range(len(docs)))
+        exact = False
+        for _ in range(SEQ_ATTEMPTS):
+            if self.sequenced:
+                heads = await room_heads({docs[index]["room_id"] for index in todo}, exact=exact)
+                for index in todo:
+                    room_id = docs[index]["room_id"]
+                    if room_id not in heads:
+                        errors[index] = RoomNotFound(room_id)
+                        continue
+                    heads[room_id] += 1
+                    docs[index]["seq"] = heads[room_id]
+                todo = [index for index in todo if index not in errors]
+            if not todo:
+                break
+
+            retry = []
+            try:
+                await self.collection.insert_many([docs[index] for index in todo], ordered=False)
+            except BulkWriteError as e:
+                # Unordered: everything but the reported documents was written
+                for error in e.details.get("writeErrors", []):
+                    index = todo[error["index"]]
+                    if self.sequenced and _is_seq_conflict(error):
+                        retry.append(index)
+                        continue
+                    error_class = DuplicateKeyError if error.get("code") == 11000 else WriteError
+                    errors[index] = error_class(error.get("errmsg"), error.get("code"), error)
+            except Exception as e:
+                logger.error(f"Batched insert of {len(todo)} documents failed: {e}")
+                errors.update((index, e) for index in todo)
+
+            if self.sequenced:
+                heads = defaultdict(int)
+                for index in todo:
+                    if index not in errors and index not in retry:
+                        room_id = docs[index]["room_id"]
+                        heads[room_id] = max(heads[room_id], docs[index]["seq"])
+                await self._advance(heads)
+            if not retry:
+                return errors
+            # Another worker committed some of these seqs first; renumber above its items
+            self.seq_retries += len(retry)
+            for index in retry:
+                docs[index].pop("_id", None)
+            todo, exact = retry, True
+
+        for index in todo:
+            errors[index] = DuplicateKeyError(f"No free seq after {SEQ_ATTEMPTS} attempts", 11000)
+        return errors
+
+    async def _advance(self, heads: dict):
+        try:
+            await advance_heads(heads)
+        except Exception as e:
+            # Committed items are the source of truth; the next collision reads them
+            logger.error(f"Could not advance room heads {dict(heads)}: {e}")
+
+
+clipboard_writes = InsertBatcher(clipboard_collection, on_commit=count_items, sequenced=True)